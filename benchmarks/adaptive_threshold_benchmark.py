@@ -0,0 +1,86 @@
+"""Benchmark local thresholding with summed-area tables.
+
+Usage::
+
+    python benchmarks/adaptive_threshold_benchmark.py [x y]
+
+Compares the time of computing Sauvola thresholds of a uint16 image with
+windows of increasing size: from local statistics computed by correlating
+with a box kernel, whose cost grows with the area of the window, with
+:func:`skimage.filters.threshold_sauvola`, and with the summed-area tables
+of :func:`jicbioimage.transform.adaptive.local_threshold`, untiled and in
+tiles of a 64 MiB memory budget. The box kernel is only timed for windows
+of up to 31 pixels.
+
+Example output of ``python benchmarks/adaptive_threshold_benchmark.py 2048
+2048``; the tiled times include thresholding the image::
+
+    Image shape: (2048, 2048), dtype: uint16
+    window       box kernel     skimage      tables       tiled
+    15               2.468s      0.762s      0.376s      0.364s
+    31               9.609s      0.314s      0.300s      0.281s
+    101                   -      0.336s      0.364s      0.345s
+    301                   -      0.382s      0.372s      0.536s
+"""
+
+import sys
+import time
+
+import numpy as np
+import scipy.ndimage as ndi
+import skimage.filters
+
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import threshold_sauvola
+from jicbioimage.transform.adaptive import local_threshold
+
+#: Largest window for which the box kernel is timed.
+BOX_MAX_WINDOW = 31
+
+
+def box_kernel_sauvola(image, window_size, k=0.2, r=32767.5):
+    """Return Sauvola thresholds from correlations with a box kernel."""
+    image = image.astype(np.float64)
+    kernel = np.ones((window_size, window_size)) / window_size ** 2
+    mean = ndi.correlate(image, kernel, mode="mirror")
+    mean_square = ndi.correlate(image * image, kernel, mode="mirror")
+    std = np.sqrt(np.clip(mean_square - mean * mean, 0, None))
+    return mean * (1 + k * (std / r - 1))
+
+
+def timed(func):
+    """Return wall time in seconds of a call."""
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main():
+    shape = (4096, 4096)
+    if len(sys.argv) == 3:
+        shape = tuple(int(v) for v in sys.argv[1:])
+    AutoWrite.on = False
+    random = np.random.RandomState(0)
+    image = ndi.gaussian_filter(random.random_sample(shape), 8)
+    image = (image / image.max() * 65535).astype(np.uint16)
+
+    print("Image shape: {}, dtype: {}".format(shape, image.dtype))
+    print("{:<8} {:>14} {:>11} {:>11} {:>11}".format(
+        "window", "box kernel", "skimage", "tables", "tiled"))
+    for window_size in (15, 31, 101, 301):
+        box = "-"
+        if window_size <= BOX_MAX_WINDOW:
+            box = "{:.3f}s".format(timed(
+                lambda: box_kernel_sauvola(image, window_size)))
+        reference = timed(lambda: skimage.filters.threshold_sauvola(
+            image, window_size))
+        tables = timed(lambda: local_threshold(image, "sauvola",
+                                               window_size))
+        tiled = timed(lambda: threshold_sauvola(
+            image, window_size, memory_budget=64 * 1024 ** 2))
+        print("{:<8} {:>14} {:>10.3f}s {:>10.3f}s {:>10.3f}s".format(
+            window_size, box, reference, tables, tiled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark Otsu thresholding of the planes of a stack, one by one or at once.
+
+Usage::
+
+    python benchmarks/batch_otsu_benchmark.py [planes] [side]
+
+Example output, with the default 256 planes of 128x128 pixels and with
+2048 planes of 32x32 pixels, where the per-call overhead of a loop is
+largest::
+
+    256 planes of 128x128, uint8
+    otsu         skimage loop  0.031s  planes loop  0.036s  batched  0.017s
+    multiotsu    skimage loop  0.152s  planes loop  0.206s  batched  0.081s
+    256 planes of 128x128, uint16
+    otsu         skimage loop  0.039s  planes loop  0.099s  batched  0.043s
+    2048 planes of 32x32, uint8
+    otsu         skimage loop  0.096s  planes loop  0.130s  batched  0.022s
+    multiotsu    skimage loop  0.794s  planes loop  1.467s  batched  0.537s
+    2048 planes of 32x32, uint16
+    otsu         skimage loop  0.245s  planes loop  0.704s  batched  0.234s
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import skimage.filters
+
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import (
+    threshold_multiotsu,
+    threshold_multiotsu_planes,
+    threshold_otsu,
+    threshold_otsu_planes,
+)
+from jicbioimage.transform.threshold import clear_cache
+
+
+def batch(planes, side, maximum, dtype):
+    """Return batch of noisy images with two bright blobs per image."""
+    random = np.random.RandomState(0)
+    y, x = np.mgrid[:side, :side] / float(side)
+    images = []
+    for _ in range(planes):
+        cy, cx = random.random_sample(2)
+        blob = np.exp(-((y - cy) ** 2 + (x - cx) ** 2) * 20)
+        images.append(blob + 0.3 * np.exp(-(y - cx) ** 2 * 10))
+    images = np.array(images) + random.normal(0, 0.05, (planes, side, side))
+    images = np.clip(images / images.max(), 0, 1)
+    return (images * maximum).astype(dtype)
+
+
+def skimage_otsu(plane):
+    return plane > skimage.filters.threshold_otsu(plane)
+
+
+def skimage_multiotsu(plane):
+    thresholds = skimage.filters.threshold_multiotsu(plane)
+    return np.digitize(plane, thresholds, right=True).astype(np.uint8)
+
+
+def timed(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    planes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    AutoWrite.on = False
+
+    for dtype, maximum in [(np.uint8, 255), (np.uint16, 4095)]:
+        stack = batch(planes, side, maximum, dtype)
+        print("{} planes of {}x{}, {}".format(planes, side, side,
+                                             np.dtype(dtype).name))
+        cases = [("otsu", skimage_otsu, threshold_otsu,
+                  threshold_otsu_planes)]
+        if dtype == np.uint8:
+            # Multi-level Otsu of a 12 bit histogram is dominated by the
+            # search over pairs of bins, in scikit-image as here.
+            cases.append(("multiotsu", skimage_multiotsu,
+                          threshold_multiotsu, threshold_multiotsu_planes))
+        for name, skimage_func, plane_func, batched_func in cases:
+
+            def skimage_loop():
+                for plane in stack:
+                    skimage_func(plane)
+
+            def planes_loop():
+                clear_cache()
+                for plane in stack:
+                    plane_func(plane)
+
+            def batched():
+                batched_func(stack)
+
+            print("{:<12} skimage loop {:6.3f}s  planes loop {:6.3f}s  "
+                  "batched {:6.3f}s".format(name, timed(skimage_loop),
+                                            timed(planes_loop),
+                                            timed(batched)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark repeated size filtering with and without label reuse.
+
+Usage::
+
+    python benchmarks/components_benchmark.py [size]
+
+Prints the time of building size-filtered layers of a random mask by
+calling :func:`skimage.morphology.remove_small_objects` once per minimum
+size, and by labelling once with
+:class:`jicbioimage.transform.components.Components`.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+import skimage.morphology
+
+from jicbioimage.transform.components import Components
+
+MIN_SIZES = [2, 5, 10, 20, 50, 100]
+
+
+def skimage_layers(mask):
+    return [skimage.morphology.remove_small_objects(mask, min_size=size)
+            for size in MIN_SIZES]
+
+
+def component_layers(mask):
+    components = Components(mask)
+    return [components.mask(min_size=size) for size in MIN_SIZES]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    mask = np.random.random_sample((size, size)) > 0.6
+    print("Image {0}x{0}, {1} layers".format(size, len(MIN_SIZES)))
+    for name, func in [("skimage", skimage_layers),
+                       ("components", component_layers)]:
+        seconds = min(timeit.repeat(lambda: func(mask), number=1, repeat=3))
+        print("{:>12} {:>9.4f}s".format(name, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the rank engine against numpy median and percentile.
+
+Usage::
+
+    python benchmarks/median_projection_benchmark.py [x y z]
+
+Compares :func:`numpy.median` and :func:`numpy.percentile` along the z axis
+of a stack with the median and 10th percentile projections of
+:mod:`jicbioimage.transform.projection`, which give identical results.
+
+Example output, best of three runs::
+
+    Stack shape: (1024, 1024, 32)
+    dtype    projection        numpy     engine   speedup
+    uint8    median          0.7473s    0.1911s      3.9x
+    uint8    10th            1.2817s    0.1729s      7.4x
+    uint16   median          0.7530s    0.3078s      2.4x
+    uint16   10th            1.5861s    0.3449s      4.6x
+    float32  median          0.9810s    0.9739s      1.0x
+    float32  10th            3.0504s    0.8226s      3.7x
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from jicbioimage.transform.projection import project, project_percentile
+
+DTYPES = [np.uint8, np.uint16, np.float32]
+
+
+def best_of(func, repeat=3):
+    """Return the best wall time in seconds of repeated calls to func."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    shape = (1024, 1024, 32)
+    if len(sys.argv) == 4:
+        shape = tuple(int(v) for v in sys.argv[1:])
+
+    print("Stack shape: {}".format(shape))
+    print("{:<8} {:<12} {:>10} {:>10} {:>9}".format(
+        "dtype", "projection", "numpy", "engine", "speedup"))
+    for dtype in DTYPES:
+        stack = (np.random.random_sample(shape) * 250).astype(dtype)
+        for name, reference, engine in [
+                ("median",
+                 lambda: np.median(stack, axis=2).astype(dtype),
+                 lambda: project(stack, "median")),
+                ("10th",
+                 lambda: np.percentile(stack, 10, axis=2).astype(dtype),
+                 lambda: project_percentile(stack, 10))]:
+            assert np.array_equal(reference(), engine())
+            numpy_time = best_of(reference)
+            engine_time = best_of(engine)
+            print("{:<8} {:<12} {:>9.4f}s {:>9.4f}s {:>8.1f}x".format(
+                np.dtype(dtype).name, name, numpy_time, engine_time,
+                numpy_time / engine_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the binary morphology engine against scikit-image.
+
+Usage::
+
+    python benchmarks/morphology_benchmark.py [size]
+
+Prints the time of :func:`skimage.morphology.binary_dilation` and of
+:func:`jicbioimage.transform.morphology.binary_dilation` for squares and
+disks of increasing size, and checks that the results are identical.
+
+Results used to choose ``EDT_MIN_RADIUS``, best of three runs::
+
+    Image 1024x1024
+       selem radius    skimage     engine  identical
+      square      1    0.0334s    0.0217s       True
+      square      2    0.0590s    0.0451s       True
+      square      3    0.1076s    0.0598s       True
+      square      5    0.1918s    0.0546s       True
+      square     10    0.6923s    0.0957s       True
+      square     20    1.6847s    0.1575s       True
+        disk      1    0.0240s    0.0237s       True
+        disk      2    0.0376s    0.0365s       True
+        disk      3    0.0516s    0.0556s       True
+        disk      5    0.1199s    0.1147s       True
+        disk     10    0.4682s    0.1204s       True
+        disk     20    1.4384s    0.1178s       True
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+import skimage.morphology
+
+from jicbioimage.transform.morphology import binary_dilation
+
+RADII = [1, 2, 3, 5, 10, 20]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    image = np.random.random_sample((size, size)) > 0.999
+    print("Image {0}x{0}".format(size))
+    print("{:>8} {:>6} {:>10} {:>10} {:>10}".format(
+        "selem", "radius", "skimage", "engine", "identical"))
+    for name, make in [("square", lambda r: np.ones((2 * r + 1,) * 2)),
+                       ("disk", skimage.morphology.disk)]:
+        for radius in RADII:
+            selem = make(radius)
+            expected = skimage.morphology.binary_dilation(image, selem)
+            result = binary_dilation(image, selem)
+            reference = min(timeit.repeat(
+                lambda: skimage.morphology.binary_dilation(image, selem),
+                number=1, repeat=3))
+            engine = min(timeit.repeat(
+                lambda: binary_dilation(image, selem),
+                number=1, repeat=3))
+            print("{:>8} {:>6} {:>9.4f}s {:>9.4f}s {:>10}".format(
+                name, radius, reference, engine,
+                str(np.array_equal(expected, result))))
+
+
+if __name__ == "__main__":
+    main()
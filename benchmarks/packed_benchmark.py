@@ -0,0 +1,46 @@
+"""Benchmark packed masks against boolean masks.
+
+Usage::
+
+    python benchmarks/packed_benchmark.py [size]
+
+Prints the memory used by a boolean and a packed mask and the time of
+binary dilation and of a logical and for both representations.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from jicbioimage.transform.morphology import binary_dilation
+from jicbioimage.transform.packed import pack, logical_and
+from jicbioimage.transform.packed import binary_dilation as packed_dilation
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    mask = np.random.random_sample((size, size)) > 0.99
+    packed = pack(mask)
+    print("Image {0}x{0}".format(size))
+    print("{:>12} {:>12} {:>12}".format("", "bool", "packed"))
+    print("{:>12} {:>12} {:>12}".format("bytes", mask.nbytes, packed.nbytes))
+    for name, selem in [("cross", None),
+                        ("square 3", np.ones((3, 3))),
+                        ("square 9", np.ones((9, 9)))]:
+        print("{:>12} {:>11.4f}s {:>11.4f}s".format(
+            name,
+            best(lambda: binary_dilation(mask, selem)),
+            best(lambda: packed_dilation(packed, selem))))
+    print("{:>12} {:>11.4f}s {:>11.4f}s".format(
+        "and",
+        best(lambda: np.logical_and(mask, mask)),
+        best(lambda: logical_and(packed, packed))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark a fused pipeline against chained transformation calls.
+
+Usage::
+
+    python benchmarks/pipeline_benchmark.py [size [repeats]]
+
+AutoWrite is switched off, so the numbers only include the in-memory
+overhead of the transformation decorator, not the PNG writing it saves.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import (
+    smooth_gaussian,
+    threshold_otsu,
+    remove_small_objects,
+    dilate_binary,
+)
+from jicbioimage.transform.pipeline import Pipeline
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    AutoWrite.on = False
+    image = np.random.random_sample((size, size))
+
+    def chained():
+        smoothed = smooth_gaussian(image, sigma=2)
+        mask = threshold_otsu(smoothed)
+        mask = remove_small_objects(mask, min_size=10)
+        return dilate_binary(mask)
+
+    pipeline = Pipeline()
+    pipeline.add(smooth_gaussian, sigma=2).add(threshold_otsu)
+    pipeline.add(remove_small_objects, min_size=10).add(dilate_binary)
+
+    chained_time = min(timeit.repeat(chained, number=repeats, repeat=3))
+    pipeline_time = min(timeit.repeat(lambda: pipeline(image),
+                                      number=repeats, repeat=3))
+    print("Image {0}x{0}, {1} calls".format(size, repeats))
+    print("chained:  {:.3f} ms/image".format(1e3 * chained_time / repeats))
+    print("pipeline: {:.3f} ms/image".format(1e3 * pipeline_time / repeats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark the overhead of profiling on transformation calls.
+
+Usage::
+
+    python benchmarks/profiling_benchmark.py [size [repeats]]
+
+AutoWrite is switched off and the image is small, so the numbers are
+dominated by the per-call overhead rather than the computation. Example
+output::
+
+    Image 16x16, 10000 calls
+    disabled:         16.7 us/call
+    enabled:          43.0 us/call
+    trace_memory:    250.8 us/call
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import invert, profiling
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    AutoWrite.on = False
+    image = np.random.random_sample((size, size))
+
+    def call():
+        invert(image)
+
+    print("Image {0}x{0}, {1} calls".format(size, repeats))
+    disabled = min(timeit.repeat(call, number=repeats, repeat=3))
+    print("disabled:     {:>8.1f} us/call".format(1e6 * disabled / repeats))
+    for label, trace_memory in (("enabled:", False),
+                                ("trace_memory:", True)):
+        with profiling.profile(trace_memory) as profiler:
+            elapsed = min(timeit.repeat(call, number=repeats, repeat=3))
+            profiler.clear()
+        print("{:<14}{:>8.1f} us/call".format(label, 1e6 * elapsed / repeats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Benchmark the projection engine against reduce_stack.
+
+Usage::
+
+    python benchmarks/projection_benchmark.py [xdim ydim zdim]
+
+The default stack is kept small, because the reduce_stack path calls a
+Python function once per (x, y) position.
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from jicbioimage.core.util.array import reduce_stack
+from jicbioimage.transform.projection import project
+
+Z_FUNCTIONS = [
+    ("max", max),
+    ("min", min),
+    ("mean", np.mean),
+    ("median", np.median),
+]
+
+
+def best_of(func, repeat=3):
+    """Return the best wall time in seconds of repeated calls to func."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    shape = (256, 256, 20)
+    if len(sys.argv) == 4:
+        shape = tuple(int(v) for v in sys.argv[1:])
+    stack = np.random.randint(0, 255, shape).astype(np.uint8)
+
+    print("Stack shape: {}, dtype: {}".format(shape, stack.dtype))
+    print("{:<8} {:>14} {:>14} {:>10}".format(
+        "method", "reduce_stack", "project", "speedup"))
+    for method, z_function in Z_FUNCTIONS:
+        slow = best_of(lambda: reduce_stack(stack, z_function), repeat=1)
+        fast = best_of(lambda: project(stack, method))
+        print("{:<8} {:>13.4f}s {:>13.4f}s {:>9.0f}x".format(
+            method, slow, fast, slow / fast))
+
+
+if __name__ == "__main__":
+    main()
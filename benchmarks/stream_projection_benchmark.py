@@ -0,0 +1,66 @@
+"""Report time and peak memory of streaming projections of a memmap stack.
+
+Usage::
+
+    python benchmarks/stream_projection_benchmark.py [xdim ydim zdim]
+
+Each projection is run in a fresh process so that the peak resident set
+size reported by :func:`resource.getrusage` belongs to that projection
+alone. The stack is written to a temporary file first, one row at a time,
+so that the parent process stays small (the peak is inherited on exec).
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+
+import numpy as np
+
+CHILD = """
+import sys, time, resource
+import numpy as np
+from jicbioimage.transform.projection import stream_project
+fpath, method = sys.argv[1], sys.argv[2]
+shape = tuple(int(v) for v in sys.argv[3:6])
+stack = np.memmap(fpath, dtype=np.uint16, mode="r", shape=shape)
+start = time.time()
+if method != "import":
+    stream_project(stack, method)
+elapsed = time.time() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("{} {}".format(elapsed, peak_kb))
+"""
+
+
+def main():
+    shape = (2048, 2048, 60)
+    if len(sys.argv) == 4:
+        shape = tuple(int(v) for v in sys.argv[1:])
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".dat", delete=False)
+    try:
+        for x in range(shape[0]):
+            row = np.random.randint(0, 65535, shape[1:]).astype(np.uint16)
+            tmp.write(row.tobytes())
+        tmp.close()
+
+        plane_mb = shape[0] * shape[1] * 2 / 1e6
+        stack_mb = plane_mb * shape[2]
+        print("Stack shape: {}, {:.0f} MB on disk, output plane {:.0f} MB"
+              .format(shape, stack_mb, plane_mb))
+        print("{:<8} {:>10} {:>14}".format("method", "time", "peak RSS"))
+        # The "import" row is the baseline of the interpreter and imports.
+        for method in ["import", "max", "min", "mean", "median"]:
+            args = [sys.executable, "-c", CHILD, tmp.name, method]
+            args.extend(str(v) for v in shape)
+            output = subprocess.check_output(args).decode().split()
+            elapsed, peak_kb = float(output[0]), int(output[1])
+            print("{:<8} {:>9.2f}s {:>11.0f} MB".format(
+                method, elapsed, peak_kb / 1e3))
+    finally:
+        os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Benchmark suite covering every transformation in jicbioimage.transform.
+
+Usage::
+
+    python benchmarks/suite.py run [--size full] [--output results.json]
+    python benchmarks/suite.py baseline [--size full] [--baseline FILE]
+    python benchmarks/suite.py check [--size full] [--baseline FILE]
+                                     [--tolerance 0.25]
+                                     [--memory-tolerance 0.10]
+
+Each case calls one public transformation of :mod:`jicbioimage.transform`
+on a synthetic image: smoothed noise with blob like structures, as 2D
+uint8, uint16, float64 and float32 images, a boolean mask thresholded from
+them, a uint16 z-stack and a float32 volume and mask made from it. The
+"small" size uses 512x512 images and a 256x256x16 stack and runs in well
+under a minute; the "full" size uses 4096x4096 images and a 1024x1024x32
+stack.
+
+For every case the best wall time of ``--repeat`` calls and the peak memory
+allocated during one call, as reported by :mod:`tracemalloc` and excluding
+the input image, are measured. AutoWrite and the result cache are turned
+off while measuring.
+
+``run`` prints the measurements and optionally writes them to a JSON file.
+``baseline`` writes them to the baseline file, by default
+``benchmarks/baseline-<size>.json``; baselines are specific to a machine,
+so record one before making changes. ``check`` measures again, unless
+there is no baseline file, and exits with status 1 if any case is slower
+than its baseline by more than the time tolerance, or uses more memory than
+the memory tolerance allows; increases of less than 2 ms and 1 MiB are
+ignored as noise. Cases can be selected with ``--filter``, a substring of
+the case names.
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tracemalloc
+
+import numpy as np
+import scipy.ndimage as ndi
+
+import jicbioimage.transform
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import cache
+from jicbioimage.transform.threshold import clear_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+#: Image side length and stack shape of each size.
+SIZES = {
+    "small": {"side": 512, "stack": (256, 256, 16)},
+    "full": {"side": 4096, "stack": (1024, 1024, 32)},
+}
+
+#: Allowed relative increase in wall time before a case is a regression.
+TIME_TOLERANCE = 0.25
+
+#: Allowed relative increase in peak memory before a case is a regression.
+MEMORY_TOLERANCE = 0.10
+
+#: Increases in wall time below this many seconds are never regressions.
+TIME_SLACK = 0.002
+
+#: Increases in peak memory below this many bytes are never regressions.
+MEMORY_SLACK = 1024 ** 2
+
+
+def blobs(shape, seed=0):
+    """Return smoothed noise in the range 0 to 1 with blob like structures.
+
+    :param shape: shape of the image
+    :param seed: seed of the random number generator
+    :returns: float64 numpy.array
+    """
+    random = np.random.RandomState(seed)
+    noise = random.random_sample(shape)
+    sigma = [4.0] * 2 + [1.0] * (len(shape) - 2)
+    image = ndi.gaussian_filter(noise, sigma)
+    image -= image.min()
+    image /= image.max()
+    # Structure plus a little pixel noise, as in a fluorescence image.
+    image = 0.9 * image + 0.1 * random.random_sample(shape)
+    return image
+
+
+class Images(object):
+    """Lazily created synthetic input images of one size."""
+
+    def __init__(self, size):
+        self.side = SIZES[size]["side"]
+        self.stack_shape = SIZES[size]["stack"]
+        self._images = {}
+
+    def get(self, name):
+        """Return named input image, creating it on first use."""
+        if name not in self._images:
+            self._images[name] = getattr(self, "_" + name)()
+        return self._images[name]
+
+    def _float64(self):
+        return blobs((self.side, self.side))
+
+    def _float32(self):
+        return self.get("float64").astype(np.float32)
+
+    def _uint8(self):
+        return (self.get("float64") * 255).astype(np.uint8)
+
+    def _uint16(self):
+        return (self.get("float64") * 65535).astype(np.uint16)
+
+    def _bool(self):
+        return self.get("float64") > 0.6
+
+    def _stack(self):
+        return (blobs(self.stack_shape, seed=1) * 65535).astype(np.uint16)
+
+    def _volume(self):
+        return (self.get("stack") / 65535.0).astype(np.float32)
+
+    def _volume_mask(self):
+        return self.get("volume") > 0.6
+
+
+#: Benchmark cases: name, transformation, input image and keyword
+#: arguments.
+CASES = [
+    ("max_intensity_projection", "max_intensity_projection", "stack", {}),
+    ("min_intensity_projection", "min_intensity_projection", "stack", {}),
+    ("mean_intensity_projection", "mean_intensity_projection", "stack", {}),
+    ("median_intensity_projection", "median_intensity_projection",
+     "stack", {}),
+    ("percentile_intensity_projection", "percentile_intensity_projection",
+     "stack", {"q": 10}),
+    ("sum_intensity_projection", "sum_intensity_projection", "stack", {}),
+    ("std_intensity_projection", "std_intensity_projection", "stack", {}),
+    ("argmax_intensity_projection", "argmax_intensity_projection",
+     "stack", {}),
+    ("intensity_projections", "intensity_projections", "stack", {}),
+    ("extended_depth_of_field_projection",
+     "extended_depth_of_field_projection", "stack", {}),
+    ("focus_z_map", "focus_z_map", "stack", {}),
+    ("smooth_gaussian/float64", "smooth_gaussian", "float64", {"sigma": 2}),
+    ("smooth_gaussian/float32", "smooth_gaussian", "float32", {"sigma": 2}),
+    ("smooth_gaussian/float64/sigma10", "smooth_gaussian", "float64",
+     {"sigma": 10}),
+    ("smooth_gaussian/volume/3d", "smooth_gaussian", "volume",
+     {"sigma": 2, "spacing": (1, 1, 4)}),
+    ("smooth_gaussian/volume/slices", "smooth_gaussian", "volume",
+     {"sigma": 2, "slice_axis": 2}),
+    ("threshold_otsu/uint8", "threshold_otsu", "uint8", {}),
+    ("threshold_otsu/uint16", "threshold_otsu", "uint16", {}),
+    ("threshold_otsu/float64", "threshold_otsu", "float64", {}),
+    ("threshold_otsu/uint16/packed", "threshold_otsu", "uint16",
+     {"packed": True}),
+    ("threshold_otsu_planes/stack", "threshold_otsu_planes", "stack",
+     {"axis": 2}),
+    ("threshold_multiotsu/uint8", "threshold_multiotsu", "uint8", {}),
+    ("threshold_multiotsu_planes/volume", "threshold_multiotsu_planes",
+     "volume", {"axis": 2}),
+    ("threshold_local_mean/uint16", "threshold_local_mean", "uint16", {}),
+    ("threshold_niblack/float64", "threshold_niblack", "float64", {}),
+    ("threshold_sauvola/uint16", "threshold_sauvola", "uint16", {}),
+    ("threshold_sauvola/uint16/window101", "threshold_sauvola", "uint16",
+     {"window_size": 101}),
+    ("remove_small_objects", "remove_small_objects", "bool", {}),
+    ("invert/uint8", "invert", "uint8", {}),
+    ("invert/float64", "invert", "float64", {}),
+    ("invert/bool", "invert", "bool", {}),
+    ("dilate_binary", "dilate_binary", "bool", {}),
+    ("dilate_binary/disk5", "dilate_binary", "bool",
+     {"selem": "disk5"}),
+    ("erode_binary", "erode_binary", "bool", {}),
+    ("dilate_binary/volume/ball", "dilate_binary", "volume_mask",
+     {"selem": "ball2"}),
+    ("dilate_binary/volume/slices", "dilate_binary", "volume_mask",
+     {"selem": "disk5", "slice_axis": 2}),
+    ("find_edges_sobel", "find_edges_sobel", "float64", {}),
+    ("find_edges_sobel/volume/3d", "find_edges_sobel", "volume",
+     {"spacing": (1, 1, 4)}),
+    ("find_edges_sobel/volume/slices", "find_edges_sobel", "volume",
+     {"slice_axis": 2}),
+    ("find_gradient_sobel/float64", "find_gradient_sobel", "float64", {}),
+    ("find_gradient_sobel/float32/all", "find_gradient_sobel", "float32",
+     {"outputs": ("magnitude", "angle", "x", "y")}),
+    ("find_gradient_sobel/stack", "find_gradient_sobel", "stack", {}),
+]
+
+
+def public_transforms():
+    """Return names of the public transformations of the module."""
+    module = jicbioimage.transform
+    names = []
+    for name in dir(module):
+        value = getattr(module, name)
+        if name.startswith("_") or not callable(value):
+            continue
+        if getattr(value, "__module__", None) == module.__name__:
+            names.append(name)
+    return sorted(names)
+
+
+def uncovered():
+    """Return names of the public transformations without a case."""
+    covered = set(transform for _, transform, _, _ in CASES)
+    return [name for name in public_transforms() if name not in covered]
+
+
+def _arguments(kwargs):
+    """Return keyword arguments with named footprints created."""
+    from jicbioimage.transform.morphology import ball, disk
+    kwargs = dict(kwargs)
+    if kwargs.get("selem") == "disk5":
+        kwargs["selem"] = disk(5)
+    elif kwargs.get("selem") == "ball2":
+        kwargs["selem"] = ball(2, spacing=(1, 1, 4))
+    return kwargs
+
+
+def measure(case, images, repeat=3):
+    """Return wall time and peak memory of a benchmark case.
+
+    :param case: tuple from :data:`CASES`
+    :param images: :class:`Images`
+    :param repeat: number of calls of which the fastest is reported
+    :returns: dictionary with the time in seconds and the peak memory in
+              bytes
+    """
+    _, name, image_name, kwargs = case
+    transform = getattr(jicbioimage.transform, name)
+    image = images.get(image_name)
+    kwargs = _arguments(kwargs)
+
+    def call():
+        # Measure thresholds without the histograms cached by earlier calls.
+        clear_cache()
+        return transform(image, **kwargs)
+
+    elapsed = min(timeit.repeat(call, number=1, repeat=repeat))
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"time": elapsed, "peak_memory": peak}
+
+
+def run(size, pattern=None, repeat=3, log=sys.stdout):
+    """Return measurements of the benchmark cases.
+
+    :param size: "small" or "full"
+    :param pattern: only run cases whose names contain this string
+    :param repeat: number of calls of which the fastest is reported
+    :param log: file to which progress is written, or None
+    :returns: dictionary suitable for writing as JSON
+    """
+    original_autowrite = AutoWrite.on
+    AutoWrite.on = False
+    cache.disable()
+    images = Images(size)
+    results = {}
+    try:
+        for case in CASES:
+            if pattern is not None and pattern not in case[0]:
+                continue
+            results[case[0]] = measure(case, images, repeat)
+            if log is not None:
+                log.write("{:<40} {:>9.4f}s {:>10.1f} MiB\n".format(
+                    case[0], results[case[0]]["time"],
+                    results[case[0]]["peak_memory"] / 1024.0 ** 2))
+    finally:
+        AutoWrite.on = original_autowrite
+    return {
+        "size": size,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=TIME_TOLERANCE,
+            memory_tolerance=MEMORY_TOLERANCE):
+    """Return regressions of current measurements relative to a baseline.
+
+    :param baseline: dictionary as returned by :func:`run`
+    :param current: dictionary as returned by :func:`run`
+    :param tolerance: allowed relative increase in wall time
+    :param memory_tolerance: allowed relative increase in peak memory
+    :returns: list of (case name, message) tuples
+    """
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        allowed = max(reference["time"] * (1 + tolerance),
+                      reference["time"] + TIME_SLACK)
+        if result["time"] > allowed:
+            regressions.append((name, "time {:.4f}s > {:.4f}s".format(
+                result["time"], reference["time"])))
+        allowed = max(reference["peak_memory"] * (1 + memory_tolerance),
+                      reference["peak_memory"] + MEMORY_SLACK)
+        if result["peak_memory"] > allowed:
+            regressions.append((name, "peak memory {} > {} bytes".format(
+                result["peak_memory"], reference["peak_memory"])))
+    return regressions
+
+
+def _default_baseline(size):
+    return os.path.join(HERE, "baseline-{}.json".format(size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["run", "baseline", "check"])
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--filter", default=None,
+                        help="only run cases containing this string")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON file of the baseline")
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float,
+                        default=MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+    baseline_fpath = args.baseline or _default_baseline(args.size)
+    if args.command == "check" and not os.path.isfile(baseline_fpath):
+        parser.error("no baseline file {}; run the baseline command "
+                     "first".format(baseline_fpath))
+
+    missing = uncovered()
+    if missing:
+        sys.stderr.write("Transformations without a benchmark case: "
+                         "{}\n".format(", ".join(missing)))
+
+    current = run(args.size, args.filter, args.repeat)
+    output = args.output
+    if args.command == "baseline":
+        output = baseline_fpath
+    if output is not None:
+        with open(output, "w") as fh:
+            json.dump(current, fh, indent=2, sort_keys=True)
+
+    if args.command != "check":
+        return 0
+    with open(baseline_fpath) as fh:
+        baseline = json.load(fh)
+    regressions = compare(baseline, current, args.tolerance,
+                          args.memory_tolerance)
+    for name, message in regressions:
+        print("REGRESSION {}: {}".format(name, message))
+    if regressions:
+        return 1
+    print("No regressions in {} cases".format(len(current["results"])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
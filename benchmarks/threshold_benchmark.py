@@ -0,0 +1,43 @@
+"""Benchmark Otsu thresholding with a multiplier sweep on a uint16 image.
+
+Usage::
+
+    python benchmarks/threshold_benchmark.py [size]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import skimage.filters
+
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import threshold_otsu
+from jicbioimage.transform.threshold import caching
+
+MULTIPLIERS = [0.6, 0.8, 1.0, 1.2, 1.4]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    AutoWrite.on = False
+    image = np.random.randint(0, 4096, (size, size)).astype(np.uint16)
+
+    def skimage_sweep():
+        for multiplier in MULTIPLIERS:
+            image > skimage.filters.threshold_otsu(image) * multiplier
+
+    def cached_sweep():
+        with caching():
+            for multiplier in MULTIPLIERS:
+                threshold_otsu(image, multiplier=multiplier)
+
+    print("uint16 image {0}x{0}, {1} multipliers".format(
+        size, len(MULTIPLIERS)))
+    for name, func in [("skimage", skimage_sweep), ("cached", cached_sweep)]:
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        print("{:<8} {:.3f}s".format(name, elapsed))
+
+
+if __name__ == "__main__":
+    main()
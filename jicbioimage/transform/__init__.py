@@ -2,153 +2,992 @@
 
 The :mod:`jicbioimage.transform` module contains a number of built-in general
 purpose transformations that have had the
-:func:`jicbioimage.core.transformation` function decorator applied to them.
+:func:`jicbioimage.transform.autowrite.transformation` function decorator,
+an equivalent of :func:`jicbioimage.core.transformation` that can write its
+outputs in the background, applied to them.
+
+Importing this module is fast: scipy, scikit-image and
+:mod:`jicbioimage.core.image`, which imports both, are only imported when a
+transformation that needs them is first called.
 """
 
 import numpy as np
 
-import scipy.ndimage.filters
-
-import skimage.io
-import skimage.morphology
-import skimage.exposure
-import skimage.filters
-
 from jicbioimage.core.util.array import (
     normalise,
-    reduce_stack,
     dtype_contract,
 )
 
-from jicbioimage.core.transform import transformation
+from jicbioimage.transform.focus import (
+    DEFAULT_WINDOW,
+    extended_depth_of_field,
+)
+from jicbioimage.transform.threshold import otsu_value, greater
+from jicbioimage.transform import autowrite, precision, profiling
+from jicbioimage.transform.autowrite import transformation
+from jicbioimage.transform.cache import cached
+from jicbioimage.transform.contracts import is_packed, mask_contract
+from jicbioimage.transform.precision import float_contract
+from jicbioimage.transform.profiling import algorithm
+from jicbioimage.transform.tiling import (
+    BYTES_PER_PIXEL,
+    apply_tiled,
+    gaussian_halo,
+    selem_halo,
+)
 
 
 __version__ = "0.6.0"
 
 
+def _project(stack, method, axis):
+    """Return projection of the stack, streaming it if it is out-of-core.
+
+    Memory-mapped stacks and iterators of z-slices are projected using
+    :func:`jicbioimage.transform.projection.stream_project`; see its
+    documentation for the streaming median approximation. Projections with
+    more than two dimensions are returned as a
+    :class:`jicbioimage.transform.projection.PlaneStack`.
+    """
+    from jicbioimage.transform.projection import (
+        PlaneStack,
+        project,
+        stream_project,
+    )
+    if isinstance(stack, np.memmap) or not isinstance(stack, np.ndarray):
+        projection = stream_project(stack, method, axis=axis)
+    else:
+        projection = project(stack, method, axis)
+    if projection.ndim > 2:
+        projection = PlaneStack.from_array(projection, log_in_history=False)
+    return projection
+
+
+def _check_slice_axis(slice_axis, memory_budget):
+    """Raise ValueError if slices and tiles are both requested."""
+    if slice_axis is not None and memory_budget is not None:
+        msg = "Cannot combine slice_axis {} with a memory_budget"
+        raise(ValueError(msg.format(slice_axis)))
+
+
+def _input_history(image):
+    """Return history of an input image, or an empty one for an array."""
+    from jicbioimage.core.image import History
+    history = getattr(image, "history", None)
+    if history is None:
+        history = History()
+    return history
+
+
 @transformation
-def max_intensity_projection(stack):
+@cached
+@algorithm
+def max_intensity_projection(stack, axis=2):
     """Return maximum intensity projection of a stack.
 
-    :param stack: 3D array from which to project third dimension
-    :returns: :class:`jicbioimage.core.image.Image`
+    An in-memory stack is not copied; only the projection is allocated.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third; e.g. 2 for TCZYX
+                 data, in which case all channels and time points are
+                 projected at once
+    :returns: :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
     """
-    return reduce_stack(stack, max)
+    return _project(stack, "max", axis)
 
 
 @transformation
-def min_intensity_projection(stack):
+@cached
+@algorithm
+def min_intensity_projection(stack, axis=2):
     """Return minimum intensity projection of a stack.
 
-    :param stack: 3D array from which to project third dimension
-    :returns: :class:`jicbioimage.core.image.Image`
+    An in-memory stack is not copied; only the projection is allocated.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third; e.g. 2 for TCZYX
+                 data, in which case all channels and time points are
+                 projected at once
+    :returns: :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
     """
-    return reduce_stack(stack, min)
+    return _project(stack, "min", axis)
 
 
 @transformation
-def mean_intensity_projection(stack):
+@cached
+@algorithm
+def mean_intensity_projection(stack, axis=2):
     """Return mean intensity projection of a stack.
 
-    :param stack: 3D array from which to project third dimension
-    :returns: :class:`jicbioimage.core.image.Image`
+    An in-memory stack is not copied. The mean is accumulated in a float64
+    array the size of the projection and then converted to the dtype of the
+    stack.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third; e.g. 2 for TCZYX
+                 data, in which case all channels and time points are
+                 projected at once
+    :returns: :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
     """
-    return reduce_stack(stack, np.mean)
+    return _project(stack, "mean", axis)
 
 
 @transformation
-def median_intensity_projection(stack):
-    """Return mean intensity projection of a stack.
+@cached
+@algorithm
+def median_intensity_projection(stack, axis=2):
+    """Return median intensity projection of a stack.
+
+    Blocks of the stack are copied with the projected axis first, see
+    :mod:`jicbioimage.transform.rank`; the stack itself is not copied.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third; e.g. 2 for TCZYX
+                 data, in which case all channels and time points are
+                 projected at once
+    :returns: :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
+    """
+    return _project(stack, "median", axis)
 
-    :param stack: 3D array from which to project third dimension
-    :returns: :class:`jicbioimage.core.image.Image`
+
+@transformation
+@cached
+@algorithm
+def percentile_intensity_projection(stack, q, axis=2):
+    """Return percentile intensity projection of a stack.
+
+    Low percentiles, e.g. the 10th, are robust estimates of the background
+    and high percentiles robust alternatives to the maximum. An iterator of
+    z-slices is stacked in memory, because percentiles cannot be computed
+    from a single pass over the slices. Blocks of an array stack are
+    copied with the projected axis first, see
+    :mod:`jicbioimage.transform.rank`.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param q: percentile, between 0 and 100
+    :param axis: axis to project, by default the third
+    :returns: :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
+    :raises: ValueError if q is out of range
+    """
+    from jicbioimage.transform.projection import (
+        PlaneStack,
+        project_percentile,
+    )
+    if not isinstance(stack, np.ndarray):
+        stack = np.dstack(list(stack))
+    projection = project_percentile(stack, q, axis)
+    if projection.ndim > 2:
+        projection = PlaneStack.from_array(projection, log_in_history=False)
+    return projection
+
+
+@transformation
+@cached
+@algorithm
+def extended_depth_of_field_projection(stack, measure="sobel",
+                                       window=DEFAULT_WINDOW, axis=2):
+    """Return extended depth-of-field projection of a stack.
+
+    Each pixel takes its value from the z-slice in which its neighbourhood
+    is sharpest; see :mod:`jicbioimage.transform.focus`.
+
+    Blocks of rows of the stack are converted to float64 to measure focus;
+    the stack itself is not copied.
+
+    :param stack: 3D array, :class:`numpy.memmap` or iterator of 2D
+                  z-slices
+    :param measure: focus measure, "sobel" or "laplacian"
+    :param window: side length of the window over which focus is measured
+    :param axis: z axis of an array, by default the third
+    :returns: :class:`jicbioimage.core.image.Image` with the dtype of the
+              stack
+    """
+    projection, _ = extended_depth_of_field(stack, measure, window, axis)
+    return projection
+
+
+@transformation
+@cached
+@algorithm
+def focus_z_map(stack, measure="sobel", window=DEFAULT_WINDOW, axis=2):
+    """Return index of the sharpest z-slice of each pixel of a stack.
+
+    This is the z-map from which
+    :func:`extended_depth_of_field_projection` gathers its values.
+
+    Blocks of rows of the stack are converted to float64 to measure focus;
+    the stack itself is not copied.
+
+    :param stack: 3D array, :class:`numpy.memmap` or iterator of 2D
+                  z-slices
+    :param measure: focus measure, "sobel" or "laplacian"
+    :param window: side length of the window over which focus is measured
+    :param axis: z axis of an array, by default the third
+    :returns: integer :class:`jicbioimage.core.image.Image`
+    """
+    _, z_map = extended_depth_of_field(stack, measure, window, axis)
+    return z_map
+
+
+@transformation
+@cached
+@algorithm
+def sum_intensity_projection(stack, axis=2):
+    """Return sum intensity projection of a stack.
+
+    An in-memory stack is not copied. The sum is accumulated in float64 and
+    converted if the precision policy of
+    :mod:`jicbioimage.transform.precision` asks for float32.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third
+    :returns: float64 :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
+    """
+    return _project(stack, "sum", axis)
+
+
+@transformation
+@cached
+@algorithm
+def std_intensity_projection(stack, axis=2):
+    """Return standard deviation intensity projection of a stack.
+
+    The standard deviation is computed in float64 by :func:`numpy.std`,
+    which makes float64 temporaries the size of the stack, and converted if
+    the precision policy of :mod:`jicbioimage.transform.precision` asks for
+    float32.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third
+    :returns: float64 :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
     """
-    return reduce_stack(stack, np.median)
+    return _project(stack, "std", axis)
 
 
 @transformation
-@dtype_contract(input_dtype=np.float, output_dtype=np.float)
-def smooth_gaussian(image, sigma=1):
+@cached
+@algorithm
+def argmax_intensity_projection(stack, axis=2):
+    """Return index along the projected axis of the maximum intensity.
+
+    This is the z-index of the pixels of the maximum intensity projection,
+    i.e. a height map of the brightest structures.
+
+    An in-memory stack is not copied; only the projection is allocated.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param axis: axis to project, by default the third
+    :returns: integer :class:`jicbioimage.core.image.Image`, or
+              :class:`jicbioimage.transform.projection.PlaneStack` if the
+              projection has more than two dimensions
+    """
+    return _project(stack, "argmax", axis)
+
+
+_STATISTIC_TRANSFORMS = {
+    "max": max_intensity_projection,
+    "min": min_intensity_projection,
+    "mean": mean_intensity_projection,
+    "sum": sum_intensity_projection,
+    "std": std_intensity_projection,
+    "argmax": argmax_intensity_projection,
+}
+
+
+def intensity_projections(stack, statistics=("max", "min", "mean", "std"),
+                          axis=2):
+    """Return several intensity projections of a stack from a single read.
+
+    The stack is read once and all the requested statistics are computed
+    from each block of it, see
+    :func:`jicbioimage.transform.projection.project_statistics`. Each
+    projection is identical to, and has the same history event and
+    AutoWrite output as, the result of the corresponding single projection
+    transformation, e.g. :func:`max_intensity_projection` for "max". Only
+    one block of the stack at a time is copied.
+
+    :param stack: array from which to project one axis,
+                  :class:`numpy.memmap` or iterator of 2D z-slices
+    :param statistics: names of the statistics, any of "max", "min",
+                       "mean", "sum", "std" and "argmax"
+    :param axis: axis to project, by default the third
+    :returns: :class:`collections.OrderedDict` mapping the names of the
+              statistics to :class:`jicbioimage.core.image.Image` instances
+    :raises: ValueError if a statistic is unknown
+    """
+    from jicbioimage.transform.projection import (
+        PlaneStack,
+        project_statistics,
+    )
+    history = _input_history(stack)
+    with profiling.record("intensity_projections", stack):
+        with profiling.phase("algorithm"):
+            projections = project_statistics(stack, statistics, axis=axis)
+        with profiling.phase("wrapping"):
+            for statistic, projection in projections.items():
+                if projection.ndim > 2:
+                    projection = PlaneStack.from_array(
+                        projection, log_in_history=False)
+                func = _STATISTIC_TRANSFORMS[statistic]
+                projections[statistic] = autowrite.as_image(
+                    projection, history, func.__wrapped__, [],
+                    {"axis": axis})
+    return projections
+
+
+@transformation
+@cached
+@dtype_contract(input_dtype=[np.float, np.float32],
+                output_dtype=[np.float, np.float32])
+@float_contract
+@algorithm
+def smooth_gaussian(image, sigma=1, out=None, memory_budget=None,
+                    workers=None, backend="direct", spacing=None,
+                    slice_axis=None):
     """Returns Gaussian smoothed image.
 
+    Float32 images are smoothed in single precision and give a float32
+    result, unless the precision policy of
+    :mod:`jicbioimage.transform.precision` says otherwise. The image is not
+    copied if its dtype matches the policy, otherwise it is converted once.
+    Only the output is allocated, unless ``out`` is given.
+
+    By default the image is convolved directly, as by
+    :func:`scipy.ndimage.gaussian_filter`. The "fft" backend convolves using
+    FFTs, which is faster for large sigmas and agrees with direct
+    convolution to within floating point rounding; the "auto" backend picks
+    the faster of the two, see :mod:`jicbioimage.transform.filters`. Tiled
+    results are bit for bit identical to untiled results of the "direct"
+    backend, so "auto" always resolves to "direct" when a ``memory_budget``
+    is given.
+
+    Volumes are smoothed in 3D, with one sigma per axis or a sigma in the
+    units of an anisotropic voxel spacing, or slice by slice in 2D, see
+    :mod:`jicbioimage.transform.volume`.
+
     :param image: numpy array or :class:`jicbioimage.core.image.Image`
-    :param sigma: standard deviation
+    :param sigma: standard deviation, scalar or one per axis
+    :param out: optional float array to write the result to
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`
+    :param workers: number of threads used to process tiles or slices
+    :param backend: "auto", "direct" or "fft"
+    :param spacing: voxel size along each axis; if given, sigma is in the
+                    same units
+    :param slice_axis: if given, smooth each 2D slice of a 3D image along
+                       this axis separately, in parallel threads
     :returns: :class:`jicbioimage.core.image.Image`
+    :raises: ValueError if sigma or the spacing do not fit the image, or
+             both slice_axis and memory_budget are given
     """
-    return scipy.ndimage.filters.gaussian_filter(image,
-                                                 sigma=sigma,
-                                                 mode="nearest")
+    from jicbioimage.transform.filters import gaussian, select_backend
+    from jicbioimage.transform.volume import (
+        apply_slices,
+        drop_axis,
+        pixel_sigma,
+    )
+    _check_slice_axis(slice_axis, memory_budget)
+    sigma = pixel_sigma(sigma, spacing, image.ndim)
+    shape = image.shape
+    if slice_axis is not None:
+        sigma = drop_axis(sigma, slice_axis)
+        shape = drop_axis(shape, slice_axis)
+    if backend == "auto" and memory_budget is not None:
+        backend = "direct"
+    elif backend == "auto":
+        # Select the backend for the whole image, so that all slices use
+        # the same one.
+        backend = select_backend(shape, sigma, image.dtype)
+
+    def smooth(array, output=None):
+        return gaussian(array, sigma, backend=backend, output=output)
+    if slice_axis is not None:
+        return apply_slices(smooth, image, slice_axis, image.dtype, out=out,
+                            workers=workers)
+    if memory_budget is None:
+        return smooth(image, output=out)
+    return apply_tiled(smooth, image, gaussian_halo(sigma), image.dtype,
+                       memory_budget=memory_budget,
+                       bytes_per_pixel=BYTES_PER_PIXEL["smooth_gaussian"],
+                       workers=workers, out=out)
 
 
 @transformation
-@dtype_contract(output_dtype=np.bool)
-def threshold_otsu(image, multiplier=1.0):
+@cached
+@mask_contract(output_dtype=np.bool)
+@algorithm
+def threshold_otsu(image, multiplier=1.0, out=None, packed=False):
     """Return image thresholded using Otsu's method.
+
+    Within a :func:`jicbioimage.transform.threshold.caching` context the
+    histogram of 8 and 16 bit integer images is cached, so thresholding the
+    same image with different multipliers only computes it once. Use
+    :func:`jicbioimage.transform.threshold.otsu_value` to get the threshold
+    value without thresholding the image.
+
+    The image is not copied: the histogram is computed in chunks of pixels,
+    see :mod:`jicbioimage.transform.threshold`. Only the output is
+    allocated, unless ``out`` is given.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param multiplier: scale factor applied to the Otsu threshold
+    :param out: optional boolean array or
+                :class:`jicbioimage.transform.packed.PackedMask` to write
+                the result to
+    :param packed: return a :class:`jicbioimage.transform.packed.PackedMask`
+    :returns: boolean :class:`jicbioimage.core.image.Image`
+    """
+    value = otsu_value(image) * multiplier
+    if packed or is_packed(out):
+        from jicbioimage.transform.packed import pack
+        return pack(greater(image, value), out=out)
+    return greater(image, value, out=out)
+
+
+def _per_plane(values, planes):
+    """Return one value per plane shaped to broadcast against the planes."""
+    return np.reshape(values, (-1,) + (1,) * (planes.ndim - 1))
+
+
+def threshold_otsu_planes(stack, multiplier=1.0, axis=0):
+    """Return each plane of a stack thresholded using Otsu's method.
+
+    Use for the z-slices of a z-stack or a batch of images of the same
+    shape. The histograms of all the planes are computed together, with one
+    :func:`numpy.bincount` per group of planes for 8 and 16 bit integer
+    stacks, and the thresholds of all the planes at once, see
+    :func:`jicbioimage.transform.threshold.otsu_values`. Each plane of the
+    mask is the same as the result of :func:`threshold_otsu` applied to the
+    plane on its own.
+
+    :param stack: numpy array, or
+                  :class:`jicbioimage.core.image.Image`, of 2D planes
+    :param multiplier: scale factor applied to the Otsu thresholds
+    :param axis: axis indexing the planes, by default the first
+    :returns: tuple with the boolean
+              :class:`jicbioimage.transform.projection.PlaneStack` mask,
+              whose first axis indexes the planes, and the numpy.array of
+              the thresholds, scaled by the multiplier, one per plane
+    :raises: ValueError if the stack has fewer than three dimensions
+    """
+    from jicbioimage.transform.projection import PlaneStack
+    from jicbioimage.transform.threshold import otsu_values
+    history = _input_history(stack)
+    with profiling.record("threshold_otsu_planes", stack):
+        with profiling.phase("algorithm"):
+            values = otsu_values(stack, axis) * multiplier
+            planes = np.moveaxis(np.asarray(stack), axis, 0)
+            mask = np.greater(planes, _per_plane(values, planes))
+        with profiling.phase("wrapping"):
+            mask = autowrite.as_image(
+                PlaneStack.from_array(mask, log_in_history=False), history,
+                threshold_otsu_planes, [],
+                {"multiplier": multiplier, "axis": axis})
+    return mask, values
+
+
+@transformation
+@cached
+@algorithm
+def threshold_multiotsu(image, classes=3):
+    """Return image split into classes using multi-level Otsu thresholds.
+
+    The thresholds maximise the variance between the classes, as those of
+    :func:`skimage.filters.threshold_multiotsu`, see
+    :func:`jicbioimage.transform.threshold.multiotsu_value`. The histogram
+    of 8 and 16 bit integer images is shared with :func:`threshold_otsu`
+    within a :func:`jicbioimage.transform.threshold.caching` context.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param classes: number of classes, at least 2
+    :returns: uint8 :class:`jicbioimage.core.image.Image` of the class of
+              each pixel, from 0 for the darkest to ``classes - 1``
+    :raises: ValueError if there are fewer than two classes or the image
+             has fewer distinct values than classes
+    """
+    from jicbioimage.transform.threshold import classify, multiotsu_value
+    return classify(image, multiotsu_value(image, classes))
+
+
+def threshold_multiotsu_planes(stack, classes=3, axis=0):
+    """Return each plane of a stack split into classes by multi-level Otsu.
+
+    The histograms of all the planes are computed together, as by
+    :func:`threshold_otsu_planes`, and the thresholds of all the planes at
+    once, see :func:`jicbioimage.transform.threshold.multiotsu_values`.
+    Each plane of the labels is the same as the result of
+    :func:`threshold_multiotsu` applied to the plane on its own.
+
+    :param stack: numpy array, or
+                  :class:`jicbioimage.core.image.Image`, of 2D planes
+    :param classes: number of classes, at least 2
+    :param axis: axis indexing the planes, by default the first
+    :returns: tuple with the uint8
+              :class:`jicbioimage.transform.projection.PlaneStack` of the
+              class of each pixel, whose first axis indexes the planes, and
+              the numpy.array of the ``classes - 1`` thresholds of each plane
+    :raises: ValueError if there are fewer than two classes, the stack has
+             fewer than three dimensions or a plane has fewer distinct
+             values than classes
     """
-    otsu_value = skimage.filters.threshold_otsu(image)
-    return image > otsu_value * multiplier
+    from jicbioimage.transform.projection import PlaneStack
+    from jicbioimage.transform.threshold import classify, multiotsu_values
+    history = _input_history(stack)
+    with profiling.record("threshold_multiotsu_planes", stack):
+        with profiling.phase("algorithm"):
+            values = multiotsu_values(stack, classes, axis)
+            planes = np.moveaxis(np.asarray(stack), axis, 0)
+            labels = classify(planes, [_per_plane(column, planes)
+                                       for column in values.T])
+        with profiling.phase("wrapping"):
+            labels = autowrite.as_image(
+                PlaneStack.from_array(labels, log_in_history=False), history,
+                threshold_multiotsu_planes, [],
+                {"classes": classes, "axis": axis})
+    return labels, values
+
+
+def _local_threshold(image, method, window_size, k, r, multiplier, out,
+                     packed, memory_budget, workers):
+    """Return image thresholded using a local threshold method."""
+    from jicbioimage.transform.adaptive import (
+        dynamic_range,
+        halo,
+        local_threshold,
+    )
+    if r is None:
+        # Fixed once for the whole image, so that all tiles use the same.
+        r = dynamic_range(image.dtype)
+    mask_out = None if is_packed(out) else out
+
+    def threshold(array):
+        value = local_threshold(array, method, window_size, k, r)
+        if multiplier != 1:
+            value *= multiplier
+        return np.greater(array, value)
+    if memory_budget is None:
+        mask = threshold(image)
+        if mask_out is not None:
+            mask_out[...] = mask
+            mask = mask_out
+    else:
+        mask = apply_tiled(threshold, image, halo(window_size, image.ndim),
+                           bool, memory_budget=memory_budget,
+                           bytes_per_pixel=BYTES_PER_PIXEL["local_threshold"],
+                           workers=workers, out=mask_out)
+    if packed or is_packed(out):
+        from jicbioimage.transform.packed import pack
+        return pack(mask, out=out)
+    return mask
 
 
 @transformation
-@dtype_contract(input_dtype=np.bool, output_dtype=np.bool)
-def remove_small_objects(image, min_size=50, connectivity=1):
+@cached
+@mask_contract(output_dtype=np.bool)
+@algorithm
+def threshold_local_mean(image, window_size=15, multiplier=1.0, out=None,
+                         packed=False, memory_budget=None, workers=None):
+    """Return image thresholded at the mean of a window around each pixel.
+
+    The local means are computed from summed-area tables, so that the cost
+    does not depend on the window size, see
+    :mod:`jicbioimage.transform.adaptive`. Beyond its edges the image is
+    extended by reflection. The tables and the local thresholds are
+    allocated as int64 or float64 arrays the size of the image, or of each
+    tile if ``memory_budget`` is given.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param window_size: odd side length of the window, or one per axis
+    :param multiplier: scale factor applied to the local thresholds
+    :param out: optional boolean array or
+                :class:`jicbioimage.transform.packed.PackedMask` to write
+                the result to
+    :param packed: return a :class:`jicbioimage.transform.packed.PackedMask`
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`
+    :param workers: number of threads used to process tiles
+    :returns: boolean :class:`jicbioimage.core.image.Image`
+    :raises: ValueError if the window size is not odd
+    """
+    return _local_threshold(image, "mean", window_size, 0, None, multiplier,
+                            out, packed, memory_budget, workers)
+
+
+@transformation
+@cached
+@mask_contract(output_dtype=np.bool)
+@algorithm
+def threshold_niblack(image, window_size=15, k=0.2, multiplier=1.0,
+                      out=None, packed=False, memory_budget=None,
+                      workers=None):
+    """Return image thresholded using Niblack's method.
+
+    The threshold of each pixel is ``mean - k * std`` of the window around
+    it, as in :func:`skimage.filters.threshold_niblack`, computed from
+    summed-area tables, so that the cost does not depend on the window
+    size, see :mod:`jicbioimage.transform.adaptive`. The tables and the
+    local statistics are allocated as int64 or float64 arrays the size of
+    the image, or of each tile if ``memory_budget`` is given.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param window_size: odd side length of the window, or one per axis
+    :param k: weight of the local standard deviation
+    :param multiplier: scale factor applied to the local thresholds
+    :param out: optional boolean array or
+                :class:`jicbioimage.transform.packed.PackedMask` to write
+                the result to
+    :param packed: return a :class:`jicbioimage.transform.packed.PackedMask`
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`
+    :param workers: number of threads used to process tiles
+    :returns: boolean :class:`jicbioimage.core.image.Image`
+    :raises: ValueError if the window size is not odd
+    """
+    return _local_threshold(image, "niblack", window_size, k, None,
+                            multiplier, out, packed, memory_budget, workers)
+
+
+@transformation
+@cached
+@mask_contract(output_dtype=np.bool)
+@algorithm
+def threshold_sauvola(image, window_size=15, k=0.2, r=None, multiplier=1.0,
+                      out=None, packed=False, memory_budget=None,
+                      workers=None):
+    """Return image thresholded using Sauvola's method.
+
+    The threshold of each pixel is ``mean * (1 + k * (std / r - 1))`` of
+    the window around it, as in :func:`skimage.filters.threshold_sauvola`,
+    computed from summed-area tables, so that the cost does not depend on
+    the window size, see :mod:`jicbioimage.transform.adaptive`. The tables
+    and the local statistics are allocated as int64 or float64 arrays the
+    size of the image, or of each tile if ``memory_budget`` is given.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param window_size: odd side length of the window, or one per axis
+    :param k: weight of the local standard deviation
+    :param r: dynamic range of the standard deviation, by default half the
+              range of the dtype, where float images range from -1 to 1
+    :param multiplier: scale factor applied to the local thresholds
+    :param out: optional boolean array or
+                :class:`jicbioimage.transform.packed.PackedMask` to write
+                the result to
+    :param packed: return a :class:`jicbioimage.transform.packed.PackedMask`
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`
+    :param workers: number of threads used to process tiles
+    :returns: boolean :class:`jicbioimage.core.image.Image`
+    :raises: ValueError if the window size is not odd
+    """
+    return _local_threshold(image, "sauvola", window_size, k, r, multiplier,
+                            out, packed, memory_budget, workers)
+
+
+@transformation
+@cached
+@mask_contract(input_dtype=np.bool, output_dtype=np.bool)
+@algorithm
+def remove_small_objects(image, min_size=50, connectivity=1, out=None):
     """Remove small objects from an boolean image.
 
+    The result is the same as that of
+    :func:`skimage.morphology.remove_small_objects`. To apply several size
+    filters to the same mask, label it once using
+    :class:`jicbioimage.transform.components.Components`.
+
+    A :class:`jicbioimage.transform.packed.PackedMask` is unpacked and the
+    result packed again. An int32 label image and the sizes of the
+    components are allocated besides the output.
+
     :param image: boolean numpy array or :class:`jicbioimage.core.image.Image`
+    :param min_size: smallest size of the objects kept
+    :param connectivity: maximum number of orthogonal steps between
+                         neighbouring pixels
+    :param out: optional boolean array to write the result to
     :returns: boolean :class:`jicbioimage.core.image.Image`
     """
-    return skimage.morphology.remove_small_objects(image,
-                                                   min_size=min_size,
-                                                   connectivity=connectivity)
+    from jicbioimage.transform.components import Components
+    components = Components(image, connectivity)
+    if is_packed(image):
+        from jicbioimage.transform.packed import pack
+        return pack(components.mask(min_size=min_size), out=out)
+    return components.mask(min_size=min_size, out=out)
 
 
 @transformation
-def invert(image):
+@cached
+@algorithm
+def invert(image, out=None):
     """Return an inverted image of the same dtype.
 
-    Assumes the full range of the input dtype is in use and
-    that no negative values are present in the input image.
+    Integer images are inverted with respect to the full range of their
+    dtype, i.e. ``min + max - value``; for unsigned integers this is
+    ``max - value``. Float images are assumed to be in the range 0 to 1 and
+    are inverted to ``1 - value``. Boolean images are logically negated.
+
+    No temporary arrays are created; the only allocation is the output
+    array, unless one is passed in using ``out``. Pass the input image as
+    ``out`` to invert it in place.
 
     :param image: :class:`jicbioimage.core.image.Image`
+    :param out: optional array of the same dtype to write the result to
     :returns: inverted image of the same dtype as the input
+    :raises: TypeError if the image is not boolean, integer or float
     """
     if image.dtype == bool:
-        return np.logical_not(image)
-    maximum = np.iinfo(image.dtype).max
-    maximum_array = np.ones(image.shape, dtype=image.dtype) * maximum
-    return maximum_array - image
+        return np.logical_not(image, out=out)
+    if image.dtype.kind in "ui":
+        # Bitwise not maps value to (min + max - value) for both unsigned
+        # and two's complement signed integers.
+        return np.invert(image, out=out)
+    if image.dtype.kind == "f":
+        return np.subtract(image.dtype.type(1), image, out=out)
+    msg = "Invalid dtype {}. Allowed dtype(s): bool, integer, float"
+    raise(TypeError(msg.format(image.dtype)))
 
 
 @transformation
-@dtype_contract(input_dtype=bool, output_dtype=bool)
-def dilate_binary(image, selem=None):
+@cached
+@mask_contract(input_dtype=bool, output_dtype=bool)
+@algorithm
+def dilate_binary(image, selem=None, iterations=1, out=None,
+                  memory_budget=None, workers=None, slice_axis=None):
     """Return dilated image.
 
+    The image is not copied; only the output is allocated, unless ``out``
+    is given. Some footprints need one temporary mask, see
+    :mod:`jicbioimage.transform.morphology`.
+
+    A 3D image is processed in 3D, e.g. with a footprint created by
+    :func:`jicbioimage.transform.morphology.ball`, or slice by slice with a
+    2D footprint if slice_axis is given, see
+    :mod:`jicbioimage.transform.volume`.
+
     :param image: :class:`jicbioimage.core.image.Image`
     :param selem: neighborhood expressed as 1's and 0's, default is a cross
+    :param iterations: number of times to apply the dilation
+    :param out: optional boolean array to write the result to
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`; ignored for
+                          a :class:`jicbioimage.transform.packed.PackedMask`
+    :param workers: number of threads used to process tiles or slices
+    :param slice_axis: if given, process each 2D slice of a 3D image along
+                       this axis separately, in parallel threads; ignored
+                       for a :class:`jicbioimage.transform.packed.PackedMask`
     :returns: dilated image
+    :raises: ValueError if both slice_axis and memory_budget are given
     """
-    return skimage.morphology.binary_dilation(image, selem)
+    from jicbioimage.transform.morphology import binary_dilation
+
+    def dilate(array):
+        return binary_dilation(array, selem, iterations)
+    if is_packed(image):
+        from jicbioimage.transform import packed
+        return packed.binary_dilation(image, selem, iterations, out=out)
+    _check_slice_axis(slice_axis, memory_budget)
+    if slice_axis is not None:
+        from jicbioimage.transform.volume import apply_slices
+        return apply_slices(dilate, image, slice_axis, bool, out=out,
+                            workers=workers)
+    if memory_budget is None:
+        return binary_dilation(image, selem, iterations, out=out)
+    return apply_tiled(dilate, image, selem_halo(selem) * iterations, bool,
+                       memory_budget=memory_budget,
+                       bytes_per_pixel=BYTES_PER_PIXEL["binary_morphology"],
+                       workers=workers, out=out)
 
 
 @transformation
-@dtype_contract(input_dtype=bool, output_dtype=bool)
-def erode_binary(image, selem=None):
+@cached
+@mask_contract(input_dtype=bool, output_dtype=bool)
+@algorithm
+def erode_binary(image, selem=None, iterations=1, out=None,
+                 memory_budget=None, workers=None, slice_axis=None):
     """Return eroded image.
 
+    The image is not copied; only the output is allocated, unless ``out``
+    is given. Some footprints need one temporary mask, see
+    :mod:`jicbioimage.transform.morphology`.
+
+    A 3D image is processed in 3D, e.g. with a footprint created by
+    :func:`jicbioimage.transform.morphology.ball`, or slice by slice with a
+    2D footprint if slice_axis is given, see
+    :mod:`jicbioimage.transform.volume`.
+
     :param image: :class:`jicbioimage.core.image.Image`
     :param selem: neighborhood expressed as 1's and 0's, default is a cross
+    :param iterations: number of times to apply the erosion
+    :param out: optional boolean array to write the result to
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`; ignored for
+                          a :class:`jicbioimage.transform.packed.PackedMask`
+    :param workers: number of threads used to process tiles or slices
+    :param slice_axis: if given, process each 2D slice of a 3D image along
+                       this axis separately, in parallel threads; ignored
+                       for a :class:`jicbioimage.transform.packed.PackedMask`
     :returns: eroded image
+    :raises: ValueError if both slice_axis and memory_budget are given
     """
-    return skimage.morphology.binary_erosion(image, selem)
+    from jicbioimage.transform.morphology import binary_erosion
+
+    def erode(array):
+        return binary_erosion(array, selem, iterations)
+    if is_packed(image):
+        from jicbioimage.transform import packed
+        return packed.binary_erosion(image, selem, iterations, out=out)
+    _check_slice_axis(slice_axis, memory_budget)
+    if slice_axis is not None:
+        from jicbioimage.transform.volume import apply_slices
+        return apply_slices(erode, image, slice_axis, bool, out=out,
+                            workers=workers)
+    if memory_budget is None:
+        return binary_erosion(image, selem, iterations, out=out)
+    return apply_tiled(erode, image, selem_halo(selem) * iterations, bool,
+                       memory_budget=memory_budget,
+                       bytes_per_pixel=BYTES_PER_PIXEL["binary_morphology"],
+                       workers=workers, out=out)
 
 @transformation
-@dtype_contract(output_dtype=np.float)
-def find_edges_sobel(image, mask=None):
+@cached
+@dtype_contract(output_dtype=[np.float64, np.float32])
+@float_contract
+@algorithm
+def find_edges_sobel(image, mask=None, memory_budget=None, workers=None,
+                     spacing=None, slice_axis=None):
     """Return edges detected using the Sobel method.
 
+    The result is float32 for float32 images and float64 otherwise, unless
+    the precision policy of :mod:`jicbioimage.transform.precision` says
+    otherwise. A float image is not copied if its dtype matches the policy,
+    otherwise it is converted once; integer images are converted to float
+    by :func:`skimage.filters.sobel`. The gradients along the two axes are
+    computed in temporary arrays the size of the image.
+
+    A 3D image is processed with the 3D Sobel operator, whose derivatives
+    are per unit of the voxel spacing if it is given, see
+    :func:`jicbioimage.transform.gradient.sobel_magnitude`, or slice by
+    slice in 2D if slice_axis is given, see
+    :mod:`jicbioimage.transform.volume`.
+
     :param image: :class:`jicbioimage.core.image.Image`
     :param mask: Optional mask indicating regions to ignore
-    :returns: eroded image
+    :param memory_budget: if given, process the image in tiles using at
+                          most this many bytes of working memory, see
+                          :mod:`jicbioimage.transform.tiling`
+    :param workers: number of threads used to process tiles or slices
+    :param spacing: voxel size along each axis
+    :param slice_axis: if given, find the edges of each 2D slice of a 3D
+                       image along this axis separately, in parallel
+                       threads
+    :returns: float :class:`jicbioimage.core.image.Image`
+    :raises: ValueError if the spacing does not fit the image, or both
+             slice_axis and memory_budget are given
+    """
+    import skimage.filters
+    import skimage.util
+    from jicbioimage.transform.volume import drop_axis, voxel_spacing
+    _check_slice_axis(slice_axis, memory_budget)
+    if precision.float_dtype(np.float64) == np.float32 and \
+            image.dtype.kind != "f":
+        # Scaled like skimage.filters.sobel does for float64.
+        image = skimage.util.img_as_float32(image)
+    output_dtype = np.float64
+    if image.dtype.kind == "f":
+        output_dtype = np.result_type(image.dtype, np.float32)
+    if spacing is not None:
+        spacing = voxel_spacing(spacing, image.ndim)
+        if slice_axis is not None:
+            spacing = drop_axis(spacing, slice_axis)
+
+    def sobel(array, mask_tile=None):
+        if spacing is None:
+            return skimage.filters.sobel(array, mask=mask_tile)
+        from jicbioimage.transform.gradient import sobel_magnitude
+        return sobel_magnitude(array, spacing, mask_tile, output_dtype)
+    extra = None if mask is None else [mask]
+    if slice_axis is not None:
+        from jicbioimage.transform.volume import apply_slices
+        return apply_slices(sobel, image, slice_axis, output_dtype,
+                            workers=workers, extra=extra)
+    if memory_budget is None:
+        return sobel(image, mask)
+    # The Sobel kernel and the erosion of the mask both reach one pixel.
+    return apply_tiled(sobel, image, 1, output_dtype,
+                       memory_budget=memory_budget,
+                       bytes_per_pixel=BYTES_PER_PIXEL["find_edges_sobel"],
+                       workers=workers, extra=extra)
+
+
+def find_gradient_sobel(image, outputs=("magnitude", "angle"), mask=None,
+                        dtype=None, axis=2, workers=None):
+    """Return several outputs of a single Sobel gradient of an image.
+
+    The derivatives along the rows and columns are computed once and the
+    requested outputs, any of "magnitude", "angle", "x" and "y", are all
+    derived from them, see :mod:`jicbioimage.transform.gradient`. The
+    magnitude is the same as the result of :func:`find_edges_sobel`. The
+    outputs are float32 for float32 images and float64 otherwise, unless
+    the precision policy of :mod:`jicbioimage.transform.precision` or the
+    dtype argument says otherwise. A 3D image is processed as independent
+    2D slices along the z axis, in parallel threads.
+
+    :param image: 2D or 3D :class:`jicbioimage.core.image.Image`
+    :param outputs: names of the outputs
+    :param mask: Optional mask indicating regions to ignore, with the shape
+                 of the image or of one of its 2D slices; all outputs are
+                 zero in and next to these regions
+    :param dtype: optional float dtype of the computation and the outputs
+    :param axis: z axis of a 3D image, by default the third
+    :param workers: number of threads used to process the slices of a 3D
+                    image, defaults to the number of CPUs
+    :returns: :class:`collections.OrderedDict` mapping the names of the
+              outputs to float :class:`jicbioimage.core.image.Image`
+              instances
+    :raises: ValueError if an output is unknown or the image is not 2D or 3D
     """
-    return skimage.filters.sobel(image, mask=mask)
+    from jicbioimage.transform.gradient import sobel_gradient
+    history = _input_history(image)
+    if dtype is None:
+        default = np.float64
+        if image.dtype.kind == "f":
+            default = np.result_type(image.dtype, np.float32)
+        dtype = precision.float_dtype(default)
+    kwargs = {"mask": mask, "dtype": np.dtype(dtype).name, "axis": axis}
+    with profiling.record("find_gradient_sobel", image):
+        with profiling.phase("algorithm"):
+            gradient = sobel_gradient(image, outputs, dtype, mask, axis,
+                                      workers)
+        with profiling.phase("wrapping"):
+            for name, array in gradient.items():
+                kwargs["output"] = name
+                gradient[name] = autowrite.as_image(
+                    array, history, find_gradient_sobel, [], kwargs)
+    return gradient
@@ -0,0 +1,185 @@
+"""Module containing local, adaptive, thresholding.
+
+A local threshold is computed for every pixel from the statistics of the
+intensities in a window centred on it:
+
+- "mean": the local mean
+- "niblack": ``mean - k * std``, as :func:`skimage.filters.threshold_niblack`
+- "sauvola": ``mean * (1 + k * (std / r - 1))``, as
+  :func:`skimage.filters.threshold_sauvola`
+
+The window sums are computed from summed-area tables, i.e. integral images,
+with four lookups per pixel in 2D, so that the cost does not depend on the
+size of the window. As in scikit-image, the image is extended beyond its
+edges by reflection (``numpy.pad`` with ``mode="reflect"``).
+
+For boolean and 8 and 16 bit integer images the tables are int64 and the
+window sums exact, so that results are identical however the image is
+tiled. Other images use float64 tables, whose results agree with those of
+scikit-image to within floating point rounding.
+"""
+
+import itertools
+
+import numpy as np
+
+#: Names of the local threshold methods.
+METHODS = ("mean", "niblack", "sauvola")
+
+#: Default side length of the window, as in scikit-image.
+DEFAULT_WINDOW_SIZE = 15
+
+
+def window_shape(window_size, ndim):
+    """Return side length of the window along each axis.
+
+    :param window_size: odd integer, or one odd integer per axis
+    :param ndim: number of dimensions of the image
+    :returns: tuple of ints
+    :raises: ValueError if the window sizes are not odd positive integers
+             or there are not as many as axes
+    """
+    sizes = tuple(np.atleast_1d(window_size).tolist())
+    if len(sizes) == 1:
+        sizes = sizes * ndim
+    if len(sizes) != ndim or not all(
+            int(s) == s and s > 0 and s % 2 == 1 for s in sizes):
+        msg = "Window size must be one or {} odd positive integers, got {}"
+        raise(ValueError(msg.format(ndim, window_size)))
+    return tuple(int(s) for s in sizes)
+
+
+def halo(window_size, ndim=2):
+    """Return number of pixels the window reaches beyond a pixel.
+
+    :param window_size: odd integer, or one odd integer per axis
+    :param ndim: number of dimensions of the image
+    :returns: int
+    """
+    return max(s // 2 for s in window_shape(window_size, ndim))
+
+
+def _is_exact(image):
+    """Return True if the window sums of the image are computed exactly."""
+    return image.dtype.kind == "b" or (image.dtype.kind in "ui" and
+                                       image.dtype.itemsize <= 2)
+
+
+def summed_area_table(image, square=False):
+    """Return summed-area table of an image, with a leading zero per axis.
+
+    Element ``[i, j]`` is the sum of ``image[:i, :j]``.
+
+    :param image: numpy.array
+    :param square: if True, sum the squares of the values
+    :returns: int64 numpy.array for boolean and 8 and 16 bit integer
+              images, float64 otherwise, one larger than the image along
+              each axis
+    """
+    dtype = np.int64 if _is_exact(image) else np.float64
+    table = np.zeros(tuple(n + 1 for n in image.shape), dtype=dtype)
+    inner = table[(slice(1, None),) * image.ndim]
+    inner[...] = image
+    if square:
+        np.multiply(inner, inner, out=inner)
+    for axis in range(image.ndim):
+        np.cumsum(table, axis=axis, out=table)
+    return table
+
+
+def window_sums(table, shape):
+    """Return sums over all windows of a shape from a summed-area table.
+
+    :param table: summed-area table as returned by
+                  :func:`summed_area_table`
+    :param shape: side length of the window along each axis
+    :returns: numpy.array with one sum per window position, i.e. of shape
+              ``table.shape - shape``
+    """
+    ndim = table.ndim
+    out_shape = tuple(n - s for n, s in zip(table.shape, shape))
+    sums = np.zeros(out_shape, dtype=table.dtype)
+    for corner in itertools.product((0, 1), repeat=ndim):
+        # Inclusion-exclusion: the far corner is added, and each corner
+        # fewer far sides away changes the sign.
+        index = tuple(slice(s * c, s * c + n)
+                      for s, c, n in zip(shape, corner, out_shape))
+        if (ndim - sum(corner)) % 2 == 0:
+            sums += table[index]
+        else:
+            sums -= table[index]
+    return sums
+
+
+def local_mean_std(image, window_size=DEFAULT_WINDOW_SIZE, std=True):
+    """Return local mean and standard deviation of every pixel.
+
+    :param image: numpy.array
+    :param window_size: odd integer, or one odd integer per axis
+    :param std: if False, only compute the mean
+    :returns: tuple of float64 numpy.array with the shape of the image, the
+              second None if std is False
+    :raises: ValueError if the window size is invalid
+    """
+    shape = window_shape(window_size, image.ndim)
+    padded = np.pad(image, [(s // 2, s // 2) for s in shape],
+                    mode="reflect")
+    count = float(np.prod(shape))
+    mean = window_sums(summed_area_table(padded), shape) / count
+    if not std:
+        return mean, None
+    squares = window_sums(summed_area_table(padded, square=True), shape)
+    variance = np.divide(squares, count, out=squares.astype(np.float64,
+                                                            copy=False))
+    variance -= np.square(mean)
+    # Rounding can make the variance of a flat region slightly negative.
+    np.clip(variance, 0, None, out=variance)
+    return mean, np.sqrt(variance, out=variance)
+
+
+def dynamic_range(dtype):
+    """Return the default Sauvola r of a dtype, as in scikit-image.
+
+    Half the range of the dtype, where float images range from -1 to 1.
+
+    :param dtype: numpy dtype
+    :returns: float
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == "b":
+        return 0.5
+    if dtype.kind in "ui":
+        info = np.iinfo(dtype)
+        return 0.5 * (float(info.max) - float(info.min))
+    return 1.0
+
+
+def local_threshold(image, method="sauvola", window_size=DEFAULT_WINDOW_SIZE,
+                    k=0.2, r=None):
+    """Return local threshold of every pixel.
+
+    :param image: numpy.array
+    :param method: one of the :data:`METHODS`
+    :param window_size: odd integer, or one odd integer per axis
+    :param k: weight of the standard deviation, for "niblack" and "sauvola"
+    :param r: dynamic range of the standard deviation for "sauvola",
+              defaults to :func:`dynamic_range` of the dtype of the image
+    :returns: float64 numpy.array with the shape of the image
+    :raises: ValueError if the method is unknown or the window size invalid
+    """
+    if method not in METHODS:
+        msg = "Unknown local threshold method {}. Allowed method(s): {}"
+        raise(ValueError(msg.format(method, METHODS)))
+    mean, std = local_mean_std(image, window_size, std=method != "mean")
+    if method == "mean":
+        return mean
+    if method == "niblack":
+        std *= -k
+        std += mean
+        return std
+    if r is None:
+        r = dynamic_range(image.dtype)
+    std *= k / float(r)
+    std += 1 - k
+    std *= mean
+    return std
@@ -0,0 +1,261 @@
+"""Module for writing the outputs of transformations.
+
+The transformations in :mod:`jicbioimage.transform` are decorated with the
+:func:`transformation` function decorator in this module. It behaves like
+:func:`jicbioimage.core.transform.transformation`: it records the call in
+the history of the output image and, when
+:attr:`jicbioimage.core.io.AutoWrite.on` is True, writes the output to a
+file named by :class:`jicbioimage.core.io.AutoName`.
+
+By default the output is written before the transformation returns. In
+write-behind mode, turned on with :func:`enable`, the output is copied and
+handed to a pool of background writer threads instead, so that the next
+transformation can start while the previous output is being written. The
+file names are generated in call order, exactly as when writing
+synchronously, and the history is unaffected. Call :func:`flush` to wait
+for all pending writes, e.g. before reading the files.
+
+>>> from jicbioimage.transform import autowrite
+>>> autowrite.enable(workers=4, queue_size=16)  # doctest: +SKIP
+>>> mask = threshold_otsu(smooth_gaussian(image))  # doctest: +SKIP
+>>> autowrite.flush()  # doctest: +SKIP
+
+In write-behind mode PNG files are encoded with Pillow, if it is installed,
+at the compression level passed to :func:`enable`; low levels are much
+faster and give somewhat larger files. The pixel values are the same as
+those written by :meth:`jicbioimage.core.image.Image.write`. Without Pillow,
+and for images that are not written as a single PNG file, the image's own
+``write`` method is called in the background thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import numpy as np
+
+from jicbioimage.core.util.array import normalise
+
+from jicbioimage.transform import profiling
+from jicbioimage.transform.contracts import is_packed
+
+#: Default zlib compression level of PNG files written in write-behind mode.
+DEFAULT_COMPRESS_LEVEL = 1
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class _WriteBehind(object):
+    """Pool of writer threads with a bounded number of pending writes."""
+
+    def __init__(self, workers, queue_size, compress_level):
+        self.compress_level = compress_level
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def submit(self, image, fpath):
+        """Queue a copy of the image to be written, blocking if full."""
+        self._slots.acquire()
+        try:
+            image = image.copy()
+            future = self._pool.submit(_write_file, image, fpath,
+                                       self.compress_level)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self._slots.release()
+
+    def flush(self):
+        """Wait for the pending writes; raise the first error, if any."""
+        with self._lock:
+            futures = list(self._futures)
+            self._futures.clear()
+        errors = [future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+
+    def shutdown(self):
+        """Write the pending images and stop the writer threads."""
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+def enable(workers=2, queue_size=8, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """Turn on write-behind mode.
+
+    :param workers: number of writer threads
+    :param queue_size: maximum number of images waiting to be written; a
+                       transformation blocks until there is room
+    :param compress_level: zlib compression level, 0 to 9, of the PNG files
+    """
+    global _writer
+    disable()
+    with _writer_lock:
+        _writer = _WriteBehind(workers, queue_size, compress_level)
+
+
+def disable():
+    """Flush pending writes and go back to writing synchronously."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.shutdown()
+
+
+def is_enabled():
+    """Return True if write-behind mode is on."""
+    return _writer is not None
+
+
+def flush():
+    """Wait until all pending writes have finished.
+
+    :raises: the first exception raised by a background write
+    """
+    writer = _writer
+    if writer is not None:
+        writer.flush()
+
+
+def history_kwargs(kwargs):
+    """Return kwargs with arrays replaced by their repr, as in the history.
+
+    :param kwargs: dictionary of keyword arguments
+    :returns: dictionary
+    """
+    return dict((key, _array_to_str(value)) for key, value in kwargs.items())
+
+
+def _array_to_str(value):
+    if isinstance(value, np.ndarray):
+        value = repr(value)
+    return value
+
+
+def write(image, func):
+    """Write an output image of a function if AutoWrite is on.
+
+    The file name is generated when this function is called, so that names
+    are assigned in call order also in write-behind mode.
+
+    :param image: :class:`jicbioimage.core.image.Image`
+    :param func: function whose name is used in the file name
+    """
+    from jicbioimage.core.io import AutoName, AutoWrite
+    if not AutoWrite.on:
+        return
+    with profiling.phase("autowrite"):
+        fpath = AutoName.name(func)
+        writer = _writer
+        if writer is None:
+            image.write(fpath)
+        else:
+            writer.submit(image, fpath)
+
+
+def as_image(array, history, func, args, kwargs):
+    """Return array as an image with history, written like an output.
+
+    :param array: numpy array returned by the function
+    :param history: :class:`jicbioimage.core.image.History` of the input
+    :param func: function that produced the array
+    :param args: positional arguments of the call, excluding the image
+    :param kwargs: keyword arguments of the call, excluding the image
+    :returns: :class:`jicbioimage.core.image.Image`
+    """
+    from jicbioimage.core.image import Image, History, _BaseImageWithHistory
+    image = array
+    if not isinstance(image, _BaseImageWithHistory):
+        image = Image.from_array(image, log_in_history=False)
+    image.history = History()
+    image.history.extend(history)
+    image.history.add_event(func, [_array_to_str(v) for v in args],
+                            history_kwargs(kwargs))
+    write(image, func)
+    return image
+
+
+def transformation(func):
+    """Function decorator to turn another function into a transformation.
+
+    Same as :func:`jicbioimage.core.transform.transformation`, except that
+    outputs are written in the background in write-behind mode and calls
+    are recorded when profiling is on, see
+    :mod:`jicbioimage.transform.profiling`.
+    """
+    @wraps(func)
+    def func_as_transformation(*args, **kwargs):
+        from jicbioimage.core.image import History
+
+        h_args = list(args)
+        h_kwargs = kwargs.copy()
+        input_image = kwargs.get("image", None)
+        if input_image is None:
+            input_image = args[0]
+            h_args.pop(0)
+        else:
+            h_kwargs.pop("image")
+
+        history = getattr(input_image, "history", None)
+        if history is None:
+            history = History()
+        if profiling.active() is None:
+            image = func(*args, **kwargs)
+            return as_image(image, history, func, h_args, h_kwargs)
+
+        with profiling.record(func.__name__, input_image) as call:
+            with profiling.phase("contract"):
+                image = func(*args, **kwargs)
+            with profiling.phase("wrapping"):
+                image = as_image(image, history, func, h_args, h_kwargs)
+            call.set_output(image)
+        return image
+    return func_as_transformation
+
+
+def _png_pixels(image):
+    """Return the uint8 array written to a PNG file by the image class."""
+    array = image.unpack() if is_packed(image) else image
+    array = np.asarray(array)
+    if array.dtype == bool:
+        # Same values as normalising, which numpy no longer allows for bool.
+        return array.astype(np.uint8) * np.uint8(255)
+    if array.dtype != np.uint8:
+        array = 255 * normalise(array)
+    return array.astype(np.uint8)
+
+
+def _write_file(image, fpath, compress_level):
+    """Write an image to a PNG file, using Pillow if available."""
+    from jicbioimage.core.image import Image, _BaseImage
+    from jicbioimage.transform.packed import PackedMask
+    try:
+        import PIL.Image
+    except ImportError:
+        PIL = None
+    single_png = (type(image).write is _BaseImage.write and
+                  type(image).png in (_BaseImage.png, PackedMask.png))
+    if PIL is None or not single_png:
+        image.write(fpath)
+        return
+    pixels = _png_pixels(image)
+    if pixels.ndim == 3 and pixels.shape[2] == 1:
+        pixels = pixels[:, :, 0]
+    if pixels.ndim != 2 and not (pixels.ndim == 3 and
+                                 pixels.shape[2] in (3, 4)):
+        Image.from_array(pixels, log_in_history=False).write(fpath)
+        return
+    PIL.Image.fromarray(pixels).save(fpath + ".png",
+                                     compress_level=compress_level)
@@ -0,0 +1,219 @@
+"""Module for running transformations over many images in parallel.
+
+The :func:`run_batch` function applies one of the transformations in
+:mod:`jicbioimage.transform` to a sequence of images and/or image file paths
+using a pool of worker processes or threads.
+
+>>> from jicbioimage.transform import threshold_otsu
+>>> results = run_batch(threshold_otsu, images, workers=4)  # doctest: +SKIP
+>>> for result in results:  # doctest: +SKIP
+...     if result.error is not None:
+...         print(result.index, result.error)
+
+Workers only run the undecorated image processing function. The
+:class:`jicbioimage.core.image.Image` wrapping, the history and the AutoWrite
+output are created in the calling process in input order, so the output file
+names are the same as when calling the transformation in a serial loop.
+
+When using a process pool, input and output arrays are passed to and from
+the workers through :mod:`multiprocessing.shared_memory` blocks rather than
+being pickled. This requires Python 3.8 or later.
+"""
+
+import os
+import importlib
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from jicbioimage.transform import autowrite, precision
+from jicbioimage.transform.packed import PackedMask, from_words
+
+#: Result of processing one item of a batch. Exactly one of ``value`` and
+#: ``error`` is None.
+BatchResult = namedtuple("BatchResult", ["index", "value", "error"])
+
+_SharedArray = namedtuple("_SharedArray",
+                          ["name", "shape", "dtype", "width"])
+
+
+def run_batch(transform, items, workers=None, executor="process", **kwargs):
+    """Return list of results of applying a transformation to many items.
+
+    :param transform: transformation from :mod:`jicbioimage.transform`
+    :param items: sequence of numpy arrays,
+                  :class:`jicbioimage.core.image.Image` instances and/or
+                  paths to image files
+    :param workers: number of workers, defaults to the number of CPUs
+    :param executor: "process" or "thread"
+    :param kwargs: keyword arguments passed on to the transformation
+    :returns: list of :class:`BatchResult` in input order
+    :raises: TypeError if transform is not a transformation
+    :raises: ValueError if the executor is unknown
+    """
+    func = getattr(transform, "__wrapped__", None)
+    if func is None:
+        msg = "{} is not a transformation".format(transform)
+        raise(TypeError(msg))
+    if executor not in ("process", "thread"):
+        msg = "Unknown executor {}. Allowed executor(s): process, thread"
+        raise(ValueError(msg.format(executor)))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+        submit = _thread_submitter(pool, func, kwargs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        submit = _process_submitter(pool, transform, kwargs)
+
+    results = []
+    pending = deque()
+    items = iter(enumerate(items))
+    with pool:
+        # Keep a bounded number of items in flight so that at most a few
+        # images per worker are held in shared memory at any one time.
+        for index, item in items:
+            pending.append((index, item, submit(item)))
+            if len(pending) == 2 * workers:
+                results.append(_collect(func, kwargs, *pending.popleft()))
+        while pending:
+            results.append(_collect(func, kwargs, *pending.popleft()))
+    return results
+
+
+def _thread_submitter(pool, func, kwargs):
+    """Return function submitting an item to a thread pool."""
+    def submit(item):
+        future = pool.submit(_run_in_thread, func, item, kwargs)
+        return future, None
+    return submit
+
+
+def _process_submitter(pool, transform, kwargs):
+    """Return function submitting an item to a process pool."""
+    module_name = transform.__module__
+    func_name = transform.__name__
+
+    def submit(item):
+        shared = None
+        source = item
+        if isinstance(item, np.ndarray):
+            shared, source = _to_shared_memory(item)
+        future = pool.submit(_run_in_process, module_name, func_name,
+                             source, kwargs, precision.get_policy())
+        return future, shared
+    return submit
+
+
+def _collect(func, kwargs, index, item, submitted):
+    """Return :class:`BatchResult` for a submitted item."""
+    from jicbioimage.core.image import History
+
+    future, shared = submitted
+    try:
+        array, creation = future.result()
+    except Exception as error:
+        return BatchResult(index, None, error)
+    finally:
+        if shared is not None:
+            shared.close()
+            shared.unlink()
+
+    if isinstance(array, _SharedArray):
+        array = _from_shared_memory(array, unlink=True)
+
+    history = getattr(item, "history", None)
+    if history is None:
+        history = History(creation)
+    image = autowrite.as_image(array, history, func, [], kwargs)
+    return BatchResult(index, image, None)
+
+
+def _load(item):
+    """Return array and history creation string for an item."""
+    if isinstance(item, np.ndarray):
+        return item, None
+    from jicbioimage.core.image import Image
+    image = Image.from_file(item)
+    return image, image.history.creation
+
+
+def _run_in_thread(func, item, kwargs):
+    """Apply the undecorated function to an item in a worker thread."""
+    image, creation = _load(item)
+    return _detach(func(image, **kwargs)), creation
+
+
+def _run_in_process(module_name, func_name, source, kwargs, policy):
+    """Apply the undecorated function to an item in a worker process."""
+    func = getattr(importlib.import_module(module_name), func_name).__wrapped__
+    # Use the precision policy of the calling process.
+    precision.set_policy(policy)
+    block = None
+    if isinstance(source, _SharedArray):
+        block = shared_memory.SharedMemory(name=source.name)
+        source = _attach(np.ndarray(source.shape, dtype=source.dtype,
+                                    buffer=block.buf), source.width)
+    image = None
+    try:
+        image, creation = _load(source)
+        # The result is copied into a new block before the input block is
+        # closed, in case it is a view of the input.
+        output_block, output = _to_shared_memory(
+            _detach(func(image, **kwargs)))
+        output_block.close()
+        return output, creation
+    finally:
+        source = image = None
+        if block is not None:
+            try:
+                block.close()
+            except BufferError:
+                # Still referenced from a traceback; the mapping is
+                # released when that is garbage collected.
+                pass
+
+
+def _to_shared_memory(array):
+    """Return shared memory block holding a copy of the array."""
+    block = shared_memory.SharedMemory(create=True,
+                                       size=max(1, array.nbytes))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    del view
+    width = array.width if isinstance(array, PackedMask) else None
+    return block, _SharedArray(block.name, array.shape, array.dtype.str,
+                               width)
+
+
+def _from_shared_memory(shared_array, unlink=False):
+    """Return array copied out of a shared memory block."""
+    block = shared_memory.SharedMemory(name=shared_array.name)
+    try:
+        view = np.ndarray(shared_array.shape, dtype=shared_array.dtype,
+                          buffer=block.buf)
+        array = view.copy()
+        del view
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+    return _attach(array, shared_array.width)
+
+
+def _detach(array):
+    """Return array without image attributes, keeping packed masks packed."""
+    if isinstance(array, PackedMask):
+        return from_words(array, array.width)
+    return np.asarray(array)
+
+
+def _attach(array, width):
+    """Return array as a packed mask if it has a packed mask width."""
+    if width is None:
+        return array
+    return from_words(array, width)
@@ -0,0 +1,257 @@
+"""Module containing the content-addressed result cache.
+
+When enabled, the results of the transformations in
+:mod:`jicbioimage.transform` are memoized. The cache key is a hash of the
+bytes, dtype and shape of the input image together with the name of the
+function, the values of its arguments and the precision policy of
+:mod:`jicbioimage.transform.precision`, so calling a transformation again
+on an image with the same content and the same parameters returns the
+stored result instead of recomputing it.
+
+>>> from jicbioimage.transform import cache
+>>> cache.enable(max_bytes=512 * 1024 ** 2)  # doctest: +SKIP
+>>> smoothed = smooth_gaussian(image, sigma=2)  # doctest: +SKIP
+>>> smoothed = smooth_gaussian(image, sigma=2)  # doctest: +SKIP
+>>> cache.disable()  # doctest: +SKIP
+
+The cache has two tiers. Results are kept in memory up to a limit in bytes,
+discarding the least recently used ones first. If a directory is given,
+results are also saved there as ``.npy`` files, which are loaded as copy on
+write memory maps when they are no longer in memory. The directory can be
+shared between runs. Results that are a
+:class:`jicbioimage.transform.projection.PlaneStack` are returned as one
+from both tiers.
+
+The cache sits inside the :func:`jicbioimage.core.transform.transformation`
+decorator, so a cached result gets the same history event and AutoWrite
+output as a computed one. Results returned from memory are copies, so
+modifying them does not affect the cache. The arguments ``out``,
+``memory_budget`` and ``workers`` do not change results and are not part of
+the key.
+"""
+
+import os
+import hashlib
+import inspect
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+from jicbioimage.transform import precision, profiling
+from jicbioimage.transform.contracts import is_packed
+
+#: Default size limit of the in-memory tier in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+#: Suffix of the on-disk files of
+#: :class:`jicbioimage.transform.projection.PlaneStack` results.
+STACK_SUFFIX = ".stack.npy"
+
+#: Arguments that do not affect the result of a transformation.
+IGNORED_ARGUMENTS = ("out", "memory_budget", "workers")
+
+_active = None
+_active_lock = threading.Lock()
+
+
+class ResultCache(object):
+    """Two tier cache of arrays keyed by strings.
+
+    :param max_bytes: size limit of the in-memory tier in bytes
+    :param directory: optional directory for the on-disk tier
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _fpath(self, key, stack=False):
+        suffix = STACK_SUFFIX if stack else ".npy"
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key):
+        """Return cached array, or None if the key is not in the cache.
+
+        :param key: key string
+        :returns: numpy.array or None
+        """
+        with self._lock:
+            array = self._entries.get(key)
+            if array is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return array.copy()
+        if self.directory is not None:
+            array = self._load(key)
+            if array is not None:
+                with self._lock:
+                    self.hits += 1
+                return array
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, array):
+        """Add an array to the cache.
+
+        Arrays larger than the in-memory limit are only saved on disk.
+        Packed masks are only kept in memory.
+
+        :param key: key string
+        :param array: numpy array
+        """
+        packed = is_packed(array)
+        array = array.copy() if packed else np.array(array, subok=True)
+        with self._lock:
+            if key not in self._entries and array.nbytes <= self.max_bytes:
+                self._entries[key] = array
+                self.nbytes += array.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        if self.directory is not None and not packed:
+            self._save(key, array)
+
+    def _load(self, key):
+        """Return array from the on-disk tier, or None if it is not there."""
+        from jicbioimage.transform.projection import PlaneStack
+        for stack in (False, True):
+            try:
+                array = np.load(self._fpath(key, stack), mmap_mode="c")
+            except (IOError, OSError, ValueError):
+                continue
+            if stack:
+                array = PlaneStack.from_array(array, log_in_history=False)
+            return array
+        return None
+
+    def _save(self, key, array):
+        """Save an array to the on-disk tier, atomically."""
+        from jicbioimage.transform.projection import PlaneStack
+        fpath = self._fpath(key, isinstance(array, PlaneStack))
+        if os.path.exists(fpath):
+            return
+        fd, tmp_fpath = tempfile.mkstemp(suffix=".npy", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, array)
+            os.replace(tmp_fpath, fpath)
+        except Exception:
+            os.unlink(tmp_fpath)
+            raise
+
+    def clear(self):
+        """Remove all entries, including the files of the on-disk tier."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        if self.directory is not None:
+            for fname in os.listdir(self.directory):
+                if fname.endswith(".npy"):
+                    os.unlink(os.path.join(self.directory, fname))
+
+
+def enable(max_bytes=DEFAULT_MAX_BYTES, directory=None):
+    """Turn on caching of transformation results.
+
+    :param max_bytes: size limit of the in-memory tier in bytes
+    :param directory: optional directory for the on-disk tier
+    :returns: the active :class:`ResultCache`
+    """
+    global _active
+    with _active_lock:
+        _active = ResultCache(max_bytes, directory)
+        return _active
+
+
+def disable():
+    """Turn off caching of transformation results."""
+    global _active
+    with _active_lock:
+        _active = None
+
+
+def active():
+    """Return the active :class:`ResultCache`, or None if caching is off."""
+    return _active
+
+
+def _update(digest, value):
+    """Add a value to a hash."""
+    if isinstance(value, np.ndarray):
+        digest.update("array{}{}".format(value.dtype.str,
+                                         value.shape).encode("utf-8"))
+        if is_packed(value):
+            digest.update("width{}".format(value.width).encode("utf-8"))
+        digest.update(memoryview(np.ascontiguousarray(value)).cast("B"))
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+
+def make_key(func, signature, args, kwargs):
+    """Return cache key of a function call.
+
+    :param func: function
+    :param signature: :class:`inspect.Signature` of the function
+    :param args: positional arguments
+    :param kwargs: keyword arguments
+    :returns: hexadecimal key string
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    digest = hashlib.blake2b(digest_size=20)
+    name = "{}.{}".format(func.__module__, func.__name__)
+    digest.update(name.encode("utf-8"))
+    # The precision policy changes the dtype of float results.
+    digest.update(precision.get_policy().encode("utf-8"))
+    for name, value in bound.arguments.items():
+        if name in IGNORED_ARGUMENTS:
+            continue
+        digest.update(name.encode("utf-8"))
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def cached(func):
+    """Function decorator memoizing results in the active cache.
+
+    Calls whose image is not a numpy array, e.g. an iterator of slices, are
+    not cached. The image is the first argument, given by position or by
+    keyword.
+    """
+    signature = inspect.signature(func)
+    image_name = next(iter(signature.parameters))
+
+    @wraps(func)
+    def cached_function(*args, **kwargs):
+        cache = _active
+        image = kwargs.get(image_name, args[0] if args else None)
+        if cache is None or not isinstance(image, np.ndarray):
+            return func(*args, **kwargs)
+        with profiling.phase("cache"):
+            key = make_key(func, signature, args, kwargs)
+            array = cache.get(key)
+        out = kwargs.get("out")
+        if array is None:
+            array = func(*args, **kwargs)
+            with profiling.phase("cache"):
+                cache.put(key, array)
+            return array
+        if out is None:
+            return array
+        out[...] = array
+        return out
+    return cached_function
@@ -0,0 +1,109 @@
+"""Module containing connected component analysis of masks.
+
+A :class:`Components` object labels the connected components of a mask once
+and stores the size of each component. Any number of size filters can then
+be applied with a lookup table indexed by the label image, without labelling
+the mask again.
+
+>>> import numpy as np
+>>> mask = np.array([[1, 1, 0, 1],
+...                  [1, 0, 0, 0],
+...                  [0, 0, 1, 1]], dtype=bool)
+>>> components = Components(mask)
+>>> components.count
+3
+>>> components.sizes[1:].tolist()
+[3, 1, 2]
+>>> components.mask(min_size=2).astype(int)
+array([[1, 1, 0, 0],
+       [1, 0, 0, 0],
+       [0, 0, 1, 1]])
+
+Labelling uses :func:`scipy.ndimage.label`, a single pass union-find over
+the image implemented in C.
+"""
+
+import numpy as np
+
+import scipy.ndimage as ndi
+
+from jicbioimage.transform.packed import PackedMask
+
+#: Number of labels passed to :func:`numpy.bincount` at a time, bounding the
+#: size of the temporary integer array it creates.
+CHUNK_SIZE = 1 << 18
+
+
+class Components(object):
+    """Connected components of a mask.
+
+    :param mask: boolean numpy array or
+                 :class:`jicbioimage.transform.packed.PackedMask`
+    :param connectivity: maximum number of orthogonal steps between
+                         neighbouring pixels, as in
+                         :func:`skimage.morphology.remove_small_objects`
+    """
+
+    def __init__(self, mask, connectivity=1):
+        if isinstance(mask, PackedMask):
+            mask = mask.unpack()
+        structure = ndi.generate_binary_structure(mask.ndim, connectivity)
+        #: Label image, 0 for the background and 1 to :attr:`count` for
+        #: the components.
+        self.labels = np.zeros(mask.shape, dtype=np.int32)
+        #: Number of components.
+        self.count = ndi.label(mask, structure, output=self.labels)
+        #: Number of pixels per label; the first entry is the background.
+        self.sizes = np.zeros(self.count + 1, dtype=np.intp)
+        flat = self.labels.reshape(-1)
+        # Chunks much larger than the counts, which each chunk allocates.
+        chunk_size = max(CHUNK_SIZE, 4 * (self.count + 1))
+        for start in range(0, flat.size, chunk_size):
+            self.sizes += np.bincount(flat[start:start + chunk_size],
+                                      minlength=self.count + 1)
+
+    def select(self, min_size=None, max_size=None):
+        """Return lookup table of the components within a size range.
+
+        :param min_size: smallest size kept, no lower limit if None
+        :param max_size: largest size kept, no upper limit if None
+        :returns: boolean numpy.array with one entry per label
+        """
+        keep = np.ones(self.sizes.shape, dtype=bool)
+        if min_size is not None:
+            keep &= self.sizes >= min_size
+        if max_size is not None:
+            keep &= self.sizes <= max_size
+        keep[0] = False
+        return keep
+
+    def mask(self, min_size=None, max_size=None, out=None):
+        """Return mask of the components within a size range.
+
+        :param min_size: smallest size kept, no lower limit if None
+        :param max_size: largest size kept, no upper limit if None
+        :param out: optional boolean array to write the result to
+        :returns: boolean numpy.array
+        """
+        lut = self.select(min_size, max_size)
+        # Indexing, unlike numpy.take, does not convert the labels to intp.
+        if out is None:
+            return lut[self.labels]
+        rows = max(1, CHUNK_SIZE // max(1, self.labels[:1].size))
+        for start in range(0, len(self.labels), rows):
+            out[start:start + rows] = lut[self.labels[start:start + rows]]
+        return out
+
+    def filter_labels(self, min_size=None, max_size=None):
+        """Return label image of the components within a size range.
+
+        Components outside the range are set to 0; the others keep their
+        labels.
+
+        :param min_size: smallest size kept, no lower limit if None
+        :param max_size: largest size kept, no upper limit if None
+        :returns: numpy.array of int32
+        """
+        lut = np.arange(self.count + 1, dtype=np.int32)
+        lut[~self.select(min_size, max_size)] = 0
+        return lut[self.labels]
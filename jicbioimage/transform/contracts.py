@@ -0,0 +1,70 @@
+"""Module containing dtype contracts that understand packed masks.
+
+The functions in this module recognise a
+:class:`jicbioimage.transform.packed.PackedMask` without importing
+:mod:`jicbioimage.transform.packed`, which imports
+:mod:`jicbioimage.core.image` and with it scipy and scikit-image. They are
+used by the transformations in :mod:`jicbioimage.transform`, which only
+import these dependencies when first called.
+"""
+
+import sys
+from functools import wraps
+
+import numpy as np
+
+
+def is_packed(array):
+    """Return True if the array is a packed mask.
+
+    If :mod:`jicbioimage.transform.packed` has not been imported, no packed
+    mask can exist, so it is not imported to find out.
+
+    :param array: numpy array
+    :returns: bool
+    """
+    packed = sys.modules.get("jicbioimage.transform.packed")
+    return packed is not None and isinstance(array, packed.PackedMask)
+
+
+def mask_dtype(array):
+    """Return dtype of an array, bool for a packed mask.
+
+    :param array: numpy array or
+                  :class:`jicbioimage.transform.packed.PackedMask`
+    :returns: numpy.dtype
+    """
+    if is_packed(array):
+        return np.dtype(bool)
+    return array.dtype
+
+
+def mask_contract(input_dtype=None, output_dtype=None):
+    """Function decorator for specifying input and/or output array dtypes.
+
+    Same as :func:`jicbioimage.core.util.array.dtype_contract`, except that
+    a :class:`jicbioimage.transform.packed.PackedMask` counts as a boolean
+    array.
+
+    :param input_dtype: dtype of input array
+    :param output_dtype: dtype of output array
+    :returns: function decorator
+    """
+    def check(array, allowed):
+        if not hasattr(allowed, "__iter__"):
+            allowed = [allowed, ]
+        if mask_dtype(array) not in allowed:
+            msg = "Invalid dtype {}. Allowed dtype(s): {}"
+            raise(TypeError(msg.format(mask_dtype(array), allowed)))
+
+    def wrap(function):
+        @wraps(function)
+        def wrapped_function(*args, **kwargs):
+            if input_dtype is not None:
+                check(args[0], input_dtype)
+            array = function(*args, **kwargs)
+            if output_dtype is not None:
+                check(array, output_dtype)
+            return array
+        return wrapped_function
+    return wrap
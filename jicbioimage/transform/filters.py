@@ -0,0 +1,153 @@
+"""Module containing the Gaussian smoothing engine.
+
+Gaussian smoothing is separable, so it is computed as one 1D convolution
+per axis. Two backends are available:
+
+- "direct" uses :func:`scipy.ndimage.gaussian_filter`, whose cost per pixel
+  grows linearly with the kernel radius (four times sigma)
+- "fft" pads each axis and convolves it in the frequency domain using
+  :func:`scipy.signal.fftconvolve`, whose cost per pixel grows with the
+  logarithm of the axis length instead
+
+The "auto" backend picks the cheaper of the two from sigma and the image
+size using :func:`select_backend`.
+:func:`jicbioimage.transform.smooth_gaussian` uses the direct backend
+unless another one is requested. Both backends use the same kernel and
+the boundary behaviour of ``mode="nearest"``, i.e. the image is extended by
+repeating its edge pixels. The FFT backend agrees with the direct backend to
+within floating point rounding, but not bit for bit.
+
+Float32 images are smoothed in single precision and give a float32 result;
+float64 images give a float64 result.
+"""
+
+import math
+
+import numpy as np
+
+import scipy.ndimage
+import scipy.signal
+
+#: Names of the Gaussian smoothing backends.
+BACKENDS = ("auto", "direct", "fft")
+
+#: Relative cost of the FFT backend per pixel and per doubling of the
+#: padded axis length, in units of one multiply-add of the direct backend,
+#: keyed by dtype name. Measured with ``benchmarks/gaussian_benchmark.py``;
+#: the FFT backend benefits more from single precision than the direct one.
+FFT_COST_FACTOR = {
+    "float64": 4.5,
+    "float32": 2.0,
+}
+
+#: Number of standard deviations the Gaussian kernel extends to, as in
+#: :func:`scipy.ndimage.gaussian_filter`.
+TRUNCATE = 4.0
+
+
+def _sigmas(sigma, ndim):
+    """Return one sigma per axis."""
+    sigmas = np.atleast_1d(np.asarray(sigma, dtype=np.float64))
+    if sigmas.size == 1:
+        sigmas = np.repeat(sigmas, ndim)
+    if sigmas.size != ndim:
+        msg = "Expected 1 or {} sigma values, got {}"
+        raise(ValueError(msg.format(ndim, sigmas.size)))
+    return sigmas
+
+
+def gaussian_kernel1d(sigma, truncate=TRUNCATE):
+    """Return the normalised 1D Gaussian kernel used for smoothing.
+
+    The kernel is the same as the one used by
+    :func:`scipy.ndimage.gaussian_filter`.
+
+    :param sigma: standard deviation
+    :param truncate: number of standard deviations the kernel extends to
+    :returns: 1D numpy.array of length 2 * radius + 1
+    """
+    radius = int(truncate * float(sigma) + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 / (sigma * sigma) * x ** 2)
+    return kernel / kernel.sum()
+
+
+def select_backend(shape, sigma, dtype=np.float64, truncate=TRUNCATE):
+    """Return the fastest backend, "direct" or "fft", for a smoothing job.
+
+    The direct backend performs ``2 * radius + 1`` multiply-adds per pixel
+    and axis. The FFT backend performs work proportional to the logarithm
+    of the padded axis length per pixel and axis, scaled by
+    :data:`FFT_COST_FACTOR`. With the measured factors the crossover for a
+    2048x2048 image lies at a sigma of about 6 for float64 and about 3 for
+    float32.
+
+    :param shape: shape of the image
+    :param sigma: standard deviation, scalar or one per axis
+    :param dtype: dtype of the image
+    :param truncate: number of standard deviations the kernel extends to
+    :returns: "direct" or "fft"
+    """
+    factor = FFT_COST_FACTOR.get(np.dtype(dtype).name,
+                                 FFT_COST_FACTOR["float64"])
+    direct = 0.0
+    fft = 0.0
+    for length, s in zip(shape, _sigmas(sigma, len(shape))):
+        if s <= 1e-15:
+            continue
+        radius = int(truncate * s + 0.5)
+        direct += 2 * radius + 1
+        fft += factor * math.log(length + 2 * radius, 2)
+    if fft < direct:
+        return "fft"
+    return "direct"
+
+
+def gaussian_fft(image, sigma, truncate=TRUNCATE, output=None):
+    """Return Gaussian smoothed image computed by FFT convolution.
+
+    :param image: float numpy array
+    :param sigma: standard deviation, scalar or one per axis
+    :param truncate: number of standard deviations the kernel extends to
+    :param output: optional array to write the result to
+    :returns: numpy.array of the same dtype as the image
+    """
+    result = np.asarray(image)
+    for axis, s in enumerate(_sigmas(sigma, image.ndim)):
+        if s <= 1e-15:
+            continue
+        kernel = gaussian_kernel1d(s, truncate).astype(image.dtype)
+        radius = (kernel.size - 1) // 2
+        pad_width = [(0, 0)] * image.ndim
+        pad_width[axis] = (radius, radius)
+        padded = np.pad(result, pad_width, mode="edge")
+        shape = [1] * image.ndim
+        shape[axis] = kernel.size
+        result = scipy.signal.fftconvolve(padded, kernel.reshape(shape),
+                                          mode="valid", axes=axis)
+    result = result.astype(image.dtype, copy=False)
+    if output is None:
+        return result
+    output[...] = result
+    return output
+
+
+def gaussian(image, sigma, backend="auto", output=None):
+    """Return Gaussian smoothed image with ``mode="nearest"`` boundaries.
+
+    :param image: float numpy array
+    :param sigma: standard deviation, scalar or one per axis
+    :param backend: "auto", "direct" or "fft"
+    :param output: optional array to write the result to
+    :returns: numpy.array of the same dtype as the image
+    :raises: ValueError if the backend is unknown
+    """
+    if backend not in BACKENDS:
+        msg = "Unknown backend {}. Allowed backend(s): {}"
+        raise(ValueError(msg.format(backend, BACKENDS)))
+    if backend == "auto":
+        backend = select_backend(image.shape, sigma, image.dtype)
+    if backend == "fft":
+        return gaussian_fft(image, sigma, output=output)
+    return scipy.ndimage.gaussian_filter(image, sigma=sigma, mode="nearest",
+                                         output=output)
@@ -0,0 +1,165 @@
+"""Module containing the extended depth-of-field engine.
+
+Brightfield z-stacks are sharp in different slices at different positions.
+An extended depth-of-field projection picks, for every pixel, the value of
+the z-slice in which the neighbourhood of the pixel is sharpest. The
+sharpness is measured by a local focus measure computed for every slice:
+
+- "sobel": the Sobel energy, i.e. the squared gradient magnitude, as used by
+  :func:`jicbioimage.transform.find_edges_sobel`, averaged over a square
+  window
+- "laplacian": the variance of the Laplacian over a square window
+
+The z-slice with the highest focus measure at each pixel gives a z-map, from
+which the in-focus values are gathered in a single vectorized indexing
+operation. Ties are resolved in favour of the lowest z-index.
+
+Arrays, including :class:`numpy.memmap` stacks, are processed in blocks of
+rows spanning all the z-slices, each padded with the rows its focus measure
+needs, so that only a bounded part of the stack is in memory at any one
+time. This gives the same z-map as processing whole slices; the focus
+measures agree to within floating point rounding, because the running sums
+of the window depend on where each block starts. An iterator of 2D
+z-slices is processed one slice at a time, keeping only the best focus
+measure, z-index and value of every pixel seen so far.
+"""
+
+import numpy as np
+
+#: Names of the focus measures understood by :func:`focus_measure`.
+FOCUS_MEASURES = ("sobel", "laplacian")
+
+#: Default side length of the window over which focus is measured.
+DEFAULT_WINDOW = 9
+
+#: Default number of bytes of input per block of rows.
+BLOCK_BYTES = 1 << 22
+
+
+def _check_measure(measure):
+    """Raise ValueError if the focus measure is unknown."""
+    if measure not in FOCUS_MEASURES:
+        msg = "Unknown focus measure {}. Allowed measure(s): {}"
+        raise(ValueError(msg.format(measure, FOCUS_MEASURES)))
+
+
+def _halo(window):
+    """Return number of rows the focus measure reaches beyond a pixel."""
+    # One for the Sobel and Laplacian kernels, plus half the window.
+    return 1 + window // 2
+
+
+def focus_measure(planes, measure="sobel", window=DEFAULT_WINDOW):
+    """Return local focus measure of one or more planes.
+
+    :param planes: 2D numpy.array, or numpy.array of planes whose last two
+                   axes are the rows and columns
+    :param measure: one of the :data:`FOCUS_MEASURES`
+    :param window: side length of the window over which focus is measured
+    :returns: float64 numpy.array with the shape of the planes
+    :raises: ValueError if the focus measure is unknown
+    """
+    # Imported here, so that importing jicbioimage.transform, which uses
+    # the constants of this module, does not import scipy.
+    import scipy.ndimage as ndi
+    _check_measure(measure)
+    planes = np.asarray(planes, dtype=np.float64)
+    rows, columns = planes.ndim - 2, planes.ndim - 1
+    size = [1] * (planes.ndim - 2) + [window, window]
+    if measure == "sobel":
+        energy = _sobel(planes, rows, columns)
+        np.square(energy, out=energy)
+        energy += np.square(_sobel(planes, columns, rows))
+        return ndi.uniform_filter(energy, size, output=energy)
+    laplacian = ndi.correlate1d(planes, [1, -2, 1], axis=rows)
+    laplacian += ndi.correlate1d(planes, [1, -2, 1], axis=columns)
+    mean = ndi.uniform_filter(laplacian, size)
+    np.square(laplacian, out=laplacian)
+    variance = ndi.uniform_filter(laplacian, size, output=laplacian)
+    variance -= np.square(mean, out=mean)
+    return variance
+
+
+def _sobel(planes, axis, smooth_axis):
+    """Return Sobel derivative along one axis of planes."""
+    import scipy.ndimage as ndi
+    derivative = ndi.correlate1d(planes, [-1, 0, 1], axis=axis)
+    return ndi.correlate1d(derivative, [1, 2, 1], axis=smooth_axis,
+                           output=derivative)
+
+
+def extended_depth_of_field(source, measure="sobel", window=DEFAULT_WINDOW,
+                            axis=2, block_bytes=BLOCK_BYTES):
+    """Return extended depth-of-field projection and z-map of a stack.
+
+    :param source: 3D numpy.array/numpy.memmap or iterator of 2D z-slices
+    :param measure: one of the :data:`FOCUS_MEASURES`
+    :param window: side length of the window over which focus is measured
+    :param axis: z axis of an array source
+    :param block_bytes: approximate number of bytes of input per block of
+                        rows of an array source
+    :returns: tuple with the projection, which has the dtype of the stack,
+              and the z-map, the index of the sharpest slice of each pixel
+    :raises: ValueError if the focus measure is unknown, the source is
+             empty or an array source is not 3D
+    """
+    from jicbioimage.transform.projection import _check_stack
+    _check_measure(measure)
+    if isinstance(source, np.ndarray):
+        _check_stack(source, axis)
+        if source.ndim != 3:
+            msg = "Expected a 3D stack, got {} dimensions"
+            raise(ValueError(msg.format(source.ndim)))
+        return _blocks_edf(source, measure, window, axis % 3, block_bytes)
+    return _slices_edf(iter(source), measure, window)
+
+
+def _blocks_edf(stack, measure, window, axis, block_bytes):
+    """Return projection and z-map computed in blocks of rows."""
+    from jicbioimage.transform.projection import _release_pages
+    # Blocks of rows, i.e. of the first axis other than the z axis.
+    block_axis = 1 if axis == 0 else 0
+    length = stack.shape[block_axis]
+    row_bytes = max(1, stack.nbytes // max(1, length))
+    rows_per_block = max(1, block_bytes // row_bytes)
+    halo = _halo(window)
+
+    output_shape = tuple(n for i, n in enumerate(stack.shape) if i != axis)
+    projection = np.empty(output_shape, dtype=stack.dtype)
+    z_map = np.empty(output_shape, dtype=np.intp)
+    for start in range(0, length, rows_per_block):
+        stop = min(start + rows_per_block, length)
+        padded_start = max(0, start - halo)
+        padded_stop = min(length, stop + halo)
+        source = [slice(None)] * 3
+        source[block_axis] = slice(padded_start, padded_stop)
+        # Planes with z first, followed by rows and columns.
+        planes = np.moveaxis(np.array(stack[tuple(source)]), axis, 0)
+        inner = slice(start - padded_start, stop - padded_start)
+        focus = focus_measure(planes, measure, window)[:, inner]
+        best = np.argmax(focus, axis=0)
+        z_map[start:stop] = best
+        projection[start:stop] = np.take_along_axis(
+            planes[:, inner], best[np.newaxis], axis=0)[0]
+        _release_pages(stack)
+    return projection, z_map
+
+
+def _slices_edf(slices, measure, window):
+    """Return projection and z-map accumulated one slice at a time."""
+    try:
+        first = np.array(next(slices))
+    except StopIteration:
+        raise(ValueError("Cannot project an empty sequence of z-slices"))
+    projection = first
+    best = focus_measure(first, measure, window)
+    z_map = np.zeros(first.shape, dtype=np.intp)
+    sharper = np.empty(first.shape, dtype=bool)
+    for z, z_slice in enumerate(slices, 1):
+        z_slice = np.asarray(z_slice)
+        focus = focus_measure(z_slice, measure, window)
+        np.greater(focus, best, out=sharper)
+        np.copyto(best, focus, where=sharper)
+        np.copyto(z_map, z, where=sharper)
+        np.copyto(projection, z_slice, where=sharper)
+    return projection, z_map
@@ -0,0 +1,230 @@
+"""Module containing the Sobel gradient engine.
+
+The gradient of an image is computed once, as its derivatives along the
+rows and columns, and any of the following outputs are derived from them:
+
+- "magnitude": the Sobel edge magnitude, the same as
+  :func:`skimage.filters.sobel` and
+  :func:`jicbioimage.transform.find_edges_sobel`, i.e.
+  ``sqrt((x**2 + y**2) / 2)``
+- "angle": the orientation of the gradient in radians, between -pi and pi,
+  i.e. ``arctan2(y, x)``
+- "x": the derivative along the columns, the same as
+  :func:`skimage.filters.sobel_v`
+- "y": the derivative along the rows, the same as
+  :func:`skimage.filters.sobel_h`
+
+The derivatives are computed as separable 1D correlations with the Sobel
+kernels, with the boundary behaviour of ``mode="reflect"``, and agree with
+those of scikit-image to within floating point rounding. As with
+:func:`skimage.filters.sobel`, a mask is eroded by one pixel, including
+diagonally, and all outputs are zero outside the eroded mask.
+
+3D images are processed as independent 2D slices along a z axis, in
+parallel threads, into preallocated outputs.
+
+The magnitude of the gradient of a true 3D, or N-dimensional, image is
+computed by :func:`sobel_magnitude`, which also accounts for anisotropic
+voxel spacing.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from jicbioimage.transform.volume import map_slices, voxel_spacing
+
+#: Names of the outputs understood by :func:`sobel_gradient`.
+GRADIENT_OUTPUTS = ("magnitude", "angle", "x", "y")
+
+#: Derivative and smoothing kernels of the Sobel operator, as correlations.
+SOBEL_EDGE = np.array([-1.0, 0.0, 1.0])
+SOBEL_SMOOTH = np.array([1.0, 2.0, 1.0]) / 4
+
+
+def _check_outputs(outputs):
+    """Raise ValueError if outputs are empty or unknown."""
+    if len(outputs) == 0:
+        raise(ValueError("Expected at least one gradient output"))
+    for name in outputs:
+        if name not in GRADIENT_OUTPUTS:
+            msg = "Unknown gradient output {}. Allowed output(s): {}"
+            raise(ValueError(msg.format(name, GRADIENT_OUTPUTS)))
+
+
+def _derivative(plane, axis, output):
+    """Write Sobel derivative of a 2D plane along one axis to output."""
+    import scipy.ndimage as ndi
+    ndi.correlate1d(plane, SOBEL_EDGE, axis=axis, mode="reflect",
+                    output=output)
+    ndi.correlate1d(output, SOBEL_SMOOTH, axis=1 - axis, mode="reflect",
+                    output=output)
+
+
+def _eroded(mask):
+    """Return mask eroded as by :func:`skimage.filters.sobel`."""
+    import scipy.ndimage as ndi
+    structure = ndi.generate_binary_structure(mask.ndim, mask.ndim)
+    return ndi.binary_erosion(mask, structure, border_value=0)
+
+
+def _plane_gradient(plane, outputs, mask):
+    """Write requested outputs of one 2D plane to the output planes.
+
+    :param plane: 2D float numpy.array
+    :param outputs: dictionary mapping output names to 2D numpy.array
+    :param mask: 2D boolean numpy.array or None
+    """
+    x = outputs.get("x")
+    if x is None:
+        x = np.empty(plane.shape, dtype=plane.dtype)
+    y = outputs.get("y")
+    if y is None:
+        y = np.empty(plane.shape, dtype=plane.dtype)
+    _derivative(plane, 1, x)
+    _derivative(plane, 0, y)
+    if "angle" in outputs:
+        np.arctan2(y, x, out=outputs["angle"])
+    if "magnitude" in outputs:
+        magnitude = outputs["magnitude"]
+        np.multiply(x, x, out=magnitude)
+        if "y" in outputs:
+            magnitude += y * y
+        else:
+            magnitude += np.square(y, out=y)
+        np.sqrt(magnitude, out=magnitude)
+        magnitude /= np.sqrt(2)
+    if mask is not None:
+        outside = ~_eroded(mask)
+        for output in outputs.values():
+            output[outside] = 0
+
+
+def _as_float(image, dtype):
+    """Return image as float, scaled like :func:`skimage.filters.sobel`.
+
+    Float images are converted to the dtype, without a copy if they have
+    it already; integer and boolean images are scaled to the range 0 to 1,
+    or -1 to 1 for signed integers, by :func:`skimage.util.img_as_float`.
+
+    :param image: numpy.array
+    :param dtype: float32 or float64
+    :returns: numpy.array
+    """
+    if image.dtype.kind == "f":
+        return np.asarray(image).astype(dtype, copy=False)
+    import skimage.util
+    if np.dtype(dtype) == np.float32:
+        return skimage.util.img_as_float32(image)
+    return skimage.util.img_as_float64(image)
+
+
+def sobel_gradient(image, outputs=("magnitude", "angle"), dtype=np.float64,
+                   mask=None, axis=2, workers=None):
+    """Return outputs derived from a single Sobel gradient of an image.
+
+    :param image: 2D or 3D numpy.array
+    :param outputs: names of the outputs, any of the
+                    :data:`GRADIENT_OUTPUTS`
+    :param dtype: float32 or float64, the dtype of the computation and of
+                  the outputs
+    :param mask: optional boolean array, with the shape of the image or of
+                 one of its 2D slices; outputs are zero outside it
+    :param axis: z axis of a 3D image, whose 2D slices are processed
+                 separately
+    :param workers: number of threads processing the slices of a 3D image,
+                    defaults to the number of CPUs
+    :returns: :class:`collections.OrderedDict` mapping the names of the
+              outputs to numpy.array with the shape of the image
+    :raises: ValueError if an output is unknown, the image is not 2D or 3D
+             or the mask does not fit the image
+    """
+    _check_outputs(outputs)
+    if image.ndim not in (2, 3):
+        msg = "Expected a 2D or 3D image, got {} dimensions"
+        raise(ValueError(msg.format(image.ndim)))
+    image = _as_float(image, dtype)
+    result = OrderedDict((name, np.empty(image.shape, dtype=image.dtype))
+                         for name in outputs)
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != image.shape and (
+                image.ndim == 2 or mask.shape != _plane_shape(image, axis)):
+            msg = "Mask of shape {} does not fit image of shape {}"
+            raise(ValueError(msg.format(mask.shape, image.shape)))
+    if image.ndim == 2:
+        _plane_gradient(image, result, mask)
+        return result
+
+    axis = axis % 3
+    planes = np.moveaxis(image, axis, 0)
+    output_planes = dict((name, np.moveaxis(array, axis, 0))
+                         for name, array in result.items())
+    if mask is not None and mask.ndim == 3:
+        mask = np.moveaxis(mask, axis, 0)
+
+    def process(z):
+        plane_mask = mask
+        if mask is not None and mask.ndim == 3:
+            plane_mask = mask[z]
+        # The correlations are much faster along contiguous memory, so
+        # slices along other than the first axis are computed in copies.
+        plane_outputs = dict((name, output_plane[z])
+                             for name, output_plane in output_planes.items())
+        copies = [name for name, output in plane_outputs.items()
+                  if not output.flags.c_contiguous]
+        for name in copies:
+            plane_outputs[name] = np.empty(planes.shape[1:], image.dtype)
+        _plane_gradient(np.ascontiguousarray(planes[z]), plane_outputs,
+                        plane_mask)
+        for name in copies:
+            output_planes[name][z] = plane_outputs[name]
+
+    map_slices(process, len(planes), workers)
+    return result
+
+
+def sobel_magnitude(image, spacing=None, mask=None, dtype=np.float64):
+    """Return Sobel edge magnitude of an N-dimensional image.
+
+    The derivative along each axis is smoothed along all the other axes,
+    as by :func:`skimage.filters.sobel`, and divided by the voxel spacing
+    along the axis, so that it is a derivative per unit of the spacing.
+    The magnitude is ``sqrt(sum(derivative**2) / ndim)``; without a spacing
+    it is the same as the result of :func:`skimage.filters.sobel`, to
+    within floating point rounding.
+
+    :param image: numpy.array
+    :param spacing: voxel size along each axis, or None
+    :param mask: optional boolean array with the shape of the image; the
+                 magnitude is zero outside it
+    :param dtype: float32 or float64, the dtype of the computation and of
+                  the output
+    :returns: numpy.array
+    :raises: ValueError if the spacing does not fit the image
+    """
+    import scipy.ndimage as ndi
+    image = _as_float(image, dtype)
+    spacing = voxel_spacing(spacing, image.ndim)
+    magnitude = np.zeros(image.shape, dtype=image.dtype)
+    derivative = np.empty(image.shape, dtype=image.dtype)
+    for axis in range(image.ndim):
+        ndi.correlate1d(image, SOBEL_EDGE, axis=axis, mode="reflect",
+                        output=derivative)
+        for other in range(image.ndim):
+            if other != axis:
+                ndi.correlate1d(derivative, SOBEL_SMOOTH, axis=other,
+                                mode="reflect", output=derivative)
+        if spacing[axis] != 1:
+            derivative /= image.dtype.type(spacing[axis])
+        magnitude += np.square(derivative, out=derivative)
+    np.sqrt(magnitude, out=magnitude)
+    magnitude /= image.dtype.type(np.sqrt(image.ndim))
+    if mask is not None:
+        magnitude[~_eroded(np.asarray(mask, dtype=bool))] = 0
+    return magnitude
+
+
+def _plane_shape(image, axis):
+    """Return shape of the 2D slices of a 3D image along the z axis."""
+    return tuple(n for i, n in enumerate(image.shape) if i != axis % 3)
@@ -0,0 +1,222 @@
+"""Module containing the binary morphology engine.
+
+Binary dilation and erosion with an arbitrary structuring element cost
+O(N * |selem|). The functions in this module recognise common structuring
+elements and use cheaper, exact, equivalents:
+
+- rectangles (all ones) larger than 3x3 are decomposed into one line per
+  axis, making the cost proportional to the sum rather than the product of
+  the side lengths
+- disks, as created by :func:`skimage.morphology.disk`, with a radius of at
+  least :data:`EDT_MIN_RADIUS` are computed from the exact Euclidean
+  distance transform, at a cost independent of the radius
+- balls, as created by :func:`skimage.morphology.ball`, in 3D images, with
+  a radius of at least :data:`BALL_EDT_MIN_RADIUS` are computed in the same
+  way
+- anything else is passed on to :mod:`scipy.ndimage`
+
+The results are identical to those of
+:func:`skimage.morphology.binary_dilation` and
+:func:`skimage.morphology.binary_erosion`, including at the image boundary,
+where dilation treats pixels outside the image as background and erosion
+treats them as foreground.
+
+Anisotropic volumes can be dilated and eroded with a ball whose radius is
+given in the units of the voxel spacing, see :func:`ball`; such a footprint
+is an ellipsoid in voxels and is passed on to :mod:`scipy.ndimage`.
+
+The ``iterations`` argument applies the operation repeatedly. For
+rectangles with odd side lengths this is done in a single pass with a
+larger rectangle.
+"""
+
+import math
+
+import numpy as np
+
+import scipy.ndimage as ndi
+
+#: Smallest disk radius for which the distance transform path is used.
+#: Measured with ``benchmarks/morphology_benchmark.py``.
+EDT_MIN_RADIUS = 6
+
+#: Smallest ball radius for which the distance transform path is used.
+#: Measured with ``benchmarks/volume_benchmark.py``.
+BALL_EDT_MIN_RADIUS = 6
+
+
+def disk(radius):
+    """Return disk shaped structuring element.
+
+    Same as :func:`skimage.morphology.disk`.
+
+    :param radius: radius of the disk in pixels
+    :returns: 2D numpy.array of uint8
+    """
+    coords = np.arange(-radius, radius + 1)
+    x, y = np.meshgrid(coords, coords)
+    return np.array((x ** 2 + y ** 2) <= radius ** 2, dtype=np.uint8)
+
+
+def ball(radius, spacing=None):
+    """Return ball shaped 3D structuring element.
+
+    Without a spacing, same as :func:`skimage.morphology.ball`. With a
+    spacing, the radius is in the units of the spacing and the ball is an
+    ellipsoid in voxels, containing the offsets whose physical length is at
+    most the radius.
+
+    :param radius: radius of the ball, in voxels or in the units of the
+                   spacing
+    :param spacing: voxel size along each of the three axes, or None
+    :returns: 3D numpy.array of uint8
+    :raises: ValueError if the spacing does not have three positive values
+    """
+    from jicbioimage.transform.volume import voxel_spacing
+    spacing = voxel_spacing(spacing, 3)
+    coords = [np.arange(-int(radius / s), int(radius / s) + 1) * s
+              for s in spacing]
+    squares = sum(c ** 2 for c in np.meshgrid(*coords, indexing="ij"))
+    return np.array(squares <= radius ** 2, dtype=np.uint8)
+
+
+def classify_selem(selem, ndim):
+    """Return the kind of a structuring element and its parameter.
+
+    :param selem: structuring element expressed as 1's and 0's, or None
+    :param ndim: number of dimensions of the image
+    :returns: tuple of ("cross", None), ("rectangle", shape),
+              ("disk", radius), ("ball", radius) or ("general", boolean
+              selem)
+    """
+    if selem is None:
+        return "cross", None
+    selem = np.asarray(selem) != 0
+    if selem.ndim != ndim:
+        return "general", selem
+    if selem.all():
+        return "rectangle", selem.shape
+    size = selem.shape[0]
+    if (ndim == 2 and selem.shape == (size, size) and size % 2 == 1
+            and np.array_equal(selem, disk(size // 2) != 0)):
+        return "disk", size // 2
+    if (ndim == 3 and selem.shape == (size, size, size) and size % 2 == 1
+            and np.array_equal(selem, ball(size // 2) != 0)):
+        return "ball", size // 2
+    return "general", selem
+
+
+def binary_dilation(image, selem=None, iterations=1, out=None):
+    """Return dilated image.
+
+    :param image: boolean numpy array
+    :param selem: structuring element expressed as 1's and 0's, default is
+                  a cross
+    :param iterations: number of times to apply the dilation
+    :param out: optional boolean array to write the result to
+    :returns: boolean numpy array
+    """
+    return _morphology(image, selem, iterations, out, dilate=True)
+
+
+def binary_erosion(image, selem=None, iterations=1, out=None):
+    """Return eroded image.
+
+    :param image: boolean numpy array
+    :param selem: structuring element expressed as 1's and 0's, default is
+                  a cross
+    :param iterations: number of times to apply the erosion
+    :param out: optional boolean array to write the result to
+    :returns: boolean numpy array
+    """
+    return _morphology(image, selem, iterations, out, dilate=False)
+
+
+def _morphology(image, selem, iterations, out, dilate):
+    """Return result of repeated dilation or erosion."""
+    if iterations < 1:
+        msg = "Number of iterations must be at least 1, got {}"
+        raise(ValueError(msg.format(iterations)))
+    image = np.asarray(image, dtype=bool)
+    kind, parameter = classify_selem(selem, image.ndim)
+    # The last pass writes to out directly, unless out overlaps the image.
+    output = out
+    if out is not None and np.may_share_memory(out, image):
+        output = None
+
+    if kind == "rectangle" and all(size % 2 for size in parameter):
+        # Repeating an odd sized rectangle is the same as using a larger one.
+        shape = [iterations * (size - 1) + 1 for size in parameter]
+        return _store(_rectangle(image, shape, dilate, output), out)
+
+    result = image
+    for i in range(iterations):
+        last_output = output if i == iterations - 1 else None
+        if kind == "rectangle":
+            result = _rectangle(result, parameter, dilate, last_output)
+        elif kind == "disk" and parameter >= EDT_MIN_RADIUS:
+            result = _disk_edt(result, parameter, dilate)
+        elif kind == "ball" and parameter >= BALL_EDT_MIN_RADIUS:
+            result = _disk_edt(result, parameter, dilate)
+        else:
+            if kind == "cross":
+                structure = ndi.generate_binary_structure(image.ndim, 1)
+            elif kind == "disk":
+                structure = disk(parameter)
+            elif kind == "ball":
+                structure = ball(parameter)
+            else:
+                structure = parameter
+            result = _ndi(result, structure, dilate, last_output)
+    return _store(result, out)
+
+
+def _store(result, out):
+    """Return result, copied into out if given and not already there."""
+    if out is None or result is out:
+        return result
+    out[...] = result
+    return out
+
+
+def _ndi(image, structure, dilate, output=None):
+    """Return result of a single scipy.ndimage binary operation."""
+    if dilate:
+        return ndi.binary_dilation(image, structure=structure, output=output)
+    return ndi.binary_erosion(image, structure=structure, border_value=True,
+                              output=output)
+
+
+def _rectangle(image, shape, dilate, output=None):
+    """Return result of the operation with a rectangle, one axis at a time."""
+    if np.prod(shape) <= 2 * sum(shape):
+        # Small rectangles are faster in a single pass.
+        return _ndi(image, np.ones(shape, dtype=bool), dilate, output)
+    axes = [axis for axis, size in enumerate(shape) if size != 1]
+    result = image
+    for axis in axes:
+        line_shape = [1] * image.ndim
+        line_shape[axis] = shape[axis]
+        result = _ndi(result, np.ones(line_shape, dtype=bool), dilate,
+                      output if axis == axes[-1] else None)
+    if result is image:
+        result = image.copy()
+    return result
+
+
+def _disk_edt(image, radius, dilate):
+    """Return result of the operation with a disk or ball via the EDT.
+
+    A pixel is in the dilation if the nearest foreground pixel is within
+    the radius, and in the erosion if the nearest background pixel is not.
+    Squared distances are integers, so comparing the distances with
+    sqrt(radius**2 + 0.5) is exact.
+    """
+    limit = math.sqrt(radius ** 2 + 0.5)
+    if dilate:
+        if not image.any():
+            return np.zeros(image.shape, dtype=bool)
+        return ndi.distance_transform_edt(~image) <= limit
+    if image.all():
+        return np.ones(image.shape, dtype=bool)
+    return ndi.distance_transform_edt(image) > limit
@@ -0,0 +1,328 @@
+"""Module containing the bit-packed mask type.
+
+Boolean numpy arrays use one byte per pixel. A :class:`PackedMask` stores
+eight pixels per byte, packed along the last axis with
+:func:`numpy.packbits`, and therefore uses eight times less memory.
+
+The mask transformations :func:`jicbioimage.transform.threshold_otsu`,
+:func:`jicbioimage.transform.remove_small_objects`,
+:func:`jicbioimage.transform.dilate_binary` and
+:func:`jicbioimage.transform.erode_binary` accept packed masks and return
+packed masks when given one.
+
+The logical operations and the binary morphology with crosses and odd sized
+rectangles in this module work directly on the packed bytes.
+
+>>> import numpy as np
+>>> mask = pack(np.array([[True, False, True]]))
+>>> mask.shape, mask.mask_shape
+((1, 1), (1, 3))
+>>> logical_not(mask).unpack()
+array([[False,  True, False]])
+"""
+
+import numpy as np
+
+from jicbioimage.core.image import Image, _BaseImageWithHistory
+
+from jicbioimage.transform import morphology
+
+#: Number of set bits in each byte value.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class PackedMask(_BaseImageWithHistory):
+    """Boolean image with eight pixels packed into each byte.
+
+    The array holds the packed uint8 bytes; numpy operations act on these
+    bytes, not on the pixels. Use :func:`pack` to create a packed mask and
+    :meth:`PackedMask.unpack` to get the boolean array back.
+    """
+
+    def __array_finalize__(self, obj):
+        super(PackedMask, self).__array_finalize__(obj)
+        if obj is None:
+            return
+        self.width = getattr(obj, "width", None)
+
+    @property
+    def mask_shape(self):
+        """Shape of the unpacked boolean mask."""
+        return self.shape[:-1] + (self.width,)
+
+    def unpack(self):
+        """Return the mask as a boolean numpy array.
+
+        :returns: boolean numpy.array
+        """
+        array = np.asarray(self)
+        bits = np.unpackbits(array, axis=-1, count=self.width)
+        return bits.view(bool)
+
+    def png(self, width=None):
+        """Return png string of the unpacked mask.
+
+        :param width: integer specifying the desired width
+        :returns: png as a string
+        """
+        image = Image.from_array(self.unpack(), log_in_history=False)
+        return image.png(width)
+
+
+def pack(mask, out=None):
+    """Return packed mask.
+
+    The packed mask shares the history of the mask, if it has one.
+
+    :param mask: boolean numpy array
+    :param out: optional :class:`PackedMask` to write the result to
+    :returns: :class:`PackedMask`
+    """
+    words = np.packbits(mask, axis=-1)
+    if out is not None:
+        out[...] = words
+        out.width = mask.shape[-1]
+        return out
+    packed = from_words(words, mask.shape[-1])
+    if hasattr(mask, "history"):
+        packed.history = mask.history
+    return packed
+
+
+def from_words(words, width):
+    """Return packed mask viewing already packed bytes.
+
+    :param words: uint8 numpy array packed along the last axis
+    :param width: length of the last axis of the unpacked mask
+    :returns: :class:`PackedMask`
+    """
+    packed = np.asarray(words).view(PackedMask)
+    packed.width = width
+    return packed
+
+
+def _clear_padding(words, width):
+    """Set the unused bits at the end of each row to zero, in place."""
+    remainder = width % 8
+    if remainder:
+        words[..., -1] &= np.uint8((0xFF << (8 - remainder)) & 0xFF)
+    return words
+
+
+def _check_widths(*masks):
+    """Raise ValueError if the masks do not have the same shape."""
+    shapes = set(mask.mask_shape for mask in masks)
+    if len(shapes) != 1:
+        msg = "Masks have different shapes: {}"
+        raise(ValueError(msg.format(sorted(shapes))))
+
+
+def logical_and(mask1, mask2):
+    """Return pixel-wise logical and of two packed masks.
+
+    :param mask1: :class:`PackedMask`
+    :param mask2: :class:`PackedMask`
+    :returns: :class:`PackedMask`
+    """
+    _check_widths(mask1, mask2)
+    return from_words(np.bitwise_and(mask1, mask2), mask1.width)
+
+
+def logical_or(mask1, mask2):
+    """Return pixel-wise logical or of two packed masks.
+
+    :param mask1: :class:`PackedMask`
+    :param mask2: :class:`PackedMask`
+    :returns: :class:`PackedMask`
+    """
+    _check_widths(mask1, mask2)
+    return from_words(np.bitwise_or(mask1, mask2), mask1.width)
+
+
+def logical_xor(mask1, mask2):
+    """Return pixel-wise logical exclusive or of two packed masks.
+
+    :param mask1: :class:`PackedMask`
+    :param mask2: :class:`PackedMask`
+    :returns: :class:`PackedMask`
+    """
+    _check_widths(mask1, mask2)
+    return from_words(np.bitwise_xor(mask1, mask2), mask1.width)
+
+
+def logical_not(mask):
+    """Return pixel-wise logical not of a packed mask.
+
+    :param mask: :class:`PackedMask`
+    :returns: :class:`PackedMask`
+    """
+    words = _clear_padding(np.invert(np.asarray(mask)), mask.width)
+    return from_words(words, mask.width)
+
+
+def count_nonzero(mask):
+    """Return number of foreground pixels in a packed mask.
+
+    :param mask: :class:`PackedMask`
+    :returns: int
+    """
+    return int(_POPCOUNT[np.asarray(mask)].sum(dtype=np.int64))
+
+
+def _shift_last_axis(words, shift):
+    """Return words with pixel x replaced by pixel x + shift, zero filled.
+
+    Bits are in big endian order, so moving pixels towards lower indices
+    means shifting the bit stream to the left.
+    """
+    result = np.zeros_like(words)
+    n = words.shape[-1]
+    byte_shift, bit_shift = divmod(abs(shift), 8)
+    if byte_shift >= n:
+        return result
+    if shift > 0:
+        source = words[..., byte_shift:]
+        target = result[..., :n - byte_shift]
+        target[...] = source << np.uint8(bit_shift)
+        if bit_shift:
+            target[..., :-1] |= source[..., 1:] >> np.uint8(8 - bit_shift)
+    else:
+        source = words[..., :n - byte_shift]
+        target = result[..., byte_shift:]
+        target[...] = source >> np.uint8(bit_shift)
+        if bit_shift:
+            target[..., 1:] |= source[..., :-1] << np.uint8(8 - bit_shift)
+    return result
+
+
+def _shift_axis(words, axis, shift):
+    """Return words shifted along a non-packed axis, zero filled."""
+    result = np.zeros_like(words)
+    n = words.shape[axis]
+    if abs(shift) >= n:
+        return result
+    source = [slice(None)] * words.ndim
+    target = [slice(None)] * words.ndim
+    if shift > 0:
+        source[axis] = slice(shift, None)
+        target[axis] = slice(None, n - shift)
+    else:
+        source[axis] = slice(None, n + shift)
+        target[axis] = slice(-shift, None)
+    result[tuple(target)] = words[tuple(source)]
+    return result
+
+
+def _dilate_words(words, width, radii):
+    """Return words dilated by a rectangle with the given radius per axis.
+
+    A radius of None along an axis means the cross: the image is dilated by
+    one pixel along each axis, but the axes are not combined.
+    """
+    last = words.ndim - 1
+    if radii is None:
+        result = words.copy()
+        for axis in range(words.ndim):
+            for shift in (-1, 1):
+                if axis == last:
+                    result |= _shift_last_axis(words, shift)
+                else:
+                    result |= _shift_axis(words, axis, shift)
+        return _clear_padding(result, width)
+
+    result = words
+    for axis, radius in enumerate(radii):
+        if radius == 0:
+            continue
+        line = result.copy()
+        for shift in range(-radius, radius + 1):
+            if shift == 0:
+                continue
+            if axis == last:
+                line |= _shift_last_axis(result, shift)
+            else:
+                line |= _shift_axis(result, axis, shift)
+        result = line
+    if result is words:
+        result = words.copy()
+    return _clear_padding(result, width)
+
+
+def _rectangle_radii(selem, ndim):
+    """Return radius per axis if selem is None or an odd rectangle.
+
+    :returns: "cross" for None, tuple of radii for odd rectangles, and
+              False for other structuring elements
+    """
+    if selem is None:
+        return "cross"
+    selem = np.asarray(selem)
+    if (selem.ndim == ndim and selem.all()
+            and all(size % 2 for size in selem.shape)):
+        return tuple(size // 2 for size in selem.shape)
+    return False
+
+
+def _morphology(mask, selem, iterations, out, dilate):
+    """Return result of repeated dilation or erosion of a packed mask."""
+    radii = _rectangle_radii(selem, mask.ndim)
+    if radii is False:
+        func = morphology.binary_dilation if dilate else \
+            morphology.binary_erosion
+        return pack(func(mask.unpack(), selem, iterations), out=out)
+
+    if iterations < 1:
+        msg = "Number of iterations must be at least 1, got {}"
+        raise(ValueError(msg.format(iterations)))
+
+    words = np.asarray(mask)
+    if not dilate:
+        # Erosion, with pixels outside the image counting as foreground, is
+        # the complement of the dilation of the complement.
+        words = _clear_padding(np.invert(words), mask.width)
+    if radii == "cross":
+        for i in range(iterations):
+            words = _dilate_words(words, mask.width, None)
+    else:
+        radii = tuple(radius * iterations for radius in radii)
+        words = _dilate_words(words, mask.width, radii)
+    if not dilate:
+        words = _clear_padding(np.invert(words, out=words), mask.width)
+
+    if out is not None:
+        out[...] = words
+        out.width = mask.width
+        return out
+    return from_words(words, mask.width)
+
+
+def binary_dilation(mask, selem=None, iterations=1, out=None):
+    """Return dilated packed mask.
+
+    Crosses and rectangles with odd side lengths are processed on the packed
+    bytes; other structuring elements unpack the mask.
+
+    :param mask: :class:`PackedMask`
+    :param selem: structuring element expressed as 1's and 0's, default is
+                  a cross
+    :param iterations: number of times to apply the dilation
+    :param out: optional :class:`PackedMask` to write the result to
+    :returns: :class:`PackedMask`
+    """
+    return _morphology(mask, selem, iterations, out, dilate=True)
+
+
+def binary_erosion(mask, selem=None, iterations=1, out=None):
+    """Return eroded packed mask.
+
+    Crosses and rectangles with odd side lengths are processed on the packed
+    bytes; other structuring elements unpack the mask.
+
+    :param mask: :class:`PackedMask`
+    :param selem: structuring element expressed as 1's and 0's, default is
+                  a cross
+    :param iterations: number of times to apply the erosion
+    :param out: optional :class:`PackedMask` to write the result to
+    :returns: :class:`PackedMask`
+    """
+    return _morphology(mask, selem, iterations, out, dilate=False)
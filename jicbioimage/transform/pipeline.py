@@ -0,0 +1,189 @@
+"""Module for composing transformations into fused pipelines.
+
+Calling transformations one after the other creates a new
+:class:`jicbioimage.core.image.Image`, appends to its history and, when
+AutoWrite is on, writes a PNG file after every step. For small images this
+overhead dominates the run time. A :class:`Pipeline` runs the undecorated
+functions behind the transformations on plain numpy arrays and only creates
+a single :class:`jicbioimage.core.image.Image` at the end.
+
+>>> from jicbioimage.transform import (
+...     smooth_gaussian,
+...     threshold_otsu,
+...     remove_small_objects,
+...     dilate_binary,
+... )
+>>> pipeline = Pipeline()
+>>> pipeline = pipeline.add(smooth_gaussian, sigma=2).add(threshold_otsu)
+>>> pipeline = pipeline.add(remove_small_objects, min_size=10)
+>>> pipeline = pipeline.add(dilate_binary)
+>>> mask = pipeline(image)  # doctest: +SKIP
+"""
+
+import inspect
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from jicbioimage.transform import autowrite, precision, profiling, threshold
+from jicbioimage.transform.packed import PackedMask, from_words
+
+_Step = namedtuple("_Step", ["func", "kwargs", "accepts_out"])
+
+
+class Pipeline(object):
+    """Sequence of transformations applied as a single transformation.
+
+    The history of the output image has one event per step, exactly as if
+    the transformations had been called one after the other.
+
+    Intermediate results of steps whose function accepts an ``out``
+    argument are written to buffers that are owned by the pipeline and
+    reused on subsequent calls with inputs of the same shape and dtype.
+    The output of the last step is always a new array.
+
+    :param write: which outputs to write when AutoWrite is on; "final" only
+                  writes the output of the last step, "all" writes the
+                  output of every step and "none" writes nothing
+    """
+
+    #: Allowed values of the write parameter.
+    WRITE_OPTIONS = ("final", "all", "none")
+
+    def __init__(self, write="final"):
+        if write not in Pipeline.WRITE_OPTIONS:
+            msg = "Unknown write option {}. Allowed option(s): {}"
+            raise(ValueError(msg.format(write, Pipeline.WRITE_OPTIONS)))
+        self.write = write
+        self._steps = []
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._steps)
+
+    def add(self, transform, **kwargs):
+        """Append a transformation to the pipeline.
+
+        :param transform: transformation from :mod:`jicbioimage.transform`
+        :param kwargs: keyword arguments passed on to the transformation
+        :returns: the pipeline, to allow calls to be chained
+        :raises: TypeError if transform is not a transformation
+        """
+        func = getattr(transform, "__wrapped__", None)
+        if func is None:
+            msg = "{} is not a transformation".format(transform)
+            raise(TypeError(msg))
+        accepts_out = "out" in inspect.signature(func).parameters
+        self._steps.append(_Step(func, kwargs, accepts_out))
+        self._buffers = {}
+        return self
+
+    def __call__(self, image):
+        """Return the result of applying all the steps to the image.
+
+        :param image: numpy array or :class:`jicbioimage.core.image.Image`
+        :returns: :class:`jicbioimage.core.image.Image`
+        :raises: ValueError if the pipeline has no steps
+        """
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.core.image import History
+
+        if len(self._steps) == 0:
+            raise(ValueError("Cannot run a pipeline without any steps"))
+
+        # The precision policy can change the dtypes of the outputs.
+        key = (image.shape, image.dtype.str, precision.get_policy())
+        with self._lock:
+            buffers = self._buffers.pop(key, None)
+
+        history = History()
+        if hasattr(image, "history"):
+            history.extend(image.history)
+
+        write = AutoWrite.on and self.write != "none"
+        last = len(self._steps) - 1
+        specs = []
+        array = image
+        for i, step in enumerate(self._steps):
+            kwargs = dict(step.kwargs)
+            if buffers is not None and buffers[i] is not None:
+                # The buffer is about to be overwritten.
+                threshold.invalidate(buffers[i])
+                kwargs["out"] = buffers[i]
+            with profiling.record(step.func.__name__, array) as call:
+                with profiling.phase("contract"):
+                    array = step.func(array, **kwargs)
+                specs.append(_spec(array))
+                with profiling.phase("wrapping"):
+                    history.add_event(step.func, [],
+                                      autowrite.history_kwargs(step.kwargs))
+                if write and (i == last or self.write == "all"):
+                    autowrite.write(_as_image(array), step.func)
+                call.set_output(array)
+
+        if buffers is None:
+            buffers = self._plan_buffers(specs)
+        elif any(array is buffer for buffer in buffers):
+            # The last step returned its input; do not hand out a buffer
+            # that will be overwritten by the next call.
+            array = array.copy()
+        with self._lock:
+            self._buffers[key] = buffers
+
+        output = _as_image(array)
+        output.history = history
+        return output
+
+    def _plan_buffers(self, specs):
+        """Return list of reusable output buffers, one entry per step.
+
+        Entries are None for the last step and for steps whose function
+        does not accept an ``out`` argument. A buffer is never assigned to
+        two consecutive steps, because a step cannot write to its input.
+        """
+        buffers = []
+        pool = {}
+        previous = None
+        for step, spec in zip(self._steps[:-1], specs[:-1]):
+            if not step.accepts_out:
+                buffers.append(None)
+                previous = None
+                continue
+            candidates = pool.setdefault(spec, [])
+            buffer = None
+            for candidate in candidates:
+                if candidate is not previous:
+                    buffer = candidate
+                    break
+            if buffer is None:
+                buffer = _empty(spec)
+                candidates.append(buffer)
+            buffers.append(buffer)
+            previous = buffer
+        buffers.append(None)
+        return buffers
+
+
+def _as_image(array):
+    """Return array as an image, keeping packed masks packed."""
+    from jicbioimage.core.image import Image
+    if isinstance(array, PackedMask):
+        return from_words(array, array.width)
+    return Image.from_array(array, log_in_history=False)
+
+
+def _spec(array):
+    """Return shape, dtype and packed mask width of an array."""
+    width = array.width if isinstance(array, PackedMask) else None
+    return (array.shape, array.dtype.str, width)
+
+
+def _empty(spec):
+    """Return uninitialised array, or packed mask, matching a spec."""
+    shape, dtype, width = spec
+    array = np.empty(shape, dtype=dtype)
+    if width is None:
+        return array
+    return from_words(array, width)
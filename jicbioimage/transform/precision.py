@@ -0,0 +1,120 @@
+"""Module containing the floating point precision policy.
+
+The transformations in :mod:`jicbioimage.transform` with floating point
+results compute and return them in the precision given by the policy:
+
+- "native": the default precision of each transformation, i.e. float32 and
+  float64 images are smoothed and their edges found in their own precision,
+  while sum and standard deviation projections are float64
+- "float64": all floating point results are float64
+- "float32": all floating point results are float32, which halves the
+  memory used and the bytes moved by each step of a pipeline
+
+Inputs that already have the dtype required by the policy are used as they
+are, without a copy; float inputs of the other precision are converted
+once. Integer and boolean inputs are never converted to float by the
+policy, nor are they normalised; transformations that only accept float
+images still raise a TypeError for them. Sums and standard deviations are
+accumulated in float64 whatever the policy, and only the result is
+converted.
+
+>>> from jicbioimage.transform import precision
+>>> with precision.policy("float32"):  # doctest: +SKIP
+...     edges = find_edges_sobel(smooth_gaussian(image))
+>>> precision.set_policy("float32")  # doctest: +SKIP
+'native'
+
+The policy is global, like :attr:`jicbioimage.core.io.AutoWrite.on`, and
+applies to all threads.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+#: Names of the precision policies.
+POLICIES = ("native", "float64", "float32")
+
+#: Policy used unless another one is set.
+DEFAULT_POLICY = "native"
+
+_policy = DEFAULT_POLICY
+
+
+def _check_policy(name):
+    """Raise ValueError if the policy is unknown."""
+    if name not in POLICIES:
+        msg = "Unknown precision policy {}. Allowed policies: {}"
+        raise(ValueError(msg.format(name, POLICIES)))
+
+
+def set_policy(name):
+    """Set the precision policy.
+
+    :param name: one of the :data:`POLICIES`
+    :returns: name of the previous policy
+    :raises: ValueError if the policy is unknown
+    """
+    global _policy
+    _check_policy(name)
+    previous, _policy = _policy, name
+    return previous
+
+
+def get_policy():
+    """Return the name of the precision policy."""
+    return _policy
+
+
+@contextmanager
+def policy(name):
+    """Context manager setting the precision policy within it.
+
+    :param name: one of the :data:`POLICIES`
+    :raises: ValueError if the policy is unknown
+    """
+    previous = set_policy(name)
+    try:
+        yield
+    finally:
+        set_policy(previous)
+
+
+def float_dtype(default=np.float64):
+    """Return the dtype of floating point results under the policy.
+
+    :param default: dtype of the result under the "native" policy
+    :returns: numpy.dtype
+    """
+    if _policy == "native":
+        return np.dtype(default)
+    return np.dtype(_policy)
+
+
+def as_float(array):
+    """Return float array in the precision of the policy.
+
+    The array itself is returned if it already has the required dtype, or
+    if it is not a float array.
+
+    :param array: numpy array
+    :returns: numpy array
+    """
+    if array.dtype.kind != "f":
+        return array
+    dtype = float_dtype(array.dtype)
+    if array.dtype == dtype:
+        return array
+    return array.astype(dtype)
+
+
+def float_contract(func):
+    """Function decorator converting a float input image to the policy.
+
+    The first argument is passed through :func:`as_float`.
+    """
+    @wraps(func)
+    def wrapped_function(image, *args, **kwargs):
+        return func(as_float(image), *args, **kwargs)
+    return wrapped_function
@@ -0,0 +1,361 @@
+"""Module for opt-in profiling of transformations.
+
+When profiling is enabled, every call of a transformation in
+:mod:`jicbioimage.transform`, including the steps of a
+:class:`jicbioimage.transform.pipeline.Pipeline`, is recorded with its wall
+time split into phases:
+
+- "contract": checking and converting dtypes, e.g. by
+  :func:`jicbioimage.core.util.array.dtype_contract` or by unpacking
+  :class:`jicbioimage.transform.packed.PackedMask` inputs
+- "cache": computing keys and looking up results in the result cache of
+  :mod:`jicbioimage.transform.cache`, if it is enabled
+- "algorithm": the computation itself
+- "wrapping": creating the output :class:`jicbioimage.core.image.Image`
+  and recording its history
+- "autowrite": writing the output when AutoWrite is on, or queueing it in
+  write-behind mode
+
+Each phase only includes the time not spent in the phases nested within it.
+The shape, dtype and size in bytes of the input and output are recorded as
+well and, if ``trace_memory`` is set, the peak memory allocated during the
+call as reported by :mod:`tracemalloc`, which slows down the calls. The peak
+of a call includes the peaks of the calls nested within it. Before Python
+3.9, which added :func:`tracemalloc.reset_peak`, a call that stays below
+the highest peak reached before it is only credited with the memory it
+still holds when it returns.
+
+>>> from jicbioimage.transform import profiling
+>>> with profiling.profile() as profiler:  # doctest: +SKIP
+...     mask = threshold_otsu(smooth_gaussian(image))
+>>> print(profiler.summary())  # doctest: +SKIP
+>>> profiler.to_json("profile.json")  # doctest: +SKIP
+
+Profiling is off by default. While it is off each transformation only
+checks a module level variable, so the overhead is negligible. Calls made in
+the worker processes of :func:`jicbioimage.transform.batch.run_batch` are
+not recorded.
+"""
+
+import json
+import time
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+#: Phases into which the time of a call is split.
+PHASES = ("contract", "cache", "algorithm", "wrapping", "autowrite")
+
+_active = None
+_active_lock = threading.Lock()
+_local = threading.local()
+
+
+def _describe(array):
+    """Return shape, dtype and size in bytes of an array, or None."""
+    if not isinstance(array, np.ndarray):
+        return None
+    return OrderedDict([("shape", list(array.shape)),
+                        ("dtype", array.dtype.name),
+                        ("nbytes", int(array.nbytes))])
+
+
+class Record(object):
+    """Timing and array information of one call of a transformation.
+
+    :param name: name of the transformation
+    :param image: input image
+    """
+
+    def __init__(self, name, image):
+        self.name = name
+        self.total = 0.0
+        self.phases = OrderedDict((phase, 0.0) for phase in PHASES)
+        self.input = _describe(image)
+        self.output = None
+        self.peak_bytes = None
+        self._baseline = None
+        self._entry_peak = None
+        self._peak = None
+
+    def set_output(self, image):
+        """Record the shape, dtype and size of the output image."""
+        self.output = _describe(image)
+
+    def as_dict(self):
+        """Return the record as a dictionary suitable for JSON."""
+        return OrderedDict([
+            ("name", self.name),
+            ("total", self.total),
+            ("phases", self.phases),
+            ("input", self.input),
+            ("output", self.output),
+            ("peak_bytes", self.peak_bytes),
+        ])
+
+
+class Profiler(object):
+    """Collection of the records of profiled calls.
+
+    :param trace_memory: if True, record the peak memory allocated during
+                         each call using :mod:`tracemalloc`
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        """Add a record.
+
+        :param record: :class:`Record`
+        """
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        """Remove all records."""
+        with self._lock:
+            self.records = []
+
+    def totals(self):
+        """Return the number of calls and times per transformation.
+
+        :returns: :class:`collections.OrderedDict` mapping the names of the
+                  transformations, in order of their first call, to
+                  dictionaries with the number of calls, the total time,
+                  the time per phase and the bytes of output
+        """
+        totals = OrderedDict()
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            if record.name not in totals:
+                totals[record.name] = OrderedDict([
+                    ("calls", 0),
+                    ("total", 0.0),
+                    ("phases", OrderedDict((p, 0.0) for p in PHASES)),
+                    ("output_bytes", 0),
+                ])
+            total = totals[record.name]
+            total["calls"] += 1
+            total["total"] += record.total
+            for phase, elapsed in record.phases.items():
+                total["phases"][phase] += elapsed
+            if record.output is not None:
+                total["output_bytes"] += record.output["nbytes"]
+        return totals
+
+    def to_json(self, fpath=None):
+        """Return the records as JSON, optionally writing them to a file.
+
+        :param fpath: optional path of the file to write
+        :returns: JSON string
+        """
+        with self._lock:
+            records = [record.as_dict() for record in self.records]
+        text = json.dumps({"phases": list(PHASES), "records": records},
+                          indent=2)
+        if fpath is not None:
+            with open(fpath, "w") as fh:
+                fh.write(text)
+        return text
+
+    def summary(self):
+        """Return a table of the times per transformation and phase.
+
+        :returns: string
+        """
+        columns = ["calls", "total"] + list(PHASES) + ["output MiB"]
+        lines = ["{:<36}".format("transformation") +
+                 "".join("{:>11}".format(c) for c in columns)]
+        for name, total in self.totals().items():
+            values = ["{:>11d}".format(total["calls"]),
+                      "{:>10.4f}s".format(total["total"])]
+            values.extend("{:>10.4f}s".format(total["phases"][phase])
+                          for phase in PHASES)
+            values.append("{:>11.1f}".format(
+                total["output_bytes"] / 1024.0 ** 2))
+            lines.append("{:<36}".format(name) + "".join(values))
+        return "\n".join(lines)
+
+
+def enable(trace_memory=False):
+    """Turn on profiling of transformations.
+
+    :param trace_memory: if True, record the peak memory allocated during
+                         each call using :mod:`tracemalloc`
+    :returns: the active :class:`Profiler`
+    """
+    global _active
+    profiler = Profiler(trace_memory)
+    with _active_lock:
+        previous, _active = _active, profiler
+    _stop_tracing(previous)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        profiler._started_tracing = True
+    return profiler
+
+
+def disable():
+    """Turn off profiling of transformations."""
+    global _active
+    with _active_lock:
+        previous, _active = _active, None
+    _stop_tracing(previous)
+
+
+def _stop_tracing(profiler):
+    """Stop tracemalloc if it was started for a profiler."""
+    if profiler is not None and profiler._started_tracing:
+        profiler._started_tracing = False
+        tracemalloc.stop()
+
+
+def active():
+    """Return the active :class:`Profiler`, or None if profiling is off."""
+    return _active
+
+
+@contextmanager
+def profile(trace_memory=False):
+    """Context manager profiling the transformations called within it.
+
+    The previously active profiler, if any, is restored on exit.
+
+    :param trace_memory: if True, record the peak memory allocated during
+                         each call using :mod:`tracemalloc`
+    :returns: :class:`Profiler`
+    """
+    global _active
+    with _active_lock:
+        previous, _active = _active, None
+    profiler = enable(trace_memory)
+    try:
+        yield profiler
+    finally:
+        with _active_lock:
+            _active = previous
+        _stop_tracing(profiler)
+
+
+@contextmanager
+def record(name, image):
+    """Context manager recording a call of a transformation.
+
+    The record is added to the active profiler on exit; the output should be
+    set with :meth:`Record.set_output`.
+
+    :param name: name of the transformation
+    :param image: input image
+    :returns: :class:`Record`
+    """
+    profiler = _active
+    if profiler is None:
+        yield Record(name, image)
+        return
+    call = Record(name, image)
+    outer = (getattr(_local, "record", None), getattr(_local, "frames", None))
+    _local.record = call
+    _local.frames = []
+    tracing = profiler.trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        _start_peak(call, outer[0])
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        call.total = time.perf_counter() - start
+        if tracing:
+            _stop_peak(call, outer[0])
+        _local.record, _local.frames = outer
+        profiler.add(call)
+
+
+def _traced(call):
+    """Return True if the peak memory of a call is being traced."""
+    return call is not None and call._peak is not None
+
+
+def _update_peak(call):
+    """Add the current traced memory to the peak of a call."""
+    current, peak = tracemalloc.get_traced_memory()
+    if peak <= call._entry_peak:
+        # The peak was reached before the call started.
+        peak = current
+    call._peak = max(call._peak, peak)
+
+
+def _start_peak(call, outer):
+    """Start tracing the peak memory of a call nested in an outer call."""
+    if _traced(outer):
+        # Resetting the peak below would lose the outer call's peak so far.
+        _update_peak(outer)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    call._baseline, call._entry_peak = tracemalloc.get_traced_memory()
+    call._peak = call._baseline
+
+
+def _stop_peak(call, outer):
+    """Set the peak bytes of a call and add its peak to the outer call."""
+    _update_peak(call)
+    call.peak_bytes = call._peak - call._baseline
+    if _traced(outer):
+        outer._peak = max(outer._peak, call._peak)
+
+
+class phase(object):
+    """Context manager adding the time spent within it to a phase.
+
+    The time is added to the phase of the call being recorded in the
+    current thread, excluding the time spent in nested phases. Outside a
+    recorded call it does nothing.
+
+    :param name: one of the :data:`PHASES`
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._frames = None
+
+    def __enter__(self):
+        self._frames = getattr(_local, "frames", None)
+        if self._frames is not None:
+            self._frames.append([time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        frames = self._frames
+        if frames is None:
+            return False
+        start, nested = frames.pop()
+        elapsed = time.perf_counter() - start
+        _local.record.phases[self.name] += elapsed - nested
+        if frames:
+            frames[-1][1] += elapsed
+        return False
+
+
+def algorithm(func):
+    """Function decorator timing the computation of a transformation.
+
+    Applied to the undecorated function, below any dtype contracts.
+    """
+    @wraps(func)
+    def timed_algorithm(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        with phase("algorithm"):
+            return func(*args, **kwargs)
+    return timed_algorithm
@@ -0,0 +1,490 @@
+"""Module containing the projection engine.
+
+The functions in this module reduce whole axes of a :class:`numpy.ndarray`
+in a single NumPy call, rather than calling a Python function once per
+(x, y) position as :func:`jicbioimage.core.util.array.reduce_stack` does.
+They are used by the intensity projection transformations in
+:mod:`jicbioimage.transform`.
+
+Stacks that do not fit in memory can be projected with
+:func:`stream_project`, which accepts a :class:`numpy.memmap` or an
+iterator of 2D z-slices and only holds a bounded amount of the input in
+memory at any one time.
+
+By default the third axis is projected, matching stacks created with
+:func:`numpy.dstack`. Other axes of N-dimensional data, for example the z
+axis of TCZYX data, can be projected by passing ``axis``; all the other
+axes are projected in the same vectorized pass. The
+:class:`PlaneStack` class holds such projections, which have more than two
+dimensions.
+
+Several statistics of the same stack, e.g. the max, mean and standard
+deviation, can be computed from a single read of the stack with
+:func:`project_statistics`.
+
+Median and percentile projections are computed by the rank engine in
+:mod:`jicbioimage.transform.rank`, see :func:`project_percentile`.
+"""
+
+import os
+import mmap
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+from jicbioimage.core.image import Image, History
+
+from jicbioimage.transform import precision, rank
+
+#: Names of the projection methods understood by :func:`project`.
+METHODS = ("max", "min", "mean", "median", "sum", "std", "argmax")
+
+#: Names of the statistics that :func:`project_statistics` computes in a
+#: single pass.
+STATISTICS = ("max", "min", "mean", "sum", "std", "argmax")
+
+#: Default number of bytes of input per block in
+#: :func:`project_statistics`, small enough for a block and its temporary
+#: arrays to stay in cache while all the statistics are computed from it.
+STATISTICS_BLOCK_BYTES = 1 << 18
+
+#: Default number of bytes of input per block in median and percentile
+#: projections, see :mod:`jicbioimage.transform.rank`.
+RANK_BLOCK_BYTES = 1 << 19
+
+
+def _median(stack, axis):
+    """Return median projection computed by the rank engine."""
+    return _project_ranks(stack, axis, rank.median)
+
+
+_REDUCERS = {
+    "max": np.max,
+    "min": np.min,
+    "mean": np.mean,
+    "median": _median,
+    "sum": lambda stack, axis: np.sum(stack, axis=axis, dtype=np.float64),
+    "std": lambda stack, axis: np.std(stack, axis=axis, dtype=np.float64),
+    "argmax": np.argmax,
+}
+
+
+def output_dtype(method, dtype):
+    """Return dtype of a projection.
+
+    Sums and standard deviations are float, float64 unless the precision
+    policy of :mod:`jicbioimage.transform.precision` says otherwise, and
+    the index of the maximum is an integer; all other projections have the
+    dtype of the stack.
+
+    :param method: name of the projection method
+    :param dtype: dtype of the stack
+    :returns: numpy.dtype
+    """
+    if method in ("sum", "std"):
+        return precision.float_dtype(np.float64)
+    if method == "argmax":
+        return np.dtype(np.intp)
+    return np.dtype(dtype)
+
+
+def _check_method(method, allowed=METHODS):
+    """Raise ValueError if the method is unknown."""
+    if method not in allowed:
+        msg = "Unknown projection method {}. Allowed method(s): {}"
+        raise(ValueError(msg.format(method, allowed)))
+
+
+class PlaneStack(Image):
+    """Stack of 2D planes, e.g. the projection of TCZYX data.
+
+    The last two axes are the rows and columns of the planes; the leading
+    axes index the planes. The stack is written as a directory with one PNG
+    file per plane.
+    """
+
+    def planes(self):
+        """Return the planes, each with its own copy of the history.
+
+        :returns: :class:`collections.OrderedDict` mapping the index of each
+                  plane along the leading axes to a 2D
+                  :class:`jicbioimage.core.image.Image`
+        """
+        planes = OrderedDict()
+        for index in np.ndindex(*self.shape[:-2]):
+            plane = Image.from_array(np.asarray(self[index]),
+                                     name=_index_name(index),
+                                     log_in_history=False)
+            plane.history = History()
+            plane.history.extend(self.history)
+            planes[index] = plane
+        return planes
+
+    def write(self, name):
+        """Write planes to disk.
+
+        :param name: name of output directory, without the ".stack"
+                     extension; the planes are named after their index
+        """
+        dirname = name + ".stack"
+        if os.path.isdir(dirname):
+            shutil.rmtree(dirname)
+        os.mkdir(dirname)
+        for index, plane in self.planes().items():
+            plane.write(os.path.join(dirname, _index_name(index)))
+
+
+def _index_name(index):
+    """Return name of a plane, e.g. "0_1" for index (0, 1)."""
+    return "_".join(str(i) for i in index)
+
+
+def _check_stack(stack, axis):
+    """Raise ValueError if the axis cannot be projected."""
+    if stack.ndim < 3:
+        msg = "Projection requires a stack of at least 3 dimensions, got {}"
+        raise(ValueError(msg.format(stack.ndim)))
+    if not -stack.ndim <= axis < stack.ndim:
+        msg = "Axis {} out of range for a stack of {} dimensions"
+        raise(ValueError(msg.format(axis, stack.ndim)))
+
+
+def project(stack, method, axis=2):
+    """Return projection of one axis of the stack.
+
+    The output has the same dtype as the input, i.e. mean and median
+    projections of integer stacks are truncated in the same way as when
+    using :func:`jicbioimage.core.util.array.reduce_stack`. The exceptions
+    are listed in :func:`output_dtype`. The "argmax" projection is the index
+    along the axis of the first occurrence of the maximum.
+
+    :param stack: numpy.array with at least three dimensions
+    :param method: one of "max", "min", "mean", "median", "sum", "std" or
+                   "argmax"
+    :param axis: axis to project, by default the third
+    :returns: numpy.array with one dimension less than the stack
+    :raises: ValueError if the method is unknown, the stack has less than
+             three dimensions or the axis is out of range
+    """
+    _check_method(method)
+    _check_stack(stack, axis)
+    projection = _REDUCERS[method](stack, axis=axis)
+    return projection.astype(output_dtype(method, stack.dtype), copy=False)
+
+
+def project_percentile(stack, q, axis=2):
+    """Return percentile projection of one axis of the stack.
+
+    The percentile is interpolated linearly between the two nearest ranks,
+    as by :func:`numpy.percentile`, and the output has the same dtype as
+    the input, like the median projection. For example the 10th percentile
+    is a robust estimate of the background.
+
+    :param stack: numpy.array or numpy.memmap with at least three dimensions
+    :param q: percentile, between 0 and 100
+    :param axis: axis to project, by default the third
+    :returns: numpy.array with one dimension less than the stack
+    :raises: ValueError if q is out of range, the stack has less than three
+             dimensions or the axis is out of range
+    """
+    _check_stack(stack, axis)
+    projection = _project_ranks(stack, axis,
+                                lambda block, axis: rank.percentile(
+                                    block, q, axis))
+    return projection.astype(stack.dtype, copy=False)
+
+
+def _project_ranks(stack, axis, reduce_block):
+    """Return rank projection computed in blocks.
+
+    Blocks of memory mapped stacks are read one at a time.
+    """
+    axis = axis % stack.ndim
+    output_shape = stack.shape[:axis] + stack.shape[axis + 1:]
+    projection = None
+    for block, target in _blocks(stack, RANK_BLOCK_BYTES, axis):
+        result = reduce_block(block, axis)
+        if projection is None:
+            projection = np.empty(output_shape, dtype=result.dtype)
+        projection[target] = result
+    return projection
+
+
+#: Default base of the remedian used by :func:`stream_project` to estimate
+#: the median of an iterator of z-slices.
+REMEDIAN_BASE = 11
+
+
+def stream_project(source, method, block_bytes=None,
+                   remedian_base=REMEDIAN_BASE, axis=2):
+    """Return 2D array projection of a stack without loading it all at once.
+
+    If the source is a :class:`numpy.ndarray`, typically a
+    :class:`numpy.memmap`, it is read in blocks along its first axis, or its
+    second axis when projecting the first, spanning the whole projected
+    axis. Each block is projected with :func:`project`, so the result is
+    identical to projecting the whole stack, including for the median.
+
+    If the source is an iterator of 2D z-slices, the slices are
+    accumulated one at a time, as in :func:`project_statistics`. The max,
+    min, mean, sum and argmax projections are exact (the mean and sum are
+    accumulated as float64) and the standard deviation agrees to within
+    rounding. The median cannot be computed exactly from a single pass over
+    the slices, so it is estimated using the remedian (Rousseeuw and
+    Bassett, 1990): slices are buffered in groups of ``remedian_base``, each
+    full group is replaced by its median and the final estimate is the
+    weighted median of what remains. The estimate is exact when there are
+    no more than ``remedian_base`` slices and memory use is bounded by
+    ``remedian_base`` planes per level, i.e.
+    ``remedian_base * ceil(log(n) / log(remedian_base))`` planes for ``n``
+    slices.
+
+    :param source: 3D numpy.array/numpy.memmap or iterator of 2D arrays
+    :param method: one of the :data:`METHODS`
+    :param block_bytes: approximate number of bytes of input to read per
+                        block; defaults to the size of one output plane
+    :param remedian_base: number of slices per remedian buffer
+    :param axis: axis of an array source to project; an iterator always
+                 yields slices along the projected axis
+    :returns: numpy.array with one dimension less than the stack
+    :raises: ValueError if the method is unknown or the source is empty
+    """
+    _check_method(method)
+    if isinstance(source, np.ndarray):
+        _check_stack(source, axis)
+        if block_bytes is None:
+            block_bytes = source.nbytes // max(1, source.shape[axis])
+        axis = axis % source.ndim
+        output_shape = source.shape[:axis] + source.shape[axis + 1:]
+        projection = np.empty(output_shape,
+                              dtype=output_dtype(method, source.dtype))
+        for block, target in _blocks(source, block_bytes, axis):
+            projection[target] = project(block, method, axis)
+        return projection
+    return _project_slices(iter(source), method, remedian_base)
+
+
+def project_statistics(source, statistics=STATISTICS, axis=2,
+                       block_bytes=STATISTICS_BLOCK_BYTES):
+    """Return several projections of a stack computed in a single pass.
+
+    An array source is read once, in blocks along its first axis (its
+    second when projecting the first). Each block is copied with the
+    projected axis first, so that every statistic is computed from
+    contiguous planes while the block is in cache, and the mean is shared
+    by the mean and the standard deviation. The results have the dtypes
+    given by :func:`output_dtype` and are identical to those of
+    :func:`project` for integer stacks; for floating point stacks the sums
+    are accumulated in a different order and agree to within rounding.
+
+    An iterator source yields slices along the projected axis, which are
+    accumulated one at a time; see :func:`stream_project`.
+
+    :param source: numpy.array/numpy.memmap or iterator of 2D arrays
+    :param statistics: names of the statistics, any of the
+                       :data:`STATISTICS`
+    :param axis: axis of an array source to project
+    :param block_bytes: approximate number of bytes of input per block
+    :returns: :class:`collections.OrderedDict` mapping the names of the
+              statistics to their projections, in the order requested
+    :raises: ValueError if a statistic is unknown or the source is empty
+    """
+    for statistic in statistics:
+        _check_method(statistic, STATISTICS)
+    if not isinstance(source, np.ndarray):
+        source = iter(source)
+        try:
+            first = np.asarray(next(source))
+        except StopIteration:
+            raise(ValueError("Cannot project an empty sequence of z-slices"))
+        return _accumulate_slices(first, source, statistics)
+
+    _check_stack(source, axis)
+    axis = axis % source.ndim
+    output_shape = source.shape[:axis] + source.shape[axis + 1:]
+    projections = OrderedDict(
+        (statistic, np.empty(output_shape,
+                             dtype=output_dtype(statistic, source.dtype)))
+        for statistic in statistics)
+    for block, target in _blocks(source, block_bytes, axis):
+        block = np.ascontiguousarray(np.moveaxis(block, axis, 0))
+        for statistic, projection in _reduce_planes(block,
+                                                    statistics).items():
+            projections[statistic][target] = projection
+    return projections
+
+
+def _reduce_planes(block, statistics):
+    """Return statistics of a block over its first axis."""
+    count = block.shape[0]
+    results = OrderedDict()
+    mean = None
+    if "mean" in statistics or "std" in statistics or "sum" in statistics:
+        total = np.sum(block, axis=0, dtype=np.float64)
+        mean = total / count
+    for statistic in statistics:
+        if statistic == "max":
+            results[statistic] = np.max(block, axis=0)
+        elif statistic == "min":
+            results[statistic] = np.min(block, axis=0)
+        elif statistic == "sum":
+            results[statistic] = total
+        elif statistic == "mean":
+            results[statistic] = mean
+        elif statistic == "std":
+            # As numpy.std: mean of the squared deviations, with ddof=0.
+            deviations = np.subtract(block, mean, dtype=np.float64)
+            np.multiply(deviations, deviations, out=deviations)
+            variance = np.sum(deviations, axis=0) / count
+            results[statistic] = np.sqrt(variance, out=variance)
+        elif statistic == "argmax":
+            results[statistic] = np.argmax(block, axis=0)
+    return results
+
+
+def _blocks(stack, block_bytes, axis):
+    """Yield blocks of an array along one axis and their output indices.
+
+    The pages of memory mapped stacks are released after each block.
+    """
+    block_axis = 1 if axis == 0 else 0
+    # Index of the blocked axis in the output.
+    output_axis = block_axis if block_axis < axis else block_axis - 1
+    length = stack.shape[block_axis]
+    row_bytes = max(1, stack.nbytes // max(1, length))
+    rows_per_block = max(1, block_bytes // row_bytes)
+    for start in range(0, length, rows_per_block):
+        stop = min(start + rows_per_block, length)
+        source = [slice(None)] * stack.ndim
+        source[block_axis] = slice(start, stop)
+        target = [slice(None)] * (stack.ndim - 1)
+        target[output_axis] = slice(start, stop)
+        yield np.array(stack[tuple(source)]), tuple(target)
+        _release_pages(stack)
+
+
+def _release_pages(array):
+    """Advise the kernel that mapped pages read so far are no longer needed.
+
+    This keeps the resident set size of a process reading a large
+    :class:`numpy.memmap` bounded. Private (copy-on-write) mappings are left
+    alone, because dropping their pages would discard modifications.
+    """
+    mapped = getattr(array, "_mmap", None)
+    if mapped is None or getattr(array, "mode", "c") == "c":
+        return
+    if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+        mapped.madvise(mmap.MADV_DONTNEED)
+
+
+def _project_slices(slices, method, remedian_base):
+    """Return projection of an iterator of 2D z-slices."""
+    try:
+        first = np.asarray(next(slices))
+    except StopIteration:
+        raise(ValueError("Cannot project an empty sequence of z-slices"))
+    dtype = first.dtype
+
+    if method == "median":
+        return _remedian(first, slices, remedian_base).astype(dtype,
+                                                              copy=False)
+    return _accumulate_slices(first, slices, [method])[method]
+
+
+def _accumulate_slices(first, slices, statistics):
+    """Return projections of an iterator of slices, accumulated in one pass.
+
+    The standard deviation uses Welford's update of the mean and the sum of
+    squared differences, which is numerically stable.
+    """
+    statistics = list(statistics)
+    need = set(statistics)
+    if "argmax" in need:
+        need.add("max")
+    if "std" in need or "mean" in need:
+        need.add("sum")
+
+    maximum = first.copy() if "max" in need else None
+    minimum = first.copy() if "min" in need else None
+    total = first.astype(np.float64) if "sum" in need else None
+    if "std" in need:
+        mean = first.astype(np.float64)
+        squares = np.zeros(first.shape, dtype=np.float64)
+        delta = np.empty(first.shape, dtype=np.float64)
+    if "argmax" in need:
+        argmax = np.zeros(first.shape, dtype=np.intp)
+        greater = np.empty(first.shape, dtype=bool)
+
+    count = 1
+    for z_slice in slices:
+        z_slice = np.asarray(z_slice)
+        if "argmax" in need:
+            np.greater(z_slice, maximum, out=greater)
+            argmax[greater] = count
+        if maximum is not None:
+            np.maximum(maximum, z_slice, out=maximum)
+        if minimum is not None:
+            np.minimum(minimum, z_slice, out=minimum)
+        if total is not None:
+            total += z_slice
+        count += 1
+        if "std" in need:
+            np.subtract(z_slice, mean, out=delta)
+            mean += delta / count
+            # delta * (value - updated mean)
+            squares += delta * (z_slice - mean)
+
+    dtype = first.dtype
+    results = OrderedDict()
+    for statistic in statistics:
+        if statistic == "max":
+            results[statistic] = maximum
+        elif statistic == "min":
+            results[statistic] = minimum
+        elif statistic == "sum":
+            results[statistic] = total.astype(output_dtype("sum", dtype),
+                                              copy=False)
+        elif statistic == "mean":
+            results[statistic] = (total / count).astype(dtype, copy=False)
+        elif statistic == "std":
+            results[statistic] = np.sqrt(squares / count).astype(
+                output_dtype("std", dtype), copy=False)
+        elif statistic == "argmax":
+            results[statistic] = argmax
+    return results
+
+
+def _remedian(first, slices, base):
+    """Return remedian estimate of the per-pixel median of the z-slices."""
+    levels = [[first.copy()]]
+    for z_slice in slices:
+        levels[0].append(np.array(z_slice))
+        level = 0
+        while len(levels[level]) == base:
+            median = rank.median(np.stack(levels[level]))
+            levels[level] = []
+            if level + 1 == len(levels):
+                levels.append([])
+            levels[level + 1].append(median)
+            level += 1
+
+    if len(levels) == 1:
+        return rank.median(np.stack(levels[0]))
+
+    planes = []
+    weights = []
+    for level, buffered in enumerate(levels):
+        planes.extend(buffered)
+        weights.extend([base ** level] * len(buffered))
+    return _weighted_median(np.stack(planes, axis=-1), np.array(weights))
+
+
+def _weighted_median(stack, weights):
+    """Return the per-pixel weighted median of the last dimension."""
+    order = np.argsort(stack, axis=-1)
+    sorted_stack = np.take_along_axis(stack, order, axis=-1)
+    cumulative = np.cumsum(weights[order], axis=-1)
+    half = cumulative[..., -1:] / 2.0
+    index = np.argmax(cumulative >= half, axis=-1)[..., np.newaxis]
+    return np.take_along_axis(sorted_stack, index, axis=-1)[..., 0]
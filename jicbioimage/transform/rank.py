@@ -0,0 +1,155 @@
+"""Module containing the rank projection engine.
+
+The functions in this module compute order statistics, i.e. medians and
+percentiles, along one axis of an array, for example a block of a z-stack.
+They are used by the median and percentile projections in
+:mod:`jicbioimage.transform.projection`.
+
+The results are identical to those of :func:`numpy.median` and
+:func:`numpy.percentile` (with the default linear interpolation), including
+the mean of the two middle values for an even number of values and NaN
+results for pixels with NaN values.
+
+For uint8 and uint16 stacks the order statistics are selected by counting:
+the value of rank ``k`` at a pixel is the largest value ``v`` such that at
+most ``k`` of its values are less than ``v``, which is found one bit at a
+time from the most significant bit, with one vectorized comparison and count
+over all the planes per bit. This takes 8 or 16 passes over a copy of the
+array with the axis first and no sorting. Other dtypes use
+:func:`numpy.partition` along the axis.
+"""
+
+import numpy as np
+
+#: Dtypes whose order statistics are selected by counting.
+COUNTING_DTYPES = (np.dtype(np.uint8), np.dtype(np.uint16))
+
+
+def select(stack, ranks, axis=0):
+    """Return order statistics along one axis of an array.
+
+    :param stack: numpy.array
+    :param ranks: increasing sequence of zero based ranks
+    :param axis: axis along which to select
+    :returns: list of numpy.array, one per rank, with the dtype of the
+              stack
+    """
+    if stack.dtype in COUNTING_DTYPES:
+        planes = np.ascontiguousarray(np.moveaxis(stack, axis, 0))
+        return _select_counting(planes, ranks)
+    partitioned = np.partition(stack, list(ranks), axis=axis)
+    return [np.take(partitioned, rank, axis=axis) for rank in ranks]
+
+
+def _select_counting(planes, ranks):
+    """Return order statistics of unsigned integers, selected by counting."""
+    below = np.empty(planes.shape, dtype=bool)
+    # The smallest dtype that can hold the counts is the fastest to sum.
+    count_dtype = np.intp
+    for dtype in (np.uint16, np.uint8):
+        if planes.shape[0] <= np.iinfo(dtype).max:
+            count_dtype = dtype
+    values = []
+    for rank in ranks:
+        if values and rank == previous + 1:
+            values.append(_next_value(planes, values[-1], rank, below,
+                                      count_dtype))
+        else:
+            values.append(_select_rank(planes, rank, below, count_dtype))
+        previous = rank
+    return values
+
+
+def _select_rank(planes, rank, below, count_dtype):
+    """Return the values of one rank, found one bit at a time."""
+    value = np.zeros(planes.shape[1:], dtype=planes.dtype)
+    for bit in reversed(range(8 * planes.dtype.itemsize)):
+        candidate = value | planes.dtype.type(1 << bit)
+        np.less(planes, candidate, out=below)
+        counts = below.view(np.uint8).sum(axis=0, dtype=count_dtype)
+        value = np.where(counts <= rank, candidate, value)
+    return value
+
+
+def _next_value(planes, value, rank, below, count_dtype):
+    """Return the values of a rank given the values of the rank below."""
+    np.less_equal(planes, value, out=below)
+    repeated = below.view(np.uint8).sum(axis=0, dtype=count_dtype) > rank
+    # Set the values not above the lower rank to the largest value, with a
+    # bitwise or rather than numpy.where, which is much slower.
+    largest = planes.dtype.type(np.iinfo(planes.dtype).max)
+    greater = below.view(np.uint8).astype(planes.dtype) * largest
+    greater |= planes
+    return np.where(repeated, value, greater.min(axis=0))
+
+
+def median(stack, axis=0):
+    """Return median along one axis of an array.
+
+    Same as ``numpy.median(stack, axis=axis)``.
+
+    :param stack: numpy.array
+    :param axis: axis along which to compute the median
+    :returns: numpy.array with the dtype of :func:`numpy.median`
+    """
+    count = stack.shape[axis]
+    middle = count // 2
+    if count % 2 == 1:
+        ranks = [middle]
+    else:
+        ranks = [middle - 1, middle]
+    # The mean of the middle values, computed as by numpy.median.
+    result = np.mean(np.stack(select(stack, ranks, axis)), axis=0)
+    return _propagate_nan(stack, result, axis)
+
+
+def percentile(stack, q, axis=0):
+    """Return percentile along one axis of an array.
+
+    Same as ``numpy.percentile(stack, q, axis=axis)``, i.e. the linear
+    interpolation between the two nearest ranks.
+
+    :param stack: numpy.array
+    :param q: percentile, between 0 and 100
+    :param axis: axis along which to compute the percentile
+    :returns: numpy.array with the dtype of :func:`numpy.percentile`
+    :raises: ValueError if q is out of range
+    """
+    if not 0 <= q <= 100:
+        msg = "Percentile must be between 0 and 100, got {}"
+        raise(ValueError(msg.format(q)))
+    count = stack.shape[axis]
+    virtual_index = (count - 1) * np.true_divide(q, 100)
+    if virtual_index >= count - 1:
+        # numpy.percentile interpolates from index -1 in this case.
+        previous_rank = next_rank = count - 1
+        gamma = virtual_index + 1
+    else:
+        previous_rank = int(np.floor(virtual_index))
+        next_rank = previous_rank + 1
+        gamma = virtual_index - previous_rank
+    if previous_rank == next_rank:
+        previous = following = select(stack, [previous_rank], axis)[0]
+    else:
+        previous, following = select(stack, [previous_rank, next_rank],
+                                     axis)
+    # An array rather than a scalar, so that the result is float64 for all
+    # dtypes, as with numpy.percentile.
+    gamma = np.full((1,) * previous.ndim, gamma, dtype=np.float64)
+    result = _lerp(previous, following, gamma)
+    return _propagate_nan(stack, result, axis)
+
+
+def _lerp(a, b, t):
+    """Return linear interpolation between a and b, as numpy.percentile."""
+    difference = np.subtract(b, a)
+    result = np.asanyarray(np.add(a, difference * t))
+    np.subtract(b, difference * (1 - t), out=result, where=t >= 0.5)
+    return result
+
+
+def _propagate_nan(stack, result, axis):
+    """Set result to NaN where the stack has a NaN, as numpy does."""
+    if stack.dtype.kind in "fc":
+        result[np.isnan(stack).any(axis=axis)] = np.nan
+    return result
@@ -0,0 +1,558 @@
+"""Module containing histogram based thresholding.
+
+For 8 and 16 bit integer images the intensity histogram is computed with
+:func:`numpy.bincount`. The Otsu threshold value can be obtained with
+:func:`otsu_value` without building a boolean mask.
+
+Within a :func:`caching` context the histograms are cached per image, so
+that repeated thresholding of the same image, for example with different
+multipliers, only computes the histogram once:
+
+>>> with caching():  # doctest: +SKIP
+...     masks = [threshold_otsu(image, multiplier=m) for m in multipliers]
+
+The cache is keyed on the identity of the image object and holds a weak
+reference to it, so entries disappear when the image is garbage collected.
+Modifying an image in place within the context does not invalidate its
+entry; call :func:`invalidate` or :func:`clear_cache` after doing so. The
+cache is cleared when the outermost context exits, and outside of it
+histograms are always computed from the current pixels.
+
+The planes of a stack, e.g. the z-slices of a z-stack or the images of a
+batch, can be thresholded with :func:`otsu_values`, which computes the
+histograms of a group of planes, integer or float, with one
+:func:`numpy.bincount` and the thresholds of the group at once, instead of
+one call per plane. The bins of integer planes only span the values of the
+group, which bounds the memory of 16 bit stacks. Multi-level Otsu thresholds,
+which split the intensities into more than two classes, are computed by
+:func:`multiotsu_value` and :func:`multiotsu_values` from the same
+histograms.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+#: Maximum number of histograms kept in the cache.
+CACHE_SIZE = 16
+
+#: Number of pixels passed to :func:`numpy.bincount` at a time, bounding the
+#: size of the temporary integer array it creates.
+CHUNK_SIZE = 1 << 18
+
+#: Number of histogram bins whose Otsu thresholds are computed at a time by
+#: :func:`otsu_values`, small enough for the float arrays to stay in cache.
+BINS_PER_GROUP = 1 << 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_caching = 0
+
+
+@contextmanager
+def caching():
+    """Context manager caching the histograms of images within it.
+
+    Contexts can be nested, and entered by several threads; the cache is
+    cleared when the last one exits. Images must not be modified in place
+    within the context unless :func:`invalidate` is called for them.
+    """
+    global _caching
+    with _cache_lock:
+        _caching += 1
+    try:
+        yield
+    finally:
+        with _cache_lock:
+            _caching -= 1
+            if _caching == 0:
+                _cache.clear()
+
+
+def clear_cache():
+    """Remove all cached histograms."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def invalidate(image):
+    """Remove the cached histogram of an image, if any.
+
+    :param image: numpy array
+    """
+    with _cache_lock:
+        entry = _cache.get(id(image))
+        if entry is not None and entry[0]() is image:
+            del _cache[id(image)]
+
+
+def has_integer_histogram(image):
+    """Return True if the histogram of the image is computed natively.
+
+    :param image: numpy array
+    :returns: bool
+    """
+    return image.dtype.kind in "ui" and image.dtype.itemsize <= 2
+
+
+def histogram(image):
+    """Return the intensity histogram of an 8 or 16 bit integer image.
+
+    Bins correspond to the integers from the minimum to the maximum value in
+    the image, as in :func:`skimage.exposure.histogram`. Results are cached
+    per image object within a :func:`caching` context.
+
+    :param image: 8 or 16 bit integer numpy array
+    :returns: tuple of counts and bin centers
+    :raises: TypeError if the image is not an 8 or 16 bit integer array
+    """
+    if not has_integer_histogram(image):
+        msg = "Invalid dtype {}. Allowed dtype(s): 8 and 16 bit integers"
+        raise(TypeError(msg.format(image.dtype)))
+
+    if not _caching:
+        return _bincount_histogram(image)
+
+    key = id(image)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0]() is image:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    result = _bincount_histogram(image)
+
+    def forget(ref, key=key):
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is not None and entry[0] is ref:
+                del _cache[key]
+
+    with _cache_lock:
+        if not _caching:
+            # The last context exited while the histogram was computed.
+            return result
+        _cache[key] = (weakref.ref(image, forget), result)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _bincount_histogram(image):
+    """Return counts and bin centers, computed in chunks of pixels."""
+    offset = int(np.iinfo(image.dtype).min)
+    nbins = int(np.iinfo(image.dtype).max) - offset + 1
+    counts = np.zeros(nbins, dtype=np.int64)
+    flat = image.reshape(-1)
+    for start in range(0, flat.size, CHUNK_SIZE):
+        chunk = flat[start:start + CHUNK_SIZE]
+        if offset != 0:
+            chunk = chunk.astype(np.int32) - offset
+        counts += np.bincount(chunk, minlength=nbins)
+    nonzero = np.flatnonzero(counts)
+    start, stop = nonzero[0], nonzero[-1] + 1
+    bin_centers = np.arange(start + offset, stop + offset)
+    return counts[start:stop], bin_centers
+
+
+def otsu_from_histogram(counts, bin_centers):
+    """Return Otsu threshold value of a histogram.
+
+    Uses the same arithmetic as :func:`skimage.filters.threshold_otsu`, so
+    that the two give identical thresholds.
+
+    :param counts: number of pixels per bin
+    :param bin_centers: value of each bin
+    :returns: threshold value
+    """
+    if len(counts) == 1:
+        return bin_centers[0]
+    counts = counts.astype(np.float32)
+    weight1 = np.cumsum(counts)
+    weight2 = np.cumsum(counts[::-1])[::-1]
+    mean1 = np.cumsum(counts * bin_centers) / weight1
+    mean2 = (np.cumsum((counts * bin_centers)[::-1]) / weight2[::-1])[::-1]
+    variance12 = weight1[:-1] * weight2[1:] * (mean1[:-1] - mean2[1:]) ** 2
+    return bin_centers[np.argmax(variance12)]
+
+
+def otsu_value(image):
+    """Return Otsu threshold value of an image.
+
+    Integer images of 8 and 16 bits use the cached histogram; other
+    images are passed on to :func:`skimage.filters.threshold_otsu`.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :returns: threshold value
+    """
+    if has_integer_histogram(image):
+        return otsu_from_histogram(*histogram(image))
+    # Imported here, as it is slow to import and not needed for integers.
+    import skimage.filters
+    return skimage.filters.threshold_otsu(image)
+
+
+def greater(image, value, out=None):
+    """Return boolean array of pixels greater than the value.
+
+    For integer images the value is rounded down to an integer of the
+    image dtype, which gives the same result without comparing every pixel
+    as a float.
+
+    :param image: numpy array
+    :param value: scalar
+    :param out: optional boolean array to write the result to
+    :returns: boolean numpy array
+    """
+    if image.dtype.kind in "ui" and np.isfinite(value):
+        info = np.iinfo(image.dtype)
+        value = np.floor(value)
+        if value < info.min:
+            return _fill(image, True, out)
+        if value >= info.max:
+            return _fill(image, False, out)
+        value = image.dtype.type(value)
+    return np.greater(image, value, out=out)
+
+
+def _fill(image, value, out):
+    """Return boolean array of the shape of the image filled with value."""
+    if out is None:
+        out = np.empty(image.shape, dtype=bool)
+    out[...] = value
+    return out
+
+
+def _nan_argmax(values):
+    """Return index of the first maximum of each row, ignoring NaN."""
+    values[np.isnan(values)] = -np.inf
+    return np.argmax(values, axis=-1)
+
+
+def otsu_from_histograms(counts, bin_centers):
+    """Return Otsu threshold values of several histograms at once.
+
+    Each row gives the same threshold as :func:`otsu_from_histogram`
+    applied to the row with its empty leading and trailing bins removed.
+
+    :param counts: 2D array with the number of pixels per bin of each
+                   histogram
+    :param bin_centers: value of each bin, common to all the histograms
+                        or one row per histogram
+    :returns: 1D numpy.array with one threshold per histogram
+    """
+    bin_centers = np.broadcast_to(bin_centers, counts.shape)
+    if counts.shape[1] == 1:
+        # Histograms with a single bin, e.g. of constant integer planes.
+        return bin_centers[:, 0].copy()
+    counts = counts.astype(np.float32)
+    weight1 = np.cumsum(counts, axis=1)
+    weight2 = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+    products = counts * bin_centers
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean1 = np.cumsum(products, axis=1) / weight1
+        mean2 = (np.cumsum(products[:, ::-1], axis=1) /
+                 weight2[:, ::-1])[:, ::-1]
+        variance12 = (weight1[:, :-1] * weight2[:, 1:] *
+                      (mean1[:, :-1] - mean2[:, 1:]) ** 2)
+    rows = np.arange(len(counts))
+    values = bin_centers[rows, _nan_argmax(variance12)]
+    # Histograms with a single value, whose variances are all NaN.
+    single = np.count_nonzero(counts, axis=1) == 1
+    if np.any(single):
+        first = np.argmax(counts[single] > 0, axis=1)
+        values[single] = bin_centers[rows[single], first]
+    return values
+
+
+def _planes(stack, axis):
+    """Return stack with the planes along the first axis."""
+    if stack.ndim < 3:
+        msg = "Expected a stack of 2D planes, got {} dimensions"
+        raise(ValueError(msg.format(stack.ndim)))
+    return np.moveaxis(np.asarray(stack), axis, 0)
+
+
+def _integer_histograms(planes, offset, nbins):
+    """Return histograms of integer planes, one row of pixels per plane.
+
+    The bins are the integers from offset, computed with one
+    :func:`numpy.bincount` per group of planes.
+    """
+    plane_size = planes.shape[1]
+    counts = np.empty((len(planes), nbins), dtype=np.int64)
+    # Bound both the integer keys and the counts created by each bincount.
+    group = max(1, CHUNK_SIZE // max(1, plane_size, nbins))
+    for start in range(0, len(planes), group):
+        chunk = planes[start:start + group]
+        keys = chunk.astype(np.intp)
+        keys += (np.arange(len(chunk)) * nbins - offset)[:, np.newaxis]
+        counts[start:start + len(chunk)] = np.bincount(
+            keys.reshape(-1), minlength=len(chunk) * nbins).reshape(
+                len(chunk), nbins)
+    return counts, np.arange(offset, offset + nbins)
+
+
+def _float_histograms(planes, nbins=256):
+    """Return histograms of planes, one row of pixels per plane.
+
+    Each row has the bins of :func:`numpy.histogram` over the range of the
+    plane, as :func:`skimage.exposure.histogram`, with the same rounding:
+    the bin index of each pixel is computed in the dtype of the planes and
+    corrected against the bin edges. All the planes are binned at once.
+    Half precision planes are binned in single precision, in which the bin
+    indices cannot overflow.
+    """
+    dtype = np.float64
+    if planes.dtype.kind == "f":
+        dtype = np.result_type(planes.dtype, np.float32)
+    planes = planes.astype(dtype, copy=False)
+    low = planes.min(axis=1)
+    high = planes.max(axis=1)
+    if not (np.all(np.isfinite(low)) and np.all(np.isfinite(high))):
+        raise(ValueError("Cannot compute histograms of non-finite values"))
+    # The range of a constant plane is widened by a half on either side.
+    constant = low == high
+    first = low.astype(np.float64) - 0.5 * constant
+    last = high.astype(np.float64) + 0.5 * constant
+    edges = np.linspace(first, last, nbins + 1, axis=1).astype(dtype)
+    width = np.where(constant, 1.0, (high - low).astype(np.float64))
+    norm = (nbins / width).astype(dtype)
+
+    indices = ((planes - first.astype(dtype)[:, np.newaxis]) *
+               norm[:, np.newaxis]).astype(np.intp)
+    indices[indices == nbins] -= 1
+    indices -= planes < np.take_along_axis(edges, indices, axis=1)
+    indices += ((planes >= np.take_along_axis(edges, indices + 1, axis=1)) &
+                (indices != nbins - 1))
+    indices += (np.arange(len(planes)) * nbins)[:, np.newaxis]
+    counts = np.bincount(indices.reshape(-1),
+                         minlength=len(planes) * nbins).reshape(-1, nbins)
+    return counts, (edges[:, :-1] + edges[:, 1:]) / 2.
+
+
+def _histogram_groups(stack, axis):
+    """Yield groups of planes as rows of pixels, with their histograms.
+
+    Groups are small enough for their pixels to fit in :data:`CHUNK_SIZE`
+    and their bins in :data:`BINS_PER_GROUP`, where possible. The bins of
+    the integer planes of a group only span the values of the group.
+    """
+    planes = _planes(stack, axis)
+    planes = planes.reshape(len(planes), -1)
+    integer = planes.dtype.kind in "ui"
+    nbins = 256
+    if integer and planes.size:
+        nbins = int(planes.max()) - int(planes.min()) + 1
+    group = max(1, min(CHUNK_SIZE // max(1, planes.shape[1]),
+                       BINS_PER_GROUP // nbins))
+    for start in range(0, len(planes), group):
+        chunk = planes[start:start + group]
+        if integer:
+            offset = int(chunk.min())
+            counts, bin_centers = _integer_histograms(
+                chunk, offset, int(chunk.max()) - offset + 1)
+        else:
+            counts, bin_centers = _float_histograms(chunk)
+        yield chunk, counts, bin_centers
+
+
+def plane_histograms(stack, axis=0):
+    """Return intensity histograms of the planes of a stack.
+
+    For integer stacks the bins correspond to the integers from the minimum
+    to the maximum value in the stack, common to all the planes, and the
+    histograms are computed with one :func:`numpy.bincount` per group of
+    planes. Other stacks have the 256 bins of
+    :func:`skimage.exposure.histogram` over the range of each plane, as
+    used by :func:`skimage.filters.threshold_otsu`, computed for all the
+    planes at once.
+
+    The counts of an integer stack have one column per value in its range,
+    e.g. 512 kB per plane for the full range of 16 bits;
+    :func:`otsu_values` and :func:`multiotsu_values` only hold the
+    histograms of one group of planes at a time.
+
+    :param stack: numpy array of planes
+    :param axis: axis indexing the planes
+    :returns: tuple of counts, with one row per plane, and bin centers,
+              1D or with one row per plane
+    :raises: ValueError if the stack has fewer than three dimensions
+    """
+    planes = _planes(stack, axis)
+    planes = planes.reshape(len(planes), -1)
+    if planes.dtype.kind not in "ui":
+        groups = list(_histogram_groups(stack, axis))
+        return (np.concatenate([counts for _, counts, _ in groups]),
+                np.concatenate([centers for _, _, centers in groups]))
+    offset = int(planes.min())
+    return _integer_histograms(planes, offset,
+                               int(planes.max()) - offset + 1)
+
+
+def otsu_values(stack, axis=0):
+    """Return Otsu threshold value of each plane of a stack.
+
+    Same as :func:`otsu_value` applied to each plane, but computed from
+    the histograms of groups of planes, see :func:`plane_histograms`.
+
+    :param stack: numpy array of planes
+    :param axis: axis indexing the planes
+    :returns: 1D numpy.array with one threshold per plane
+    :raises: ValueError if the stack has fewer than three dimensions
+    """
+    values = []
+    for planes, counts, bin_centers in _histogram_groups(stack, axis):
+        group_values = otsu_from_histograms(counts, bin_centers)
+        if bin_centers.ndim == 2:
+            # As skimage, the threshold of a constant plane is its value
+            # rather than the center of its bin.
+            low = planes.min(axis=1)
+            constant = low == planes.max(axis=1)
+            group_values[constant] = low[constant]
+        values.append(group_values)
+    return np.concatenate(values)
+
+
+def multiotsu_from_histograms(counts, bin_centers, classes=3):
+    """Return multi-level Otsu threshold values of several histograms.
+
+    The thresholds split the bins of each histogram into the given number
+    of classes such that the variance between the classes is largest, as
+    :func:`skimage.filters.threshold_multiotsu`. The best split is found by
+    dynamic programming over the cumulative counts, in
+    ``O(classes * bins**2)`` operations per histogram, vectorized over the
+    histograms. The variances are computed in float64, so where two splits
+    differ by less than the float32 rounding of scikit-image the one chosen
+    may be the other.
+
+    :param counts: 2D array with the number of pixels per bin of each
+                   histogram
+    :param bin_centers: value of each bin, common to all the histograms
+                        or one row per histogram
+    :param classes: number of classes, at least 2
+    :returns: 2D numpy.array with ``classes - 1`` increasing thresholds per
+              histogram
+    :raises: ValueError if there are fewer than two classes or a histogram
+             has fewer distinct values than classes
+    """
+    if classes < 2:
+        msg = "Expected at least 2 classes, got {}"
+        raise(ValueError(msg.format(classes)))
+    nvalues = np.count_nonzero(counts, axis=1)
+    if np.any(nvalues < classes):
+        msg = "Cannot split {} distinct values into {} classes"
+        raise(ValueError(msg.format(nvalues.min(), classes)))
+    bin_centers = np.broadcast_to(bin_centers, counts.shape)
+    nhist, nbins = counts.shape
+    weights = np.zeros((nhist, nbins + 1))
+    np.cumsum(counts, axis=1, out=weights[:, 1:])
+    # Bin indices rather than values, which only shifts the variance.
+    moments = np.zeros((nhist, nbins + 1))
+    np.cumsum(counts * np.arange(nbins), axis=1, out=moments[:, 1:])
+
+    # best[:, t]: largest sum of the weighted squared means of the classes
+    # so far, split among the bins before t. The weight of an empty class
+    # is set to one, as its moment, and so its contribution, is zero.
+    best = np.square(moments) / np.maximum(weights, 1)
+    choices = []
+    # Stops are processed in blocks, bounding the candidate arrays.
+    elements = max(nbins + 1, 4 * BINS_PER_GROUP // nhist)
+    for level in range(1, classes):
+        first = level + 1 if level < classes - 1 else nbins
+        new_best = np.full((nhist, nbins + 1), -np.inf)
+        choice = np.zeros((nhist, nbins + 1), dtype=np.intp)
+        block = max(1, elements // (nbins + 1 - level))
+        for start in range(first, nbins + 1, block):
+            stop = min(start + block, nbins + 1)
+            # candidates[:, i, j]: the last class from bin level + j to
+            # bin start + i - 1.
+            weight = weights[:, start:stop, np.newaxis] - \
+                weights[:, np.newaxis, level:stop - 1]
+            candidates = moments[:, start:stop, np.newaxis] - \
+                moments[:, np.newaxis, level:stop - 1]
+            np.maximum(weight, 1, out=weight)
+            candidates *= candidates
+            candidates /= weight
+            candidates += best[:, np.newaxis, level:stop - 1]
+            if stop - start > 1:
+                candidates[:, np.arange(stop - 1 - level) >= np.arange(
+                    start - level, stop - level)[:, np.newaxis]] = -np.inf
+            index = np.argmax(candidates, axis=2)
+            new_best[:, start:stop] = np.take_along_axis(
+                candidates, index[:, :, np.newaxis], axis=2)[:, :, 0]
+            choice[:, start:stop] = index + level
+        best = new_best
+        choices.append(choice)
+
+    rows = np.arange(nhist)
+    stops = np.full(nhist, nbins)
+    indices = []
+    for choice in reversed(choices):
+        stops = choice[rows, stops]
+        indices.append(stops - 1)
+    indices = np.array(indices[::-1]).T
+    return bin_centers[rows[:, np.newaxis], indices]
+
+
+def multiotsu_value(image, classes=3):
+    """Return multi-level Otsu threshold values of an image.
+
+    Integer images of 8 and 16 bits use the histogram of :func:`histogram`,
+    cached within a :func:`caching` context, other images the 256 bins of
+    :func:`skimage.exposure.histogram`.
+
+    :param image: numpy array or :class:`jicbioimage.core.image.Image`
+    :param classes: number of classes, at least 2
+    :returns: 1D numpy.array with ``classes - 1`` increasing thresholds
+    :raises: ValueError if there are fewer than two classes or the image
+             has fewer distinct values than classes
+    """
+    if has_integer_histogram(image):
+        counts, bin_centers = histogram(image)
+    else:
+        import skimage.exposure
+        counts, bin_centers = skimage.exposure.histogram(image, 256)
+    return multiotsu_from_histograms(counts[np.newaxis], bin_centers,
+                                     classes)[0]
+
+
+def multiotsu_values(stack, classes=3, axis=0):
+    """Return multi-level Otsu threshold values of each plane of a stack.
+
+    :param stack: numpy array of planes
+    :param classes: number of classes, at least 2
+    :param axis: axis indexing the planes
+    :returns: 2D numpy.array with ``classes - 1`` thresholds per plane
+    :raises: ValueError if there are fewer than two classes, the stack has
+             fewer than three dimensions or a plane has fewer distinct values
+             than classes
+    """
+    return np.concatenate([
+        multiotsu_from_histograms(counts, bin_centers, classes)
+        for _, counts, bin_centers in _histogram_groups(stack, axis)])
+
+
+def classify(image, values, out=None):
+    """Return class of each pixel given increasing threshold values.
+
+    The class of a pixel is the number of values it is greater than, so
+    that with a single value the classes are those of :func:`greater`.
+
+    :param image: numpy array
+    :param values: increasing threshold values, scalars or arrays that
+                   broadcast against the image, e.g. one value per plane
+    :param out: optional uint8 array to write the result to
+    :returns: uint8 numpy array
+    """
+    if out is None:
+        out = np.zeros(image.shape, dtype=np.uint8)
+    else:
+        out[...] = 0
+    mask = np.empty(image.shape, dtype=bool)
+    for value in values:
+        out += np.greater(image, value, out=mask)
+    return out
@@ -0,0 +1,138 @@
+"""Module for tiled execution of neighbourhood filters.
+
+Neighbourhood filters such as Gaussian smoothing, Sobel edge detection and
+binary morphology only need the pixels within a fixed distance, the halo,
+of each output pixel. :func:`apply_tiled` splits an image into tiles, pads
+each tile with a halo taken from the neighbouring pixels, runs the filter on
+the tiles in a pool of threads and stitches the central parts of the tiles
+back together. Because every output pixel sees exactly the same
+neighbourhood as when filtering the whole image, the result is identical to
+the untiled result.
+
+The size of the tiles is chosen so that the working memory of all the tiles
+being processed at the same time stays within a memory budget. The budget
+does not include the input and output arrays themselves.
+"""
+
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+#: Approximate working memory per pixel, in bytes, of the filters in
+#: :mod:`jicbioimage.transform`; used to derive tile sizes from a budget.
+BYTES_PER_PIXEL = {
+    "smooth_gaussian": 32,
+    "find_edges_sobel": 48,
+    "binary_morphology": 4,
+    "local_threshold": 40,
+}
+
+
+def gaussian_halo(sigma, truncate=4.0):
+    """Return halo width needed by :func:`scipy.ndimage.gaussian_filter`.
+
+    :param sigma: standard deviation, scalar or one per axis
+    :param truncate: number of standard deviations the kernel extends to
+    :returns: halo width in pixels
+    """
+    sigmas = np.atleast_1d(sigma)
+    return max(int(truncate * float(s) + 0.5) for s in sigmas)
+
+
+def selem_halo(selem):
+    """Return halo width needed by binary morphology with a footprint.
+
+    :param selem: footprint expressed as 1's and 0's, None for a cross
+    :returns: halo width in pixels
+    """
+    if selem is None:
+        return 1
+    return max(size // 2 for size in np.asarray(selem).shape)
+
+
+def tile_shape_for_budget(image_shape, halo, bytes_per_pixel, memory_budget,
+                          workers):
+    """Return shape of the tiles, excluding the halo, for a memory budget.
+
+    The first two axes are tiled; any further axes are kept whole.
+
+    :param image_shape: shape of the image
+    :param halo: halo width in pixels
+    :param bytes_per_pixel: working memory per pixel of the filter
+    :param memory_budget: working memory budget in bytes for all workers
+    :param workers: number of tiles processed at the same time
+    :returns: tuple with the number of rows and columns per tile
+    :raises: ValueError if the budget cannot fit a tile of at least one
+             pixel plus its halo
+    """
+    trailing = int(np.prod(image_shape[2:], dtype=np.int64))
+    pixels = memory_budget // (workers * bytes_per_pixel * trailing)
+    side = int(math.sqrt(pixels)) - 2 * halo
+    if side < 1:
+        msg = "Memory budget of {} bytes too small for a halo of {} pixels"
+        raise(ValueError(msg.format(memory_budget, halo)))
+    return tuple(min(side, n) for n in image_shape[:2])
+
+
+def apply_tiled(func, image, halo, output_dtype, tile_shape=None,
+                memory_budget=None, bytes_per_pixel=8, workers=None,
+                out=None, extra=None):
+    """Return result of applying a neighbourhood filter tile by tile.
+
+    :param func: function taking an array (and the tiles of the extra
+                 arrays) and returning an array of the same shape
+    :param image: input array
+    :param halo: halo width in pixels
+    :param output_dtype: dtype of the output array
+    :param tile_shape: number of rows and columns per tile, excluding the
+                       halo; derived from memory_budget if not given
+    :param memory_budget: working memory budget in bytes
+    :param bytes_per_pixel: working memory per pixel of func
+    :param workers: number of threads, defaults to the number of CPUs
+    :param out: optional array to write the result to
+    :param extra: optional list of arrays with the same shape as the
+                  image, e.g. a mask, that are tiled alongside it
+    :returns: numpy.array
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if tile_shape is None:
+        if memory_budget is None:
+            tile_shape = image.shape[:2]
+        else:
+            tile_shape = tile_shape_for_budget(image.shape, halo,
+                                               bytes_per_pixel,
+                                               memory_budget, workers)
+    if out is None:
+        out = np.empty(image.shape, dtype=output_dtype)
+    extra = [] if extra is None else extra
+
+    def process(inner):
+        outer = tuple(slice(max(0, s.start - halo), min(n, s.stop + halo))
+                      for s, n in zip(inner, image.shape))
+        crop = tuple(slice(i.start - o.start, i.stop - o.start)
+                     for i, o in zip(inner, outer))
+        tiles = [array[outer] for array in [image] + list(extra)]
+        out[inner] = func(*tiles)[crop]
+
+    tiles = list(_inner_tiles(image.shape[:2], tile_shape))
+    if len(tiles) == 1 or workers == 1:
+        for inner in tiles:
+            process(inner)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Consume the iterator to propagate exceptions.
+            list(pool.map(process, tiles))
+    return out
+
+
+def _inner_tiles(shape, tile_shape):
+    """Yield slices of the tiles, without halo, covering the first axes."""
+    rows, cols = shape
+    tile_rows, tile_cols = tile_shape
+    for row in range(0, rows, tile_rows):
+        for col in range(0, cols, tile_cols):
+            yield (slice(row, min(row + tile_rows, rows)),
+                   slice(col, min(col + tile_cols, cols)))
@@ -0,0 +1,139 @@
+"""Module containing helpers for 3D volumes with anisotropic voxels.
+
+Confocal z-stacks usually have voxels that are larger along z than along x
+and y. The neighbourhood transformations of :mod:`jicbioimage.transform`
+can process such volumes in one of two ways:
+
+- true 3D, the default, in which the neighbourhood of a voxel extends
+  along all three axes; per-axis parameters, e.g. one Gaussian sigma per
+  axis, or a voxel ``spacing`` from which they are derived, account for
+  the anisotropy
+- slice-parallel 2D, selected by passing a ``slice_axis``, in which each 2D
+  slice along that axis is processed independently, in a pool of threads,
+  and written into a preallocated output; the result is the same as
+  looping over the slices in Python
+
+Slices along other than the first axis are copied before processing, so
+that the filters run along contiguous memory. Only one slice per thread is
+held in memory besides the input and the output.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def per_axis(value, ndim, name="value"):
+    """Return one float per axis.
+
+    :param value: scalar or sequence with one value per axis
+    :param ndim: number of axes
+    :param name: name of the value, used in the error message
+    :returns: 1D float64 numpy.array of length ndim
+    :raises: ValueError if a sequence has the wrong length
+    """
+    values = np.atleast_1d(np.asarray(value, dtype=np.float64))
+    if values.size == 1:
+        values = np.repeat(values, ndim)
+    if values.size != ndim:
+        msg = "Expected 1 or {} {} values, got {}"
+        raise(ValueError(msg.format(ndim, name, values.size)))
+    return values
+
+
+def voxel_spacing(spacing, ndim):
+    """Return voxel size along each axis, one if spacing is None.
+
+    :param spacing: voxel size, scalar or one per axis, or None
+    :param ndim: number of axes
+    :returns: 1D float64 numpy.array of length ndim
+    :raises: ValueError if the spacing has the wrong length or is not
+             positive
+    """
+    if spacing is None:
+        return np.ones(ndim)
+    spacing = per_axis(spacing, ndim, "spacing")
+    if np.any(spacing <= 0):
+        msg = "Voxel spacing must be positive, got {}"
+        raise(ValueError(msg.format(tuple(spacing))))
+    return spacing
+
+
+def pixel_sigma(sigma, spacing, ndim):
+    """Return Gaussian sigma in pixels along each axis.
+
+    :param sigma: standard deviation, scalar or one per axis, in pixels, or
+                  in the units of the spacing if it is given
+    :param spacing: voxel size along each axis, or None
+    :param ndim: number of axes
+    :returns: 1D float64 numpy.array of length ndim
+    :raises: ValueError if sigma or the spacing do not fit the axes
+    """
+    return per_axis(sigma, ndim, "sigma") / voxel_spacing(spacing, ndim)
+
+
+def drop_axis(values, axis):
+    """Return per-axis values without those of one axis.
+
+    :param values: sequence with one value per axis, or None
+    :param axis: axis to drop
+    :returns: tuple, or None if values is None
+    """
+    if values is None:
+        return None
+    axis = axis % len(values)
+    return tuple(v for i, v in enumerate(values) if i != axis)
+
+
+def map_slices(process, count, workers=None):
+    """Call a function with each slice index, in a pool of threads.
+
+    :param process: function taking a slice index
+    :param count: number of slices
+    :param workers: number of threads, defaults to the number of CPUs
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or count == 1:
+        for index in range(count):
+            process(index)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Consume the iterator to propagate exceptions.
+        list(pool.map(process, range(count)))
+
+
+def apply_slices(func, image, axis, output_dtype, out=None, workers=None,
+                 extra=None):
+    """Return result of applying a 2D function to each slice of a volume.
+
+    :param func: function taking a contiguous 2D array (and the slices of
+                 the extra arrays) and returning an array of the same shape
+    :param image: 3D numpy.array
+    :param axis: axis along which the volume is sliced
+    :param output_dtype: dtype of the output array
+    :param out: optional array to write the result to
+    :param workers: number of threads, defaults to the number of CPUs
+    :param extra: optional list of arrays with the same shape as the
+                  image, e.g. a mask, that are sliced alongside it
+    :returns: numpy.array with the shape of the image
+    :raises: ValueError if the image is not 3D
+    """
+    if image.ndim != 3:
+        msg = "Expected a 3D image to process slice by slice, got {} " \
+              "dimensions"
+        raise(ValueError(msg.format(image.ndim)))
+    if out is None:
+        out = np.empty(image.shape, dtype=output_dtype)
+    planes = np.moveaxis(image, axis, 0)
+    output_planes = np.moveaxis(out, axis, 0)
+    extra_planes = [np.moveaxis(array, axis, 0) for array in extra or []]
+
+    def process(index):
+        output_planes[index] = func(
+            np.ascontiguousarray(planes[index]),
+            *[array[index] for array in extra_planes])
+
+    map_slices(process, len(planes), workers)
+    return out
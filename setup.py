@@ -41,14 +41,15 @@ setup(name='jicbioimage.transform',
         "License :: OSI Approved :: MIT License",
         "Natural Language :: English",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3.8",
         "Topic :: Scientific/Engineering",
         "Topic :: Scientific/Engineering :: Bio-Informatics",
         "Topic :: Scientific/Engineering :: Image Recognition",
       ],
       keywords = ['microscopy', 'image analysis'],
       cmdclass={'test': NoseTestCommand},
+      python_requires='>=3.8',
       install_requires=[
         'jicbioimage.core',
         'numpy',
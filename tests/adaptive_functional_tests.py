@@ -0,0 +1,113 @@
+"""Adaptive threshold functional tests."""
+
+import unittest
+import numpy as np
+
+
+class AdaptiveThresholdTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((60, 70))
+        self.uint16_image = (self.image * 65535).astype(np.uint16)
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def test_window_sums(self):
+        from jicbioimage.transform.adaptive import (
+            summed_area_table,
+            window_sums,
+        )
+        image = (self.image * 255).astype(np.uint8)
+        table = summed_area_table(image)
+        self.assertEqual(table.dtype, np.int64)
+        self.assertEqual(table.shape, (61, 71))
+        sums = window_sums(table, (3, 5))
+        self.assertEqual(sums.shape, (58, 66))
+        self.assertEqual(sums[10, 20], image[10:13, 20:25].sum())
+        squares = window_sums(summed_area_table(image, square=True), (3, 5))
+        self.assertEqual(squares[10, 20],
+                         (image[10:13, 20:25].astype(int) ** 2).sum())
+
+    def test_local_threshold_matches_skimage(self):
+        import skimage.filters
+        from jicbioimage.transform.adaptive import local_threshold
+        for image in (self.image, self.uint16_image):
+            for window_size in (3, 15, (5, 21)):
+                self.assertTrue(np.allclose(
+                    local_threshold(image, "sauvola", window_size),
+                    skimage.filters.threshold_sauvola(image, window_size)))
+                self.assertTrue(np.allclose(
+                    local_threshold(image, "niblack", window_size, k=0.5),
+                    skimage.filters.threshold_niblack(image, window_size,
+                                                      k=0.5)))
+                self.assertTrue(np.allclose(
+                    local_threshold(image, "mean", window_size),
+                    skimage.filters.threshold_local(
+                        image, window_size, method="mean", mode="mirror")))
+
+    def test_local_threshold_3d(self):
+        import skimage.filters
+        from jicbioimage.transform.adaptive import local_threshold
+        volume = self.image[:, :63].reshape((20, 27, 7))
+        self.assertTrue(np.allclose(
+            local_threshold(volume, "sauvola", (3, 5, 3)),
+            skimage.filters.threshold_sauvola(volume, (3, 5, 3))))
+
+    def test_raises_value_error(self):
+        from jicbioimage.transform.adaptive import local_threshold
+        for window_size in (4, 0, (3, 5, 7), 2.5):
+            with self.assertRaises(ValueError):
+                local_threshold(self.image, "mean", window_size)
+        with self.assertRaises(ValueError):
+            local_threshold(self.image, "bernsen")
+
+    def test_threshold_transforms(self):
+        import skimage.filters
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import (
+            threshold_local_mean,
+            threshold_niblack,
+            threshold_sauvola,
+        )
+        image = self.uint16_image
+        mask = threshold_sauvola(image, window_size=9)
+        self.assertTrue(isinstance(mask, Image))
+        self.assertEqual(mask.dtype, bool)
+        expected = image > skimage.filters.threshold_sauvola(image, 9)
+        self.assertTrue(np.array_equal(mask, expected))
+        expected = image > 1.1 * skimage.filters.threshold_niblack(image)
+        self.assertTrue(np.array_equal(
+            threshold_niblack(image, multiplier=1.1), expected))
+        expected = self.image > skimage.filters.threshold_local(
+            self.image, 15, method="mean", mode="mirror")
+        self.assertTrue(np.array_equal(threshold_local_mean(self.image),
+                                       expected))
+
+    def test_tiled_is_identical(self):
+        from jicbioimage.transform import threshold_sauvola
+        image = self.uint16_image
+        expected = threshold_sauvola(image, window_size=21)
+        tiled = threshold_sauvola(image, window_size=21, memory_budget=50000,
+                                  workers=2)
+        self.assertTrue(np.array_equal(tiled, expected))
+
+    def test_out_and_packed(self):
+        from jicbioimage.transform import threshold_sauvola
+        from jicbioimage.transform.packed import PackedMask
+        expected = threshold_sauvola(self.image)
+        out = np.empty(self.image.shape, dtype=bool)
+        mask = threshold_sauvola(self.image, out=out)
+        self.assertTrue(np.shares_memory(mask, out))
+        self.assertTrue(np.array_equal(out, expected))
+        packed = threshold_sauvola(self.image, packed=True)
+        self.assertTrue(isinstance(packed, PackedMask))
+        self.assertTrue(np.array_equal(packed.unpack(), expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Write-behind AutoWrite functional tests."""
+
+import unittest
+import os
+import os.path
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class AutoWriteTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName, AutoWrite
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        self.original_on = AutoWrite.on
+        AutoWrite.on = True
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((20, 30))
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName, AutoWrite
+        from jicbioimage.transform import autowrite
+        autowrite.disable()
+        AutoName.count = 0
+        AutoWrite.on = self.original_on
+        shutil.rmtree(TMP_DIR)
+
+    def run_transforms(self):
+        from jicbioimage.transform import (
+            smooth_gaussian,
+            threshold_otsu,
+            dilate_binary,
+        )
+        from jicbioimage.transform.packed import pack
+        smoothed = smooth_gaussian(self.image, sigma=2)
+        mask = threshold_otsu(smoothed)
+        packed = dilate_binary(pack(mask))
+        return [smoothed, mask, packed]
+
+    def test_synchronous_writes_unchanged(self):
+        from unittest import mock
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import autowrite
+        from jicbioimage.transform.packed import PackedMask
+        self.assertFalse(autowrite.is_enabled())
+        written = []
+
+        def fake_write(image, fpath):
+            written.append(fpath)
+
+        with mock.patch.object(Image, "write", fake_write):
+            with mock.patch.object(PackedMask, "write", fake_write):
+                self.run_transforms()
+        self.assertEqual(written,
+                         [os.path.join(TMP_DIR, "1_smooth_gaussian"),
+                          os.path.join(TMP_DIR, "2_threshold_otsu"),
+                          os.path.join(TMP_DIR, "3_dilate_binary")])
+
+    def test_write_behind_names_pixels_and_history(self):
+        from PIL import Image as PILImage
+        from jicbioimage.transform import autowrite
+        autowrite.enable(workers=2, queue_size=2)
+        outputs = self.run_transforms()
+        # Modifying an output does not change what is written.
+        outputs[0][...] = 0
+        autowrite.flush()
+        self.assertEqual(sorted(os.listdir(TMP_DIR)),
+                         ["1_smooth_gaussian.png",
+                          "2_threshold_otsu.png",
+                          "3_dilate_binary.png"])
+
+        expected_smoothed = self.run_transforms()[0]
+        smoothed = np.asarray(PILImage.open(
+            os.path.join(TMP_DIR, "1_smooth_gaussian.png")))
+        self.assertTrue(np.array_equal(
+            smoothed, autowrite._png_pixels(expected_smoothed)))
+        dilated = np.asarray(PILImage.open(
+            os.path.join(TMP_DIR, "3_dilate_binary.png")))
+        self.assertTrue(np.array_equal(dilated > 0, outputs[2].unpack()))
+
+        self.assertEqual(len(outputs[2].history), 3)
+        self.assertEqual([e.function.__name__ for e in outputs[2].history],
+                         ["smooth_gaussian", "threshold_otsu",
+                          "dilate_binary"])
+
+    def test_flush_raises_write_errors(self):
+        from jicbioimage.core.io import AutoName
+        from jicbioimage.transform import autowrite, smooth_gaussian
+        autowrite.enable()
+        AutoName.directory = os.path.join(TMP_DIR, "missing")
+        smooth_gaussian(self.image)
+        with self.assertRaises(IOError):
+            autowrite.flush()
+        # Errors are only reported once.
+        autowrite.flush()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Batch execution functional tests."""
+
+import unittest
+import os
+import os.path
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class RunBatchTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.images = [random.random_sample((8, 9)) for i in range(5)]
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def assert_batch_matches_serial(self, executor):
+        from jicbioimage.transform import smooth_gaussian
+        from jicbioimage.transform.batch import run_batch
+        from jicbioimage.core.image import Image
+        results = run_batch(smooth_gaussian, self.images, workers=2,
+                            executor=executor, sigma=2)
+        self.assertEqual([r.index for r in results], list(range(5)))
+        for image, result in zip(self.images, results):
+            self.assertIsNone(result.error)
+            self.assertTrue(isinstance(result.value, Image))
+            expected = smooth_gaussian(image, sigma=2)
+            self.assertTrue(np.array_equal(expected, result.value))
+            self.assertEqual(str(expected.history),
+                             str(result.value.history))
+
+    def test_run_batch_threads(self):
+        self.assert_batch_matches_serial("thread")
+
+    def test_run_batch_processes(self):
+        self.assert_batch_matches_serial("process")
+
+    def test_run_batch_reports_errors_per_item(self):
+        from jicbioimage.transform import smooth_gaussian
+        from jicbioimage.transform.batch import run_batch
+        items = [self.images[0], self.images[1].astype(np.uint8),
+                 os.path.join(TMP_DIR, "does_not_exist.png")]
+        for executor in ["thread", "process"]:
+            results = run_batch(smooth_gaussian, items, workers=2,
+                                executor=executor)
+            self.assertIsNone(results[0].error)
+            self.assertTrue(isinstance(results[1].error, TypeError))
+            self.assertIsNone(results[1].value)
+            self.assertIsNotNone(results[2].error)
+
+    def test_run_batch_history_keeps_input_history(self):
+        from jicbioimage.transform import smooth_gaussian, threshold_otsu
+        from jicbioimage.transform.batch import run_batch
+        smoothed = smooth_gaussian(self.images[0])
+        result, = run_batch(threshold_otsu, [smoothed], workers=1,
+                            executor="thread")
+        self.assertEqual(len(result.value.history), 2)
+
+    def test_run_batch_requires_transformation(self):
+        from jicbioimage.transform.batch import run_batch
+
+        def not_a_transformation(image):
+            return image
+
+        with self.assertRaises(TypeError):
+            run_batch(not_a_transformation, self.images)
+
+    def test_run_batch_unknown_executor(self):
+        from jicbioimage.transform import smooth_gaussian
+        from jicbioimage.transform.batch import run_batch
+        with self.assertRaises(ValueError):
+            run_batch(smooth_gaussian, self.images, executor="cluster")
+    def test_run_batch_packed_masks(self):
+        from jicbioimage.transform import dilate_binary
+        from jicbioimage.transform.batch import run_batch
+        from jicbioimage.transform.packed import PackedMask, pack
+        masks = [image > 0.5 for image in self.images]
+        for executor in ["thread", "process"]:
+            results = run_batch(dilate_binary, [pack(m) for m in masks],
+                                workers=2, executor=executor)
+            for mask, result in zip(masks, results):
+                self.assertTrue(isinstance(result.value, PackedMask))
+                self.assertTrue(np.array_equal(result.value.unpack(),
+                                               dilate_binary(mask)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Benchmark suite functional tests."""
+
+import unittest
+import os
+import importlib.util
+
+HERE = os.path.dirname(__file__)
+SUITE = os.path.join(HERE, "..", "benchmarks", "suite.py")
+
+
+def load_suite():
+    spec = importlib.util.spec_from_file_location("suite", SUITE)
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+    return suite
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+
+    def test_every_transform_has_a_case(self):
+        suite = load_suite()
+        self.assertTrue("smooth_gaussian" in suite.public_transforms())
+        self.assertEqual(suite.uncovered(), [])
+
+    def test_run(self):
+        suite = load_suite()
+        results = suite.run("small", pattern="invert/bool", repeat=1,
+                            log=None)
+        self.assertEqual(list(results["results"].keys()), ["invert/bool"])
+        result = results["results"]["invert/bool"]
+        self.assertTrue(result["time"] > 0)
+        # The output of a 512x512 boolean image.
+        self.assertTrue(result["peak_memory"] >= 512 * 512)
+
+    def test_compare(self):
+        suite = load_suite()
+        mib = 1024 ** 2
+        baseline = {"results": {
+            "a": {"time": 1.0, "peak_memory": 100 * mib},
+            "b": {"time": 1.0, "peak_memory": 100 * mib},
+            "c": {"time": 0.0001, "peak_memory": 1000},
+        }}
+        current = {"results": {
+            "a": {"time": 1.2, "peak_memory": 105 * mib},
+            "b": {"time": 1.5, "peak_memory": 120 * mib},
+            # Small absolute increases are noise.
+            "c": {"time": 0.001, "peak_memory": 5000},
+            # Cases without a baseline are not compared.
+            "d": {"time": 10.0, "peak_memory": 1000 * mib},
+        }}
+        regressions = suite.compare(baseline, current)
+        self.assertEqual([name for name, _ in regressions], ["b", "b"])
+        self.assertEqual(suite.compare(baseline, current, tolerance=1.0,
+                                       memory_tolerance=0.5), [])
+
+    def test_check_without_baseline(self):
+        suite = load_suite()
+        fpath = os.path.join(HERE, "no-such-baseline.json")
+        with self.assertRaises(SystemExit) as context:
+            suite.main(["check", "--baseline", fpath])
+        self.assertEqual(context.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Result cache functional tests."""
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class ResultCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName, AutoWrite
+        AutoName.count = 0
+        self.original_directory = AutoName.directory
+        AutoName.directory = TMP_DIR
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((30, 40))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName, AutoWrite
+        from jicbioimage.transform import cache
+        cache.disable()
+        shutil.rmtree(self.tmp_dir)
+        AutoName.count = 0
+        AutoName.directory = self.original_directory
+        AutoWrite.on = self.original_on
+        shutil.rmtree(TMP_DIR)
+
+    def test_disabled_by_default(self):
+        from jicbioimage.transform import cache
+        self.assertTrue(cache.active() is None)
+
+    def test_hit_returns_image_with_history(self):
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import cache, smooth_gaussian
+        result_cache = cache.enable()
+        computed = smooth_gaussian(self.image, sigma=2)
+        self.assertEqual(result_cache.misses, 1)
+        hit = smooth_gaussian(self.image, 2)
+        self.assertEqual(result_cache.hits, 1)
+        self.assertTrue(isinstance(hit, Image))
+        self.assertTrue(np.array_equal(hit, computed))
+        self.assertEqual(len(hit.history), 1)
+        self.assertEqual(hit.history[0].function.__name__, "smooth_gaussian")
+
+        # Modifying a returned result does not affect the cache.
+        hit[...] = 0
+        again = smooth_gaussian(self.image, sigma=2)
+        self.assertTrue(np.array_equal(again, computed))
+
+    def test_key_depends_on_content_and_arguments(self):
+        from jicbioimage.transform import cache, smooth_gaussian
+        result_cache = cache.enable()
+        smooth_gaussian(self.image, sigma=2)
+        smooth_gaussian(self.image, sigma=3)
+        smooth_gaussian(self.image.astype(np.float32), sigma=2)
+        smooth_gaussian(self.image.reshape(40, 30), sigma=2)
+        smooth_gaussian(self.image + 1, sigma=2)
+        self.assertEqual(result_cache.hits, 0)
+        # Arguments that do not change the result are ignored.
+        smooth_gaussian(self.image.copy(), sigma=2, workers=1)
+        self.assertEqual(result_cache.hits, 1)
+
+    def test_image_by_keyword(self):
+        from jicbioimage.transform import cache, invert
+        result_cache = cache.enable()
+        image = (self.image * 255).astype(np.uint8)
+        computed = invert(image=image)
+        hit = invert(image)
+        self.assertEqual(result_cache.hits, 1)
+        self.assertTrue(np.array_equal(hit, computed))
+
+    def test_hit_writes_to_out(self):
+        from jicbioimage.transform import cache, threshold_otsu
+        cache.enable()
+        image = (self.image * 255).astype(np.uint8)
+        expected = threshold_otsu(image)
+        out = np.zeros(image.shape, dtype=bool)
+        result = threshold_otsu(image, out=out)
+        self.assertTrue(np.array_equal(out, expected))
+        self.assertTrue(np.array_equal(result, expected))
+
+    def test_memory_limit(self):
+        from jicbioimage.transform import cache, smooth_gaussian
+        result_cache = cache.enable(max_bytes=2 * self.image.nbytes)
+        for sigma in [1, 2, 3]:
+            smooth_gaussian(self.image, sigma=sigma)
+        self.assertEqual(len(result_cache), 2)
+        self.assertEqual(result_cache.nbytes, 2 * self.image.nbytes)
+        # The least recently used result was discarded.
+        smooth_gaussian(self.image, sigma=1)
+        self.assertEqual(result_cache.hits, 0)
+        smooth_gaussian(self.image, sigma=3)
+        self.assertEqual(result_cache.hits, 1)
+
+    def test_disk_tier(self):
+        from jicbioimage.transform import cache, smooth_gaussian
+        cache.enable(directory=self.tmp_dir)
+        computed = smooth_gaussian(self.image, sigma=2)
+        self.assertEqual(len(os.listdir(self.tmp_dir)), 1)
+
+        # A new cache, e.g. in a later run, finds the result on disk.
+        result_cache = cache.enable(directory=self.tmp_dir)
+        hit = smooth_gaussian(self.image, sigma=2)
+        self.assertEqual(result_cache.hits, 1)
+        self.assertTrue(np.array_equal(hit, computed))
+        self.assertEqual(len(hit.history), 1)
+
+        result_cache.clear()
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_packed_masks(self):
+        from jicbioimage.transform import cache, dilate_binary
+        from jicbioimage.transform.packed import PackedMask, pack
+        cache.enable(directory=self.tmp_dir)
+        mask = pack(self.image > 0.5)
+        computed = dilate_binary(mask)
+        hit = dilate_binary(mask)
+        self.assertTrue(isinstance(hit, PackedMask))
+        self.assertTrue(np.array_equal(hit.unpack(), computed.unpack()))
+
+    def test_plane_stacks(self):
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.transform import cache, max_intensity_projection
+        from jicbioimage.transform.projection import PlaneStack
+        AutoWrite.on = True
+        cache.enable()
+        random = np.random.RandomState(0)
+        tczyx = random.randint(0, 255, (2, 2, 3, 10, 12)).astype(np.uint8)
+        computed = max_intensity_projection(tczyx, axis=2)
+        hit = max_intensity_projection(tczyx, axis=2)
+        self.assertTrue(isinstance(hit, PlaneStack))
+        self.assertTrue(np.array_equal(hit, computed))
+        self.assertEqual(sorted(os.listdir(TMP_DIR)),
+                         ["1_max_intensity_projection.stack",
+                          "2_max_intensity_projection.stack"])
+
+    def test_plane_stacks_disk_tier(self):
+        from jicbioimage.transform import cache, max_intensity_projection
+        from jicbioimage.transform.projection import PlaneStack
+        cache.enable(directory=self.tmp_dir)
+        tczyx = self.image.reshape(2, 3, 5, 40)
+        computed = max_intensity_projection(tczyx, axis=1)
+        result_cache = cache.enable(directory=self.tmp_dir)
+        hit = max_intensity_projection(tczyx, axis=1)
+        self.assertEqual(result_cache.hits, 1)
+        self.assertTrue(isinstance(hit, PlaneStack))
+        self.assertTrue(np.array_equal(hit, computed))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Connected component analysis functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class ComponentsTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.mask = random.random_sample((60, 70)) > 0.6
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_labels_and_sizes(self):
+        import scipy.ndimage
+        from jicbioimage.transform.components import Components
+        components = Components(self.mask)
+        labels, count = scipy.ndimage.label(self.mask)
+        self.assertEqual(components.count, count)
+        self.assertTrue(np.array_equal(components.labels, labels))
+        self.assertEqual(components.sizes[0], np.sum(~self.mask))
+        for label in [1, count // 2, count]:
+            self.assertEqual(components.sizes[label],
+                             np.sum(labels == label))
+
+    def test_mask_identical_to_skimage(self):
+        import skimage.morphology
+        from jicbioimage.transform.components import Components
+        for connectivity in [1, 2]:
+            components = Components(self.mask, connectivity)
+            for min_size in [0, 1, 2, 5, 20, 1000]:
+                expected = skimage.morphology.remove_small_objects(
+                    self.mask, min_size=min_size, connectivity=connectivity)
+                self.assertTrue(np.array_equal(
+                    components.mask(min_size=min_size), expected))
+
+    def test_size_range(self):
+        from jicbioimage.transform.components import Components
+        components = Components(self.mask)
+        mask = components.mask(min_size=3, max_size=10)
+        sizes = components.sizes[components.labels[mask]]
+        self.assertTrue(np.all((sizes >= 3) & (sizes <= 10)))
+        removed = components.sizes[components.labels[self.mask & ~mask]]
+        self.assertTrue(np.all((removed < 3) | (removed > 10)))
+
+    def test_filter_labels(self):
+        from jicbioimage.transform.components import Components
+        components = Components(self.mask)
+        labels = components.filter_labels(max_size=4)
+        self.assertEqual(labels.dtype, np.int32)
+        self.assertTrue(np.array_equal(labels > 0,
+                                       components.mask(max_size=4)))
+        kept = labels > 0
+        self.assertTrue(np.array_equal(labels[kept],
+                                       components.labels[kept]))
+
+    def test_remove_small_objects(self):
+        import skimage.morphology
+        from jicbioimage.transform import remove_small_objects
+        from jicbioimage.transform.packed import pack
+        expected = skimage.morphology.remove_small_objects(
+            self.mask, min_size=10, connectivity=2)
+        result = remove_small_objects(self.mask, min_size=10, connectivity=2)
+        self.assertTrue(np.array_equal(result, expected))
+        out = np.empty(self.mask.shape, dtype=bool)
+        result = remove_small_objects(self.mask, min_size=10,
+                                      connectivity=2, out=out)
+        self.assertTrue(np.array_equal(out, expected))
+        packed = remove_small_objects(pack(self.mask), min_size=10,
+                                      connectivity=2)
+        self.assertTrue(np.array_equal(packed.unpack(), expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Gaussian smoothing engine functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class GaussianBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((60, 45))
+        # A ramp makes boundary handling differences visible.
+        self.image += np.linspace(0, 5, 45)
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_fft_backend_matches_direct(self):
+        import scipy.ndimage
+        from jicbioimage.transform.filters import gaussian
+        for sigma in [0.5, 1, 3, (2, 7), (0, 4)]:
+            expected = scipy.ndimage.gaussian_filter(self.image, sigma,
+                                                     mode="nearest")
+            smoothed = gaussian(self.image, sigma, backend="fft")
+            self.assertEqual(smoothed.dtype, np.float64)
+            self.assertTrue(np.allclose(expected, smoothed,
+                                        rtol=0, atol=1e-12))
+
+    def test_float32(self):
+        from jicbioimage.transform.filters import gaussian
+        image32 = self.image.astype(np.float32)
+        for backend in ["direct", "fft"]:
+            expected = gaussian(self.image, 3, backend=backend)
+            smoothed = gaussian(image32, 3, backend=backend)
+            self.assertEqual(smoothed.dtype, np.float32)
+            self.assertTrue(np.allclose(expected, smoothed,
+                                        rtol=0, atol=1e-5))
+
+    def test_select_backend(self):
+        from jicbioimage.transform.filters import select_backend
+        self.assertEqual(select_backend((2048, 2048), 1), "direct")
+        self.assertEqual(select_backend((2048, 2048), 32), "fft")
+        self.assertEqual(select_backend((2048, 2048), 4, np.float32), "fft")
+        self.assertEqual(select_backend((2048, 2048), 0), "direct")
+
+    def test_unknown_backend(self):
+        from jicbioimage.transform.filters import gaussian
+        with self.assertRaises(ValueError):
+            gaussian(self.image, 1, backend="gpu")
+
+    def test_smooth_gaussian_float32_and_backends(self):
+        from jicbioimage.transform import smooth_gaussian
+        expected = smooth_gaussian(self.image, sigma=10, backend="direct")
+        for backend in ["fft", "auto"]:
+            smoothed = smooth_gaussian(self.image, sigma=10, backend=backend)
+            self.assertTrue(np.allclose(expected, smoothed,
+                                        rtol=0, atol=1e-12))
+        smoothed = smooth_gaussian(self.image.astype(np.float32), sigma=10)
+        self.assertEqual(smoothed.dtype, np.float32)
+
+if __name__ == '__main__':
+    unittest.main()
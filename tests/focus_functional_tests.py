@@ -0,0 +1,91 @@
+"""Extended depth-of-field functional tests."""
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class ExtendedDepthOfFieldTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        import scipy.ndimage as ndi
+        random = np.random.RandomState(0)
+        texture = random.random_sample((40, 60)) * 200
+        blurred = ndi.gaussian_filter(texture, 3)
+        # The left half is in focus in slice 1, the right half in slice 3.
+        slices = [blurred.copy() for z in range(5)]
+        slices[1][:, :30] = texture[:, :30]
+        slices[3][:, 30:] = texture[:, 30:]
+        self.stack = np.dstack(slices).astype(np.uint8)
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def slices(self):
+        return (self.stack[:, :, z] for z in range(self.stack.shape[2]))
+
+    def test_z_map_picks_sharpest_slice(self):
+        from jicbioimage.transform.focus import (
+            FOCUS_MEASURES,
+            extended_depth_of_field,
+        )
+        for measure in FOCUS_MEASURES:
+            projection, z_map = extended_depth_of_field(self.stack, measure,
+                                                        window=5)
+            self.assertEqual(projection.dtype, np.uint8)
+            # Away from the boundary between the halves.
+            self.assertTrue(np.all(z_map[:, :25] == 1), measure)
+            self.assertTrue(np.all(z_map[:, 35:] == 3), measure)
+            self.assertTrue(np.array_equal(projection[:, :25],
+                                           self.stack[:, :25, 1]))
+            self.assertTrue(np.array_equal(projection[:, 35:],
+                                           self.stack[:, 35:, 3]))
+
+    def test_blocks_and_slices_identical(self):
+        from jicbioimage.transform.focus import extended_depth_of_field
+        expected = extended_depth_of_field(self.stack, block_bytes=1 << 30)
+        for source in [self.slices(),
+                       np.moveaxis(self.stack, 2, 0)]:
+            axis = 0 if isinstance(source, np.ndarray) else 2
+            result = extended_depth_of_field(source, axis=axis,
+                                             block_bytes=100)
+            for array, expected_array in zip(result, expected):
+                self.assertTrue(np.array_equal(array, expected_array))
+
+    def test_memmap(self):
+        from jicbioimage.transform import extended_depth_of_field_projection
+        from jicbioimage.transform.focus import extended_depth_of_field
+        tmp = tempfile.NamedTemporaryFile(suffix=".dat", delete=False)
+        tmp.close()
+        try:
+            memmap = np.memmap(tmp.name, dtype=self.stack.dtype,
+                               mode="w+", shape=self.stack.shape)
+            memmap[:] = self.stack
+            projection = extended_depth_of_field_projection(memmap)
+            expected, _ = extended_depth_of_field(self.stack)
+            self.assertTrue(np.array_equal(projection, expected))
+            self.assertEqual(projection.history[0].function.__name__,
+                             "extended_depth_of_field_projection")
+            del memmap
+        finally:
+            os.unlink(tmp.name)
+
+    def test_unknown_measure(self):
+        from jicbioimage.transform.focus import extended_depth_of_field
+        with self.assertRaises(ValueError):
+            extended_depth_of_field(self.stack, "brenner")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Sobel gradient functional tests."""
+
+import unittest
+import numpy as np
+
+
+class GradientTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((50, 60))
+        self.mask = random.random_sample((50, 60)) > 0.2
+        self.stack = random.random_sample((30, 40, 5))
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def test_outputs_match_skimage(self):
+        import skimage.filters
+        from jicbioimage.transform.gradient import (
+            GRADIENT_OUTPUTS,
+            sobel_gradient,
+        )
+        gradient = sobel_gradient(self.image, GRADIENT_OUTPUTS)
+        self.assertEqual(list(gradient), list(GRADIENT_OUTPUTS))
+        x = skimage.filters.sobel_v(self.image)
+        y = skimage.filters.sobel_h(self.image)
+        self.assertTrue(np.allclose(gradient["magnitude"],
+                                    skimage.filters.sobel(self.image)))
+        self.assertTrue(np.allclose(gradient["angle"], np.arctan2(y, x)))
+        self.assertTrue(np.allclose(gradient["x"], x))
+        self.assertTrue(np.allclose(gradient["y"], y))
+
+    def test_mask(self):
+        import skimage.filters
+        from jicbioimage.transform.gradient import sobel_gradient
+        gradient = sobel_gradient(self.image, ("magnitude", "angle", "x"),
+                                  mask=self.mask)
+        expected = skimage.filters.sobel(self.image, mask=self.mask)
+        self.assertTrue(np.allclose(gradient["magnitude"], expected))
+        self.assertTrue(np.allclose(
+            gradient["x"], skimage.filters.sobel_v(self.image, self.mask)))
+        outside = expected == 0
+        self.assertTrue(np.all(gradient["angle"][outside] == 0))
+        self.assertTrue(np.all(gradient["angle"][~self.mask] == 0))
+
+    def test_float32(self):
+        import skimage.filters
+        from jicbioimage.transform.gradient import sobel_gradient
+        gradient = sobel_gradient(self.image, ("magnitude",), np.float32)
+        self.assertEqual(gradient["magnitude"].dtype, np.float32)
+        self.assertTrue(np.allclose(gradient["magnitude"],
+                                    skimage.filters.sobel(self.image),
+                                    atol=1e-6))
+        uint8_image = (self.image * 255).astype(np.uint8)
+        gradient = sobel_gradient(uint8_image, ("magnitude",), np.float32)
+        self.assertTrue(np.allclose(gradient["magnitude"],
+                                    skimage.filters.sobel(uint8_image),
+                                    atol=1e-6))
+
+    def test_stack_slices(self):
+        import skimage.filters
+        from jicbioimage.transform.gradient import sobel_gradient
+        for axis in (0, 1, 2):
+            planes = np.moveaxis(self.stack, axis, 0)
+            expected = np.stack([skimage.filters.sobel(p) for p in planes])
+            for workers in (1, 3):
+                gradient = sobel_gradient(self.stack, ("magnitude", "y"),
+                                          axis=axis, workers=workers)
+                self.assertEqual(gradient["magnitude"].shape,
+                                 self.stack.shape)
+                self.assertTrue(np.allclose(
+                    np.moveaxis(gradient["magnitude"], axis, 0), expected))
+
+    def test_stack_with_plane_mask(self):
+        import skimage.filters
+        from jicbioimage.transform.gradient import sobel_gradient
+        mask = self.mask[:30, :40]
+        gradient = sobel_gradient(self.stack, ("magnitude",), mask=mask)
+        for z in range(self.stack.shape[2]):
+            expected = skimage.filters.sobel(self.stack[:, :, z], mask=mask)
+            self.assertTrue(np.allclose(gradient["magnitude"][:, :, z],
+                                        expected))
+
+    def test_raises_value_error(self):
+        from jicbioimage.transform.gradient import sobel_gradient
+        with self.assertRaises(ValueError):
+            sobel_gradient(self.image, ("magnitude", "curl"))
+        with self.assertRaises(ValueError):
+            sobel_gradient(self.image, ())
+        with self.assertRaises(ValueError):
+            sobel_gradient(self.image[0], ("magnitude",))
+        with self.assertRaises(ValueError):
+            sobel_gradient(self.image, mask=self.mask[:10])
+
+    def test_find_gradient_sobel(self):
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import (
+            find_edges_sobel,
+            find_gradient_sobel,
+            precision,
+        )
+        gradient = find_gradient_sobel(self.image, ("magnitude", "angle"),
+                                       mask=self.mask)
+        self.assertTrue(isinstance(gradient["angle"], Image))
+        self.assertTrue(np.allclose(gradient["magnitude"],
+                                    find_edges_sobel(self.image,
+                                                     mask=self.mask)))
+        self.assertEqual(len(gradient["angle"].history), 1)
+        self.assertEqual(gradient["angle"].history[0].function.__name__,
+                         "find_gradient_sobel")
+        self.assertEqual(gradient["angle"].history[0].kwargs["output"],
+                         "angle")
+        with precision.policy("float32"):
+            gradient = find_gradient_sobel(self.image)
+        self.assertEqual(gradient["magnitude"].dtype, np.float32)
+        gradient = find_gradient_sobel(self.image, dtype=np.float32)
+        self.assertEqual(gradient["angle"].dtype, np.float32)
+
+if __name__ == '__main__':
+    unittest.main()
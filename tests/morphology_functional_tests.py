@@ -0,0 +1,134 @@
+"""Binary morphology engine functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+def selems():
+    import skimage.morphology
+    return [
+        None,
+        np.ones((3, 3), dtype=np.uint8),
+        np.ones((5, 1), dtype=np.uint8),
+        np.ones((4, 6), dtype=np.uint8),
+        skimage.morphology.disk(1),
+        skimage.morphology.disk(2),
+        skimage.morphology.disk(4),
+        skimage.morphology.disk(7),
+        skimage.morphology.diamond(3),
+        np.array([[0, 1, 1], [1, 1, 0], [0, 1, 0]], dtype=np.uint8),
+    ]
+
+
+class BinaryMorphologyTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        # Sparse foreground for dilation, dense foreground for erosion.
+        self.sparse = random.random_sample((64, 57)) > 0.97
+        self.dense = random.random_sample((64, 57)) > 0.03
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_classify_selem(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import classify_selem
+        self.assertEqual(classify_selem(None, 2), ("cross", None))
+        self.assertEqual(classify_selem(np.ones((3, 5)), 2),
+                         ("rectangle", (3, 5)))
+        self.assertEqual(classify_selem(skimage.morphology.disk(5), 2),
+                         ("disk", 5))
+        kind, _ = classify_selem(skimage.morphology.diamond(3), 2)
+        self.assertEqual(kind, "general")
+
+    def test_dilation_identical_to_skimage(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import binary_dilation
+        for selem in selems():
+            expected = skimage.morphology.binary_dilation(self.sparse, selem)
+            dilated = binary_dilation(self.sparse, selem)
+            self.assertTrue(np.array_equal(expected, dilated))
+
+    def test_erosion_identical_to_skimage(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import binary_erosion
+        for selem in selems():
+            expected = skimage.morphology.binary_erosion(self.dense, selem)
+            eroded = binary_erosion(self.dense, selem)
+            self.assertTrue(np.array_equal(expected, eroded))
+
+    def test_iterations_identical_to_repeated_skimage(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import (
+            binary_dilation,
+            binary_erosion,
+        )
+        for selem in selems():
+            expected_dilated = self.sparse
+            expected_eroded = self.dense
+            for iterations in range(1, 4):
+                expected_dilated = skimage.morphology.binary_dilation(
+                    expected_dilated, selem)
+                expected_eroded = skimage.morphology.binary_erosion(
+                    expected_eroded, selem)
+                dilated = binary_dilation(self.sparse, selem, iterations)
+                eroded = binary_erosion(self.dense, selem, iterations)
+                self.assertTrue(np.array_equal(expected_dilated, dilated))
+                self.assertTrue(np.array_equal(expected_eroded, eroded))
+
+    def test_empty_and_full_images(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import (
+            binary_dilation,
+            binary_erosion,
+        )
+        disk = skimage.morphology.disk(5)
+        for image in [np.zeros((20, 20), dtype=bool),
+                      np.ones((20, 20), dtype=bool)]:
+            self.assertTrue(np.array_equal(
+                skimage.morphology.binary_dilation(image, disk),
+                binary_dilation(image, disk)))
+            self.assertTrue(np.array_equal(
+                skimage.morphology.binary_erosion(image, disk),
+                binary_erosion(image, disk)))
+
+    def test_invalid_iterations(self):
+        from jicbioimage.transform.morphology import binary_dilation
+        with self.assertRaises(ValueError):
+            binary_dilation(self.sparse, iterations=0)
+
+    def test_transforms_with_iterations_and_tiles(self):
+        import skimage.morphology
+        from jicbioimage.transform import dilate_binary, erode_binary
+        disk = skimage.morphology.disk(3)
+        expected = skimage.morphology.binary_dilation(
+            skimage.morphology.binary_dilation(self.sparse, disk), disk)
+        dilated = dilate_binary(self.sparse, selem=disk, iterations=2)
+        self.assertTrue(np.array_equal(expected, dilated))
+        tiled = dilate_binary(self.sparse, selem=disk, iterations=2,
+                              memory_budget=40 * 40 * 4, workers=1)
+        self.assertTrue(np.array_equal(expected, tiled))
+
+        expected = skimage.morphology.binary_erosion(
+            skimage.morphology.binary_erosion(self.dense, disk), disk)
+        eroded = erode_binary(self.dense, selem=disk, iterations=2)
+        self.assertTrue(np.array_equal(expected, eroded))
+        tiled = erode_binary(self.dense, selem=disk, iterations=2,
+                             memory_budget=40 * 40 * 4, workers=1)
+        self.assertTrue(np.array_equal(expected, tiled))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Packed mask functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class PackedMaskTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        # A width that is not a multiple of eight exercises the padding.
+        self.mask1 = random.random_sample((40, 37)) > 0.9
+        self.mask2 = random.random_sample((40, 37)) > 0.5
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_pack_unpack_roundtrip(self):
+        from jicbioimage.transform.packed import pack, PackedMask
+        packed = pack(self.mask1)
+        self.assertTrue(isinstance(packed, PackedMask))
+        self.assertEqual(packed.shape, (40, 5))
+        self.assertEqual(packed.dtype, np.uint8)
+        self.assertEqual(packed.mask_shape, (40, 37))
+        self.assertTrue(np.array_equal(packed.unpack(), self.mask1))
+        self.assertEqual(packed.unpack().dtype, bool)
+
+    def test_memory_reduction(self):
+        from jicbioimage.transform.packed import pack
+        packed = pack(np.zeros((64, 64), dtype=bool))
+        self.assertEqual(packed.nbytes * 8, 64 * 64)
+
+    def test_logical_ops(self):
+        from jicbioimage.transform.packed import (
+            pack,
+            logical_and,
+            logical_or,
+            logical_xor,
+            logical_not,
+            count_nonzero,
+        )
+        p1 = pack(self.mask1)
+        p2 = pack(self.mask2)
+        self.assertTrue(np.array_equal(logical_and(p1, p2).unpack(),
+                                       self.mask1 & self.mask2))
+        self.assertTrue(np.array_equal(logical_or(p1, p2).unpack(),
+                                       self.mask1 | self.mask2))
+        self.assertTrue(np.array_equal(logical_xor(p1, p2).unpack(),
+                                       self.mask1 ^ self.mask2))
+        self.assertTrue(np.array_equal(logical_not(p1).unpack(),
+                                       ~self.mask1))
+        self.assertEqual(count_nonzero(p1), np.count_nonzero(self.mask1))
+        self.assertEqual(count_nonzero(logical_not(p1)),
+                         np.count_nonzero(~self.mask1))
+
+    def test_logical_ops_different_shapes(self):
+        from jicbioimage.transform.packed import pack, logical_and
+        with self.assertRaises(ValueError):
+            logical_and(pack(self.mask1), pack(self.mask1[:, :30]))
+
+    def test_morphology_identical_to_skimage(self):
+        import skimage.morphology
+        from jicbioimage.transform.packed import (
+            pack,
+            binary_dilation,
+            binary_erosion,
+        )
+        dense = ~self.mask1
+        for selem in [None, np.ones((3, 3)), np.ones((5, 19)),
+                      np.ones((1, 9)), skimage.morphology.disk(2)]:
+            for iterations in [1, 2]:
+                expected = self.mask1
+                expected_eroded = dense
+                for i in range(iterations):
+                    expected = skimage.morphology.binary_dilation(
+                        expected, selem)
+                    expected_eroded = skimage.morphology.binary_erosion(
+                        expected_eroded, selem)
+                dilated = binary_dilation(pack(self.mask1), selem,
+                                          iterations)
+                eroded = binary_erosion(pack(dense), selem, iterations)
+                self.assertTrue(np.array_equal(dilated.unpack(), expected))
+                self.assertTrue(np.array_equal(eroded.unpack(),
+                                               expected_eroded))
+
+    def test_transforms_accept_and_return_packed_masks(self):
+        from jicbioimage.transform import (
+            threshold_otsu,
+            remove_small_objects,
+            dilate_binary,
+            erode_binary,
+        )
+        from jicbioimage.transform.packed import PackedMask, pack
+        random = np.random.RandomState(1)
+        image = random.randint(0, 255, (40, 37)).astype(np.uint8)
+
+        expected = threshold_otsu(image)
+        packed = threshold_otsu(image, packed=True)
+        self.assertTrue(isinstance(packed, PackedMask))
+        self.assertTrue(np.array_equal(packed.unpack(), expected))
+        self.assertEqual(len(packed.history), 1)
+
+        for transform in [remove_small_objects, dilate_binary, erode_binary]:
+            expected = transform(self.mask1)
+            result = transform(pack(self.mask1))
+            self.assertTrue(isinstance(result, PackedMask))
+            self.assertTrue(np.array_equal(result.unpack(), expected))
+
+    def test_contract_rejects_uint8(self):
+        from jicbioimage.transform import dilate_binary
+        with self.assertRaises(TypeError):
+            dilate_binary(self.mask1.astype(np.uint8))
+
+    def test_pipeline_with_packed_masks(self):
+        from jicbioimage.transform import (
+            threshold_otsu,
+            dilate_binary,
+            erode_binary,
+        )
+        from jicbioimage.transform.packed import PackedMask
+        from jicbioimage.transform.pipeline import Pipeline
+        random = np.random.RandomState(2)
+        image = random.randint(0, 255, (40, 37)).astype(np.uint8)
+        expected = erode_binary(dilate_binary(threshold_otsu(image)))
+        pipeline = Pipeline().add(threshold_otsu, packed=True)
+        pipeline.add(dilate_binary).add(erode_binary)
+        for i in range(2):
+            result = pipeline(image)
+            self.assertTrue(isinstance(result, PackedMask))
+            self.assertTrue(np.array_equal(result.unpack(), expected))
+
+if __name__ == '__main__':
+    unittest.main()
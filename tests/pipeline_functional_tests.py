@@ -0,0 +1,115 @@
+"""Pipeline functional tests."""
+
+import unittest
+import os
+import os.path
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class PipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((20, 30))
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def pipeline(self, **kwargs):
+        from jicbioimage.transform import (
+            smooth_gaussian,
+            threshold_otsu,
+            remove_small_objects,
+            dilate_binary,
+        )
+        from jicbioimage.transform.pipeline import Pipeline
+        pipeline = Pipeline(**kwargs)
+        pipeline.add(smooth_gaussian, sigma=2).add(threshold_otsu)
+        pipeline.add(remove_small_objects, min_size=5).add(dilate_binary)
+        return pipeline
+
+    def test_pipeline_matches_chained_transforms(self):
+        from jicbioimage.transform import (
+            smooth_gaussian,
+            threshold_otsu,
+            remove_small_objects,
+            dilate_binary,
+        )
+        from jicbioimage.core.image import Image
+        expected = dilate_binary(remove_small_objects(threshold_otsu(
+            smooth_gaussian(self.image, sigma=2)), min_size=5))
+        pipeline = self.pipeline()
+        self.assertEqual(len(pipeline), 4)
+        for i in range(3):
+            # Later calls reuse the intermediate buffers.
+            result = pipeline(self.image)
+            self.assertTrue(isinstance(result, Image))
+            self.assertTrue(np.array_equal(expected, result))
+            self.assertEqual(str(expected.history), str(result.history))
+
+    def test_pipeline_outputs_are_independent(self):
+        pipeline = self.pipeline()
+        first = pipeline(self.image)
+        first_copy = first.copy()
+        pipeline(self.image[::-1].copy())
+        self.assertTrue(np.array_equal(first_copy, first))
+
+    def test_pipeline_writes_final_output_only(self):
+        from jicbioimage.core.io import AutoWrite
+        pipeline = self.pipeline()
+        written = []
+
+        def fake_write(image, fpath):
+            written.append(fpath)
+
+        from jicbioimage.core.image import Image
+        original_write = Image.write
+        original_on = AutoWrite.on
+        Image.write = fake_write
+        AutoWrite.on = True
+        try:
+            pipeline(self.image)
+            self.assertEqual(written,
+                             [os.path.join(TMP_DIR, "1_dilate_binary")])
+            del written[:]
+            self.pipeline(write="all")(self.image)
+            self.assertEqual(len(written), 4)
+            del written[:]
+            self.pipeline(write="none")(self.image)
+            self.assertEqual(written, [])
+        finally:
+            Image.write = original_write
+            AutoWrite.on = original_on
+
+    def test_pipeline_requires_transformations(self):
+        from jicbioimage.transform.pipeline import Pipeline
+        with self.assertRaises(TypeError):
+            Pipeline().add(lambda image: image)
+        with self.assertRaises(ValueError):
+            Pipeline()(self.image)
+        with self.assertRaises(ValueError):
+            Pipeline(write="some")
+
+    def test_pipeline_reused_buffer_histograms_are_not_stale(self):
+        from jicbioimage.transform import invert, threshold_otsu
+        from jicbioimage.transform.pipeline import Pipeline
+        pipeline = Pipeline().add(invert).add(threshold_otsu)
+        random = np.random.RandomState(0)
+        for scale in [50, 150, 250]:
+            image = (random.random_sample((50, 50)) * scale).astype(np.uint8)
+            expected = threshold_otsu(invert(image))
+            self.assertTrue(np.array_equal(pipeline(image), expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+"""Precision policy and allocation functional tests."""
+
+import unittest
+import tracemalloc
+import numpy as np
+
+
+def peak_memory(func, *args, **kwargs):
+    """Return peak bytes allocated by a call, after a warm up call."""
+    from jicbioimage.transform.threshold import clear_cache
+    func(*args, **kwargs)
+    clear_cache()
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class PrecisionPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((50, 60))
+        self.stack = random.randint(0, 4000, (20, 30, 5)).astype(np.uint16)
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.transform import precision
+        precision.set_policy(precision.DEFAULT_POLICY)
+        AutoWrite.on = self.original_on
+
+    def test_default_policy(self):
+        from jicbioimage.transform import precision
+        self.assertEqual(precision.get_policy(), "native")
+
+    def test_set_policy(self):
+        from jicbioimage.transform import precision
+        self.assertEqual(precision.set_policy("float32"), "native")
+        self.assertEqual(precision.get_policy(), "float32")
+        self.assertEqual(precision.set_policy("float64"), "float32")
+        with self.assertRaises(ValueError):
+            precision.set_policy("float16")
+        self.assertEqual(precision.get_policy(), "float64")
+
+    def test_policy_context_restores_previous(self):
+        from jicbioimage.transform import precision
+        with precision.policy("float32"):
+            self.assertEqual(precision.get_policy(), "float32")
+        self.assertEqual(precision.get_policy(), "native")
+        with self.assertRaises(RuntimeError):
+            with precision.policy("float32"):
+                raise(RuntimeError())
+        self.assertEqual(precision.get_policy(), "native")
+
+    def test_as_float_does_not_copy(self):
+        from jicbioimage.transform import precision
+        self.assertTrue(precision.as_float(self.image) is self.image)
+        uint8_image = (self.image * 255).astype(np.uint8)
+        with precision.policy("float32"):
+            self.assertTrue(precision.as_float(uint8_image) is uint8_image)
+            converted = precision.as_float(self.image)
+            self.assertEqual(converted.dtype, np.float32)
+            self.assertTrue(precision.as_float(converted) is converted)
+
+    def test_smooth_gaussian_dtype(self):
+        from jicbioimage.transform import precision, smooth_gaussian
+        float32_image = self.image.astype(np.float32)
+        self.assertEqual(smooth_gaussian(self.image).dtype, np.float64)
+        self.assertEqual(smooth_gaussian(float32_image).dtype, np.float32)
+        with precision.policy("float32"):
+            smoothed = smooth_gaussian(self.image)
+        self.assertEqual(smoothed.dtype, np.float32)
+        self.assertTrue(np.allclose(smoothed, smooth_gaussian(self.image),
+                                    atol=1e-6))
+        with precision.policy("float64"):
+            self.assertEqual(smooth_gaussian(float32_image).dtype,
+                             np.float64)
+
+    def test_find_edges_sobel_dtype(self):
+        from jicbioimage.transform import precision, find_edges_sobel
+        float32_image = self.image.astype(np.float32)
+        self.assertEqual(find_edges_sobel(self.image).dtype, np.float64)
+        self.assertEqual(find_edges_sobel(float32_image).dtype, np.float32)
+        uint8_image = (self.image * 255).astype(np.uint8)
+        with precision.policy("float32"):
+            self.assertEqual(find_edges_sobel(self.image).dtype, np.float32)
+            self.assertEqual(find_edges_sobel(uint8_image).dtype,
+                             np.float32)
+
+    def test_integer_input_not_converted(self):
+        from jicbioimage.transform import precision, smooth_gaussian
+        uint8_image = (self.image * 255).astype(np.uint8)
+        with precision.policy("float32"):
+            with self.assertRaises(TypeError):
+                smooth_gaussian(uint8_image)
+
+    def test_projection_dtypes(self):
+        from jicbioimage.transform import (
+            precision,
+            sum_intensity_projection,
+            std_intensity_projection,
+            max_intensity_projection,
+        )
+        self.assertEqual(sum_intensity_projection(self.stack).dtype,
+                         np.float64)
+        with precision.policy("float32"):
+            summed = sum_intensity_projection(self.stack)
+            deviation = std_intensity_projection(self.stack)
+            from_slices = sum_intensity_projection(
+                iter(np.moveaxis(self.stack, 2, 0)))
+            maximum = max_intensity_projection(self.stack)
+        self.assertEqual(summed.dtype, np.float32)
+        self.assertEqual(deviation.dtype, np.float32)
+        self.assertEqual(from_slices.dtype, np.float32)
+        self.assertEqual(maximum.dtype, np.uint16)
+        self.assertTrue(np.allclose(summed, self.stack.sum(axis=2)))
+        self.assertTrue(np.allclose(deviation, self.stack.std(axis=2),
+                                    rtol=1e-5))
+
+    def test_cache_key_depends_on_policy(self):
+        import inspect
+        from jicbioimage.transform import cache, precision, smooth_gaussian
+        func = smooth_gaussian.__wrapped__
+        signature = inspect.signature(func)
+        key = cache.make_key(func, signature, (self.image,), {})
+        with precision.policy("float32"):
+            float32_key = cache.make_key(func, signature, (self.image,), {})
+        self.assertNotEqual(key, float32_key)
+
+    def test_pipeline_follows_policy(self):
+        from jicbioimage.transform import precision, smooth_gaussian
+        from jicbioimage.transform.pipeline import Pipeline
+        pipeline = Pipeline().add(smooth_gaussian, sigma=2)
+        self.assertEqual(pipeline(self.image).dtype, np.float64)
+        with precision.policy("float32"):
+            self.assertEqual(pipeline(self.image).dtype, np.float32)
+        self.assertEqual(pipeline(self.image).dtype, np.float64)
+
+
+class AllocationTests(unittest.TestCase):
+    """Peak allocations of the transformations, relative to their input."""
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((1024, 1024))
+        self.mask = self.image > 0.5
+        self.stack = random.randint(0, 4000, (128, 128, 16)).astype(
+            np.uint16)
+        self.plane = self.stack[:, :, 0].nbytes
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def assertPeakBelow(self, limit, func, *args, **kwargs):
+        peak = peak_memory(func, *args, **kwargs)
+        self.assertLessEqual(peak, limit)
+
+    def test_smooth_gaussian(self):
+        from jicbioimage.transform import precision, smooth_gaussian
+        image = self.image
+        self.assertPeakBelow(1.1 * image.nbytes, smooth_gaussian, image)
+        out = np.empty_like(image)
+        self.assertPeakBelow(0.1 * image.nbytes, smooth_gaussian, image,
+                             out=out)
+        with precision.policy("float32"):
+            self.assertPeakBelow(1.1 * image.nbytes, smooth_gaussian, image)
+
+    def test_find_edges_sobel(self):
+        from jicbioimage.transform import find_edges_sobel
+        image = self.image.astype(np.float32)
+        self.assertPeakBelow(3.1 * image.nbytes, find_edges_sobel, image)
+
+    def test_threshold_otsu(self):
+        from jicbioimage.transform import threshold_otsu
+        image = (self.image * 255).astype(np.uint8)
+        self.assertPeakBelow(2.5 * image.nbytes, threshold_otsu, image)
+
+    def test_remove_small_objects(self):
+        from jicbioimage.transform import remove_small_objects
+        self.assertPeakBelow(8 * self.mask.nbytes, remove_small_objects,
+                             self.mask)
+
+    def test_invert(self):
+        from jicbioimage.transform import invert
+        self.assertPeakBelow(1.1 * self.image.nbytes, invert, self.image)
+
+    def test_dilate_and_erode_binary(self):
+        from jicbioimage.transform import dilate_binary, erode_binary
+        mask = self.mask
+        for transform in (dilate_binary, erode_binary):
+            self.assertPeakBelow(1.1 * mask.nbytes, transform, mask)
+            out = np.empty_like(mask)
+            self.assertPeakBelow(0.1 * mask.nbytes, transform, mask,
+                                 out=out)
+
+    def test_projections(self):
+        import jicbioimage.transform
+        limits = [
+            ("max_intensity_projection", 2),
+            ("min_intensity_projection", 2),
+            ("argmax_intensity_projection", 4.5),
+            ("mean_intensity_projection", 8.5),
+            ("sum_intensity_projection", 8.5),
+            ("median_intensity_projection", 64),
+            ("std_intensity_projection", 80),
+            ("intensity_projections", 64),
+        ]
+        for name, limit in limits:
+            transform = getattr(jicbioimage.transform, name)
+            self.assertPeakBelow(limit * self.plane, transform, self.stack)
+
+    def test_focus_projections(self):
+        from jicbioimage.transform import (
+            extended_depth_of_field_projection,
+            focus_z_map,
+        )
+        for transform in (extended_depth_of_field_projection, focus_z_map):
+            self.assertPeakBelow(18 * self.stack.nbytes, transform,
+                                 self.stack)
+
+if __name__ == '__main__':
+    unittest.main()
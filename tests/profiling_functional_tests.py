@@ -0,0 +1,115 @@
+"""Profiling functional tests."""
+
+import unittest
+import json
+import time
+import numpy as np
+
+
+class ProfilingTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((50, 60))
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.transform import profiling
+        profiling.disable()
+        AutoWrite.on = self.original_on
+
+    def test_disabled_by_default(self):
+        from jicbioimage.transform import profiling, smooth_gaussian
+        self.assertTrue(profiling.active() is None)
+        smooth_gaussian(self.image)
+        self.assertTrue(profiling.active() is None)
+
+    def test_records_calls_with_phases(self):
+        from jicbioimage.transform import (
+            profiling,
+            smooth_gaussian,
+            threshold_otsu,
+        )
+        with profiling.profile() as profiler:
+            mask = threshold_otsu(smooth_gaussian(self.image, sigma=2))
+        self.assertTrue(profiling.active() is None)
+        smooth_gaussian(self.image)
+        self.assertEqual([r.name for r in profiler.records],
+                         ["smooth_gaussian", "threshold_otsu"])
+
+        record = profiler.records[1]
+        self.assertEqual(record.input["shape"], [50, 60])
+        self.assertEqual(record.input["dtype"], "float64")
+        self.assertEqual(record.output["dtype"], "bool")
+        self.assertEqual(record.output["nbytes"], mask.nbytes)
+        self.assertTrue(record.phases["algorithm"] > 0)
+        self.assertTrue(record.phases["wrapping"] > 0)
+        # The phases are exclusive, so they add up to at most the total.
+        self.assertTrue(sum(record.phases.values()) <= record.total)
+        self.assertTrue(sum(record.phases.values()) > 0.5 * record.total)
+
+    def test_autowrite_phase(self):
+        from unittest import mock
+        from jicbioimage.core.image import Image
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.transform import profiling, invert
+
+        def slow_write(image, fpath):
+            time.sleep(0.02)
+
+        AutoWrite.on = True
+        with mock.patch.object(Image, "write", slow_write):
+            with profiling.profile() as profiler:
+                invert(self.image)
+        record = profiler.records[0]
+        self.assertTrue(record.phases["autowrite"] >= 0.02)
+        self.assertTrue(record.phases["wrapping"] < 0.02)
+
+    def test_pipeline_steps(self):
+        from jicbioimage.transform import (
+            profiling,
+            smooth_gaussian,
+            threshold_otsu,
+        )
+        from jicbioimage.transform.pipeline import Pipeline
+        pipeline = Pipeline().add(smooth_gaussian).add(threshold_otsu)
+        with profiling.profile() as profiler:
+            pipeline(self.image)
+        self.assertEqual(list(profiler.totals().keys()),
+                         ["smooth_gaussian", "threshold_otsu"])
+
+    def test_nested_peak_memory(self):
+        from jicbioimage.transform import profiling
+        with profiling.profile(trace_memory=True) as profiler:
+            with profiling.record("outer", self.image):
+                large = np.ones(10 ** 6)
+                del large
+                with profiling.record("inner", self.image):
+                    small = np.ones(10)
+                    del small
+        inner, outer = profiler.records
+        self.assertTrue(inner.peak_bytes < 10 ** 6)
+        self.assertTrue(outer.peak_bytes >= 8 * 10 ** 6)
+
+    def test_json_and_summary(self):
+        from jicbioimage.transform import profiling, invert
+        with profiling.profile(trace_memory=True) as profiler:
+            invert(self.image)
+            invert(self.image)
+        data = json.loads(profiler.to_json())
+        self.assertEqual(len(data["records"]), 2)
+        self.assertEqual(data["records"][0]["name"], "invert")
+        self.assertTrue(data["records"][0]["peak_bytes"] >= self.image.nbytes)
+        totals = profiler.totals()
+        self.assertEqual(totals["invert"]["calls"], 2)
+        self.assertEqual(totals["invert"]["output_bytes"],
+                         2 * self.image.nbytes)
+        lines = profiler.summary().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("invert"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,306 @@
+"""Projection engine functional tests."""
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class ProjectionEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.stacks = [
+            random.randint(0, 255, (7, 5, 4)).astype(np.uint8),
+            random.randint(0, 65535, (7, 5, 3)).astype(np.uint16),
+            random.random_sample((7, 5, 4)),
+            random.randint(0, 2, (7, 5, 3)).astype(bool),
+        ]
+
+    def test_project_matches_reduce_stack(self):
+        from jicbioimage.core.util.array import reduce_stack
+        from jicbioimage.transform.projection import project
+        z_functions = dict(max=max, min=min, mean=np.mean, median=np.median)
+        for stack in self.stacks:
+            for method, z_function in z_functions.items():
+                expected = reduce_stack(stack, z_function)
+                projection = project(stack, method)
+                self.assertEqual(projection.dtype, stack.dtype)
+                self.assertTrue(np.array_equal(expected, projection),
+                                "{} {}".format(method, stack.dtype))
+
+    def test_project_unknown_method(self):
+        from jicbioimage.transform.projection import project
+        with self.assertRaises(ValueError):
+            project(self.stacks[0], "mode")
+
+    def test_project_requires_3D_stack(self):
+        from jicbioimage.transform.projection import project
+        with self.assertRaises(ValueError):
+            project(self.stacks[0][:, :, 0], "max")
+
+
+class NDProjectionTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        # TCZYX
+        self.data = random.randint(0, 65535, (2, 3, 5, 6, 7)).astype(
+            np.uint16)
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_project_axis_matches_per_channel_projection(self):
+        from jicbioimage.transform.projection import project
+        for method in ["max", "min", "mean", "median"]:
+            projection = project(self.data, method, axis=2)
+            self.assertEqual(projection.shape, (2, 3, 6, 7))
+            for t in range(2):
+                for c in range(3):
+                    # Per channel 3D stack with z as the last axis.
+                    stack = np.moveaxis(self.data[t, c], 0, -1)
+                    self.assertTrue(np.array_equal(
+                        projection[t, c], project(stack, method)))
+
+    def test_project_axis_out_of_range(self):
+        from jicbioimage.transform.projection import project
+        with self.assertRaises(ValueError):
+            project(self.data, "max", axis=5)
+
+    def test_stream_project_axis(self):
+        from jicbioimage.transform.projection import stream_project
+        for axis in [0, 2, 4, -1]:
+            for method in ["max", "mean", "median"]:
+                expected = stream_project(self.data, method, axis=axis,
+                                          block_bytes=1)
+                projection = getattr(np, method)(self.data, axis=axis)
+                self.assertTrue(np.array_equal(
+                    expected, projection.astype(np.uint16)))
+
+    def test_transform_returns_plane_stack_with_history_per_plane(self):
+        from jicbioimage.transform import max_intensity_projection
+        from jicbioimage.transform.projection import PlaneStack
+        projection = max_intensity_projection(self.data, axis=2)
+        self.assertTrue(isinstance(projection, PlaneStack))
+        self.assertTrue(np.array_equal(projection, self.data.max(axis=2)))
+        planes = projection.planes()
+        self.assertEqual(list(planes.keys()),
+                         [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)])
+        for (t, c), plane in planes.items():
+            self.assertEqual(plane.shape, (6, 7))
+            self.assertTrue(np.array_equal(plane, self.data[t, c].max(0)))
+            self.assertEqual(len(plane.history), 1)
+            self.assertEqual(plane.history[0].function.__name__,
+                             "max_intensity_projection")
+        # Each plane has its own history.
+        planes[(0, 0)].history.append(None)
+        self.assertEqual(len(planes[(0, 1)].history), 1)
+        self.assertEqual(len(projection.history), 1)
+
+    def test_plane_stack_write(self):
+        import shutil
+        from unittest import mock
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform.projection import PlaneStack
+        stack = PlaneStack.from_array(self.data.max(axis=2))
+        tmp_dir = tempfile.mkdtemp()
+        written = []
+
+        def fake_write(image, fpath):
+            written.append(os.path.relpath(fpath, tmp_dir))
+
+        try:
+            with mock.patch.object(Image, "write", fake_write):
+                stack.write(os.path.join(tmp_dir,
+                                         "1_max_intensity_projection"))
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(written[:2],
+                         [os.path.join("1_max_intensity_projection.stack",
+                                       "0_0"),
+                          os.path.join("1_max_intensity_projection.stack",
+                                       "0_1")])
+        self.assertEqual(len(written), 6)
+
+
+class StreamProjectionTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.stack = random.randint(0, 65535, (9, 6, 5)).astype(np.uint16)
+        tmp = tempfile.NamedTemporaryFile(suffix=".dat", delete=False)
+        tmp.close()
+        self.fpath = tmp.name
+        memmap = np.memmap(self.fpath, dtype=self.stack.dtype, mode="w+",
+                           shape=self.stack.shape)
+        memmap[:] = self.stack
+        memmap.flush()
+        del memmap
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+        os.unlink(self.fpath)
+
+    def slices(self):
+        return (self.stack[:, :, z] for z in range(self.stack.shape[2]))
+
+    def test_stream_project_memmap_is_exact(self):
+        from jicbioimage.transform.projection import (
+            METHODS,
+            project,
+            stream_project,
+        )
+        memmap = np.memmap(self.fpath, dtype=self.stack.dtype, mode="r",
+                           shape=self.stack.shape)
+        for method in METHODS:
+            expected = project(self.stack, method)
+            # Use a block size smaller than a row to force many blocks.
+            projection = stream_project(memmap, method, block_bytes=1)
+            self.assertTrue(np.array_equal(expected, projection), method)
+        del memmap
+
+    def test_stream_project_slices(self):
+        from jicbioimage.transform.projection import project, stream_project
+        for method in ["max", "min", "mean", "median"]:
+            expected = project(self.stack, method)
+            projection = stream_project(self.slices(), method)
+            self.assertEqual(projection.dtype, self.stack.dtype)
+            self.assertTrue(np.array_equal(expected, projection), method)
+
+    def test_stream_project_remedian_estimate(self):
+        from jicbioimage.transform.projection import stream_project
+        stack = np.dstack([np.full((2, 3), z, dtype=np.float64)
+                           for z in range(27)])
+        slices = (stack[:, :, z] for z in range(27))
+        estimate = stream_project(slices, "median", remedian_base=3)
+        self.assertTrue(np.array_equal(np.median(stack, axis=2), estimate))
+
+    def test_stream_project_empty(self):
+        from jicbioimage.transform.projection import stream_project
+        with self.assertRaises(ValueError):
+            stream_project(iter([]), "max")
+
+    def test_projection_transforms_accept_memmap_and_slices(self):
+        from jicbioimage.transform import max_intensity_projection
+        from jicbioimage.core.image import Image
+        memmap = np.memmap(self.fpath, dtype=self.stack.dtype, mode="r",
+                           shape=self.stack.shape)
+        expected = np.max(self.stack, axis=2)
+        projection = max_intensity_projection(memmap)
+        self.assertTrue(np.array_equal(expected, projection))
+        self.assertTrue(isinstance(projection, Image))
+        projection = max_intensity_projection(self.slices())
+        self.assertTrue(np.array_equal(expected, projection))
+        del memmap
+
+
+class StatisticsProjectionTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.stack = random.randint(0, 255, (9, 6, 5)).astype(np.uint8)
+        # Ties, so that argmax must return the first maximum.
+        self.stack[:, :, 3] = self.stack[:, :, 1]
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def slices(self):
+        return (self.stack[:, :, z] for z in range(self.stack.shape[2]))
+
+    def test_project_statistics_matches_project(self):
+        from jicbioimage.transform.projection import (
+            STATISTICS,
+            project,
+            project_statistics,
+        )
+        for block_bytes in [1, 64, 1 << 22]:
+            projections = project_statistics(self.stack,
+                                             block_bytes=block_bytes)
+            self.assertEqual(list(projections.keys()), list(STATISTICS))
+            for statistic, projection in projections.items():
+                expected = project(self.stack, statistic)
+                self.assertEqual(projection.dtype, expected.dtype)
+                self.assertTrue(np.array_equal(expected, projection),
+                                statistic)
+
+    def test_project_statistics_axis(self):
+        from jicbioimage.transform.projection import project_statistics
+        data = np.random.RandomState(1).random_sample((2, 3, 4, 5))
+        for axis in [0, 1, 3]:
+            projections = project_statistics(data, ["max", "argmax"],
+                                             axis=axis, block_bytes=1)
+            self.assertTrue(np.array_equal(projections["max"],
+                                           data.max(axis=axis)))
+            self.assertTrue(np.array_equal(projections["argmax"],
+                                           data.argmax(axis=axis)))
+
+    def test_project_statistics_slices(self):
+        from jicbioimage.transform.projection import (
+            project,
+            project_statistics,
+        )
+        projections = project_statistics(self.slices(),
+                                         ["std", "argmax", "mean", "sum"])
+        self.assertEqual(list(projections.keys()),
+                         ["std", "argmax", "mean", "sum"])
+        for statistic in ["argmax", "mean", "sum"]:
+            self.assertTrue(np.array_equal(projections[statistic],
+                                           project(self.stack, statistic)))
+        self.assertTrue(np.allclose(projections["std"],
+                                    project(self.stack, "std")))
+
+    def test_project_statistics_unknown(self):
+        from jicbioimage.transform.projection import project_statistics
+        with self.assertRaises(ValueError):
+            project_statistics(self.stack, ["max", "median"])
+
+    def test_intensity_projections_match_single_transforms(self):
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import (
+            intensity_projections,
+            max_intensity_projection,
+            std_intensity_projection,
+            argmax_intensity_projection,
+        )
+        projections = intensity_projections(self.stack,
+                                            ["max", "std", "argmax"])
+        for statistic, transform in [("max", max_intensity_projection),
+                                     ("std", std_intensity_projection),
+                                     ("argmax", argmax_intensity_projection)]:
+            projection = projections[statistic]
+            expected = transform(self.stack)
+            self.assertTrue(isinstance(projection, Image))
+            self.assertTrue(np.array_equal(projection, expected))
+            self.assertEqual(len(projection.history), 1)
+            self.assertEqual(projection.history[0].function.__name__,
+                             expected.history[0].function.__name__)
+
+if __name__ == '__main__':
+    unittest.main()
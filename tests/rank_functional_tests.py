@@ -0,0 +1,107 @@
+"""Rank projection engine functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class RankEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.planes = []
+        for count in [1, 4, 7]:
+            for dtype in [np.uint8, np.uint16, np.int16, np.float32]:
+                # Few distinct values, so that there are ties.
+                planes = random.randint(0, 5, (count, 6, 5)).astype(dtype)
+                self.planes.append(planes)
+                self.planes.append(
+                    (random.random_sample((count, 6, 5)) * 60000).astype(
+                        dtype))
+
+    def test_median_matches_numpy(self):
+        from jicbioimage.transform.rank import median
+        for planes in self.planes:
+            for axis in [0, 2]:
+                expected = np.median(planes, axis=axis)
+                result = median(planes, axis)
+                self.assertEqual(result.dtype, expected.dtype)
+                self.assertTrue(np.array_equal(result, expected),
+                                "{} {}".format(planes.shape, planes.dtype))
+
+    def test_percentile_matches_numpy(self):
+        from jicbioimage.transform.rank import percentile
+        for planes in self.planes:
+            for q in [0, 10, 33.3, 50, 90, 100]:
+                expected = np.percentile(planes, q, axis=0)
+                result = percentile(planes, q)
+                self.assertEqual(result.dtype, expected.dtype)
+                self.assertTrue(np.array_equal(result, expected),
+                                "{} {} {}".format(planes.shape[0],
+                                                  planes.dtype, q))
+
+    def test_nan(self):
+        from jicbioimage.transform.rank import median, percentile
+        planes = np.arange(24, dtype=np.float64).reshape(4, 3, 2)
+        planes[1, 0, 0] = np.nan
+        self.assertTrue(np.array_equal(median(planes),
+                                       np.median(planes, axis=0),
+                                       equal_nan=True))
+        self.assertTrue(np.array_equal(percentile(planes, 90),
+                                       np.percentile(planes, 90, axis=0),
+                                       equal_nan=True))
+
+    def test_percentile_out_of_range(self):
+        from jicbioimage.transform.rank import percentile
+        with self.assertRaises(ValueError):
+            percentile(self.planes[0], 101)
+
+
+class PercentileProjectionTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.stack = random.randint(0, 65535, (9, 6, 8)).astype(np.uint16)
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_project_percentile(self):
+        from jicbioimage.transform.projection import project_percentile
+        for axis in [0, 1, 2]:
+            for q in [10, 50, 90]:
+                expected = np.percentile(self.stack, q, axis=axis)
+                projection = project_percentile(self.stack, q, axis)
+                self.assertEqual(projection.dtype, self.stack.dtype)
+                self.assertTrue(np.array_equal(
+                    projection, expected.astype(np.uint16)))
+
+    def test_percentile_transform(self):
+        from jicbioimage.core.image import Image
+        from jicbioimage.transform import (
+            percentile_intensity_projection,
+            median_intensity_projection,
+        )
+        projection = percentile_intensity_projection(self.stack, 50)
+        self.assertTrue(isinstance(projection, Image))
+        self.assertTrue(np.array_equal(projection,
+                                       median_intensity_projection(
+                                           self.stack)))
+        slices = (self.stack[:, :, z] for z in range(8))
+        self.assertTrue(np.array_equal(
+            percentile_intensity_projection(slices, 10),
+            np.percentile(self.stack, 10, axis=2).astype(np.uint16)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,274 @@
+"""Histogram based thresholding functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class OtsuHistogramTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        from jicbioimage.transform.threshold import clear_cache
+        clear_cache()
+        random = np.random.RandomState(0)
+        self.images = [
+            random.randint(0, 256, (40, 30)).astype(np.uint8),
+            random.randint(100, 4000, (40, 30)).astype(np.uint16),
+            random.randint(-1000, 1000, (40, 30)).astype(np.int16),
+            np.full((4, 3), 7, dtype=np.uint8),
+        ]
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_otsu_value_matches_skimage(self):
+        import skimage.filters
+        from jicbioimage.transform.threshold import otsu_value
+        for image in self.images + [np.random.random_sample((20, 20))]:
+            self.assertEqual(skimage.filters.threshold_otsu(image),
+                             otsu_value(image))
+
+    def test_histogram_is_cached_per_image(self):
+        from jicbioimage.transform.threshold import caching, histogram
+        image = self.images[1]
+        with caching():
+            counts, bin_centers = histogram(image)
+            self.assertEqual(counts.sum(), image.size)
+            self.assertEqual(bin_centers[0], image.min())
+            self.assertEqual(bin_centers[-1], image.max())
+            self.assertTrue(histogram(image)[0] is counts)
+            self.assertFalse(histogram(image.copy())[0] is counts)
+        self.assertFalse(histogram(image)[0] is counts)
+
+    def test_cache_entry_removed_with_image(self):
+        from jicbioimage.transform import threshold
+        image = self.images[0].copy()
+        with threshold.caching():
+            threshold.histogram(image)
+            self.assertEqual(len(threshold._cache), 1)
+            del image
+            self.assertEqual(len(threshold._cache), 0)
+
+    def test_cache_cleared_when_last_context_exits(self):
+        from jicbioimage.transform import threshold
+        with threshold.caching():
+            with threshold.caching():
+                threshold.histogram(self.images[0])
+            self.assertEqual(len(threshold._cache), 1)
+        self.assertEqual(len(threshold._cache), 0)
+
+    def test_in_place_modification_outside_caching(self):
+        import skimage.filters
+        from jicbioimage.transform import threshold_otsu
+        from jicbioimage.transform.threshold import otsu_value
+        image = self.images[0].copy()
+        threshold_otsu(image)
+        image[:] = image // 4
+        self.assertEqual(skimage.filters.threshold_otsu(image),
+                         otsu_value(image))
+
+    def test_histogram_rejects_float(self):
+        from jicbioimage.transform.threshold import histogram
+        with self.assertRaises(TypeError):
+            histogram(np.zeros((2, 2)))
+
+    def test_threshold_otsu_multipliers_match_float_comparison(self):
+        from jicbioimage.transform import threshold_otsu
+        from jicbioimage.transform.threshold import otsu_value
+        for image in self.images:
+            value = otsu_value(image)
+            for multiplier in [0.0, 0.3, 0.6, 1.0, 1.7, 1e6, -2.0]:
+                expected = image > value * multiplier
+                thresholded = threshold_otsu(image, multiplier=multiplier)
+                self.assertTrue(np.array_equal(expected, thresholded))
+
+
+class PlaneOtsuTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+        random = np.random.RandomState(0)
+        self.stacks = [
+            (random.random_sample((6, 20, 30)) ** 2 * 255).astype(np.uint8),
+            random.randint(100, 4000, (5, 20, 30)).astype(np.uint16),
+            random.randint(-1000, 1000, (4, 20, 30)).astype(np.int16),
+            random.random_sample((5, 20, 30)) ** 2,
+            random.random_sample((5, 20, 30)).astype(np.float32),
+        ]
+        for stack in self.stacks:
+            stack[1] = stack[0, 0, 0]
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def test_otsu_values_match_skimage_per_plane(self):
+        import skimage.filters
+        from jicbioimage.transform.threshold import otsu_values
+        for stack in self.stacks:
+            expected = [skimage.filters.threshold_otsu(p) for p in stack]
+            self.assertTrue(np.array_equal(expected, otsu_values(stack)))
+
+    def test_plane_histograms_of_integer_stack(self):
+        from jicbioimage.transform.threshold import histogram, \
+            plane_histograms
+        stack = self.stacks[1]
+        counts, bin_centers = plane_histograms(stack)
+        self.assertEqual(counts.shape, (len(stack), len(bin_centers)))
+        self.assertEqual(bin_centers[0], stack.min())
+        self.assertEqual(bin_centers[-1], stack.max())
+        plane_counts, plane_centers = histogram(stack[2])
+        start = plane_centers[0] - bin_centers[0]
+        self.assertTrue(np.array_equal(
+            counts[2, start:start + len(plane_counts)], plane_counts))
+        self.assertEqual(counts[2].sum(), plane_counts.sum())
+
+    def test_plane_histograms_in_groups_of_planes(self):
+        from jicbioimage.transform import threshold
+        stack = self.stacks[0]
+        expected = threshold.plane_histograms(stack)[0]
+        chunk_size = threshold.CHUNK_SIZE
+        threshold.CHUNK_SIZE = stack[0].size * 2
+        try:
+            counts = threshold.plane_histograms(stack)[0]
+        finally:
+            threshold.CHUNK_SIZE = chunk_size
+        self.assertTrue(np.array_equal(expected, counts))
+
+    def test_plane_histograms_of_float_stack(self):
+        import skimage.exposure
+        from jicbioimage.transform.threshold import plane_histograms
+        for stack in self.stacks[3:]:
+            counts, bin_centers = plane_histograms(stack)
+            for plane, plane_counts, plane_centers in zip(stack, counts,
+                                                          bin_centers):
+                expected = skimage.exposure.histogram(plane, 256)
+                self.assertTrue(np.array_equal(expected[0], plane_counts))
+                self.assertTrue(np.array_equal(expected[1], plane_centers))
+
+    def test_values_in_groups_of_planes(self):
+        from jicbioimage.transform import threshold
+        bins_per_group = threshold.BINS_PER_GROUP
+        for stack in self.stacks:
+            # Without the constant plane, which has a single class.
+            varied = np.delete(stack, 1, axis=0)
+            expected = threshold.otsu_values(stack)
+            expected_multi = threshold.multiotsu_values(varied)
+            threshold.BINS_PER_GROUP = 1
+            try:
+                values = threshold.otsu_values(stack)
+                multi = threshold.multiotsu_values(varied)
+            finally:
+                threshold.BINS_PER_GROUP = bins_per_group
+            self.assertTrue(np.array_equal(expected, values))
+            self.assertTrue(np.array_equal(expected_multi, multi))
+
+    def test_threshold_otsu_planes_match_threshold_otsu(self):
+        from jicbioimage.transform import threshold_otsu, \
+            threshold_otsu_planes
+        from jicbioimage.transform.projection import PlaneStack
+        for stack in self.stacks:
+            mask, values = threshold_otsu_planes(stack, multiplier=0.8)
+            self.assertTrue(isinstance(mask, PlaneStack))
+            self.assertEqual(mask.dtype, bool)
+            self.assertEqual(len(values), len(stack))
+            for plane, plane_mask in zip(stack, mask):
+                self.assertTrue(np.array_equal(
+                    threshold_otsu(plane, multiplier=0.8), plane_mask))
+
+    def test_threshold_otsu_planes_along_axis(self):
+        from jicbioimage.transform import threshold_otsu_planes
+        stack = self.stacks[0]
+        expected, values = threshold_otsu_planes(stack)
+        mask, moved_values = threshold_otsu_planes(
+            np.moveaxis(stack, 0, 2), axis=2)
+        self.assertTrue(np.array_equal(expected, mask))
+        self.assertTrue(np.array_equal(values, moved_values))
+        self.assertEqual(mask.history[-1].kwargs["axis"], 2)
+
+    def test_rejects_single_plane(self):
+        from jicbioimage.transform import threshold_otsu_planes
+        with self.assertRaises(ValueError):
+            threshold_otsu_planes(self.stacks[0][0])
+
+
+class MultiOtsuTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+        random = np.random.RandomState(0)
+        # Well separated classes, whose thresholds are not close to a tie.
+        centers = np.array([30, 100, 170, 230])
+        self.stack = np.clip(
+            centers[random.randint(0, 4, (5, 30, 40))] +
+            random.normal(0, 8, (5, 30, 40)), 0, 255).astype(np.uint8)
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def test_multiotsu_values_match_skimage_per_plane(self):
+        import skimage.filters
+        from jicbioimage.transform.threshold import multiotsu_values
+        for stack in [self.stack, self.stack.astype(np.uint16) + 1000,
+                      self.stack / 255.0]:
+            for classes in [2, 3, 4]:
+                expected = [skimage.filters.threshold_multiotsu(p, classes)
+                            for p in stack]
+                values = multiotsu_values(stack, classes)
+                self.assertEqual(values.shape, (len(stack), classes - 1))
+                self.assertTrue(np.array_equal(expected, values))
+
+    def test_two_classes_are_otsu(self):
+        from jicbioimage.transform.threshold import multiotsu_values, \
+            otsu_values
+        values = multiotsu_values(self.stack, classes=2)
+        self.assertTrue(np.array_equal(otsu_values(self.stack),
+                                       values[:, 0]))
+
+    def test_threshold_multiotsu_labels(self):
+        import skimage.filters
+        from jicbioimage.transform import threshold_multiotsu
+        image = self.stack[0]
+        labels = threshold_multiotsu(image, classes=4)
+        thresholds = skimage.filters.threshold_multiotsu(image, 4)
+        self.assertEqual(labels.dtype, np.uint8)
+        self.assertTrue(np.array_equal(
+            np.digitize(image, thresholds, right=True), labels))
+
+    def test_threshold_multiotsu_planes_match_threshold_multiotsu(self):
+        from jicbioimage.transform import threshold_multiotsu, \
+            threshold_multiotsu_planes
+        labels, values = threshold_multiotsu_planes(self.stack, classes=3)
+        self.assertEqual(values.shape, (len(self.stack), 2))
+        for plane, plane_labels in zip(self.stack, labels):
+            self.assertTrue(np.array_equal(
+                threshold_multiotsu(plane, classes=3), plane_labels))
+
+    def test_rejects_too_few_values(self):
+        from jicbioimage.transform import threshold_multiotsu
+        from jicbioimage.transform.threshold import multiotsu_values
+        image = np.zeros((10, 10), dtype=np.uint8)
+        image[5:] = 9
+        with self.assertRaises(ValueError):
+            threshold_multiotsu(image, classes=3)
+        with self.assertRaises(ValueError):
+            multiotsu_values(self.stack, classes=1)
+
+if __name__ == '__main__':
+    unittest.main()
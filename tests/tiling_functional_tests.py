@@ -0,0 +1,96 @@
+"""Tiled execution functional tests."""
+
+import unittest
+import os
+import shutil
+import numpy as np
+
+HERE = os.path.dirname(__file__)
+TMP_DIR = os.path.join(HERE, 'tmp')
+
+
+class TiledFilterTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        AutoName.directory = TMP_DIR
+        if not os.path.isdir(TMP_DIR):
+            os.mkdir(TMP_DIR)
+        random = np.random.RandomState(0)
+        self.image = random.random_sample((97, 131))
+        self.mask = random.random_sample((97, 131)) > 0.1
+        self.binary = random.random_sample((97, 131)) > 0.7
+        # Small enough to force many tiles with two workers.
+        self.budget = 2 * 48 * 30 * 30
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoName
+        AutoName.count = 0
+        shutil.rmtree(TMP_DIR)
+
+    def test_smooth_gaussian_tiled_is_identical(self):
+        from jicbioimage.transform import smooth_gaussian
+        for sigma in [1, 2.5]:
+            expected = smooth_gaussian(self.image, sigma=sigma,
+                                       backend="direct")
+            tiled = smooth_gaussian(self.image, sigma=sigma,
+                                    memory_budget=self.budget * 10,
+                                    workers=2)
+            self.assertTrue(np.array_equal(expected, tiled))
+
+    def test_smooth_gaussian_tiled_auto_backend_is_direct(self):
+        from jicbioimage.transform import smooth_gaussian
+        expected = smooth_gaussian(self.image, sigma=12, backend="direct")
+        tiled = smooth_gaussian(self.image, sigma=12, backend="auto",
+                                memory_budget=self.budget * 100)
+        self.assertTrue(np.array_equal(expected, tiled))
+
+    def test_find_edges_sobel_tiled_is_identical(self):
+        from jicbioimage.transform import find_edges_sobel
+        for mask in [None, self.mask]:
+            expected = find_edges_sobel(self.image, mask=mask)
+            tiled = find_edges_sobel(self.image, mask=mask,
+                                     memory_budget=self.budget, workers=2)
+            self.assertTrue(np.array_equal(expected, tiled))
+
+    def test_binary_morphology_tiled_is_identical(self):
+        from jicbioimage.transform import dilate_binary, erode_binary
+        selems = [None, np.ones((3, 3)), np.ones((4, 6)),
+                  np.array([[0, 1, 0, 0, 0],
+                            [1, 1, 1, 0, 0],
+                            [0, 1, 1, 1, 1]])]
+        for transform in [dilate_binary, erode_binary]:
+            for selem in selems:
+                expected = transform(self.binary, selem=selem)
+                tiled = transform(self.binary, selem=selem,
+                                  memory_budget=self.budget, workers=2)
+                self.assertTrue(np.array_equal(expected, tiled))
+
+    def test_apply_tiled_with_tile_shape(self):
+        from jicbioimage.transform.tiling import apply_tiled
+        calls = []
+
+        def double(array):
+            calls.append(array.shape)
+            return array * 2
+        result = apply_tiled(double, self.image, 2, np.float64,
+                             tile_shape=(50, 70), workers=1)
+        self.assertTrue(np.array_equal(self.image * 2, result))
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(calls[0], (52, 72))
+
+    def test_memory_budget_too_small(self):
+        from jicbioimage.transform import smooth_gaussian
+        with self.assertRaises(ValueError):
+            smooth_gaussian(self.image, sigma=5, memory_budget=1000)
+
+    def test_halos(self):
+        from jicbioimage.transform.tiling import gaussian_halo, selem_halo
+        self.assertEqual(gaussian_halo(1), 4)
+        self.assertEqual(gaussian_halo([0.5, 2]), 8)
+        self.assertEqual(selem_halo(None), 1)
+        self.assertEqual(selem_halo(np.ones((5, 4))), 2)
+
+if __name__ == '__main__':
+    unittest.main()
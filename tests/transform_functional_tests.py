@@ -241,6 +241,64 @@ class GeneralPurposeTransoformTests(unittest.TestCase):
         self.assertTrue(np.array_equal(expected, inverted))
         self.assertTrue(isinstance(inverted, Image))
 
+    def test_invert_int16(self):
+        from jicbioimage.transform import invert
+        array = np.array(
+            [[-32768, -1, 0],
+             [1, 100, 32767]], dtype=np.int16)
+        expected = np.array(
+            [[32767, 0, -1],
+             [-2, -101, -32768]], dtype=np.int16)
+        inverted = invert(array)
+        self.assertTrue(np.array_equal(expected, inverted))
+        self.assertEqual(inverted.dtype, np.int16)
+
+    def test_invert_float(self):
+        from jicbioimage.transform import invert
+        array = np.array(
+            [[0.0, 0.25, 1.0]], dtype=np.float32)
+        expected = np.array(
+            [[1.0, 0.75, 0.0]], dtype=np.float32)
+        inverted = invert(array)
+        self.assertTrue(np.array_equal(expected, inverted))
+        self.assertEqual(inverted.dtype, np.float32)
+
+    def test_invert_in_place(self):
+        from jicbioimage.transform import invert
+        from jicbioimage.core.image import Image
+        array = np.array(
+            [[1,  1,  1],
+             [0,  0,  0]], dtype=np.uint8)
+        inverted = invert(array, out=array)
+        self.assertTrue(isinstance(inverted, Image))
+        self.assertTrue(np.shares_memory(array, inverted))
+        self.assertTrue(np.all(array[0] == 254))
+
+    def test_invert_unsupported_dtype(self):
+        from jicbioimage.transform import invert
+        with self.assertRaises(TypeError):
+            invert(np.zeros((2, 2), dtype=np.complex128))
+
+    def test_invert_peak_allocation(self):
+        import tracemalloc
+        from jicbioimage.core.io import AutoWrite
+        from jicbioimage.transform import invert
+        array = np.zeros((1000, 1000), dtype=np.uint16)
+        auto_write = AutoWrite.on
+        AutoWrite.on = False
+        try:
+            for out, max_bytes in [(None, 1.1 * array.nbytes),
+                                   (array, 0.1 * array.nbytes)]:
+                tracemalloc.start()
+                try:
+                    invert(array, out=out)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                self.assertLess(peak, max_bytes)
+        finally:
+            AutoWrite.on = auto_write
+
     def test_dilate_binary(self):
         from jicbioimage.transform import dilate_binary
         from jicbioimage.core.image import Image
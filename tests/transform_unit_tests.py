@@ -1,7 +1,24 @@
 """Do some basic tests."""
 
+import os
+import sys
+import json
+import subprocess
 import unittest
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def imported_modules(code):
+    """Return names of the modules imported after running code."""
+    script = code + "\nimport sys, json\nprint(json.dumps(list(sys.modules)))"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(HERE), env.get("PYTHONPATH", "")])
+    output = subprocess.check_output([sys.executable, "-c", script], env=env)
+    return json.loads(output.decode("utf-8").splitlines()[-1])
+
+
 class TransformTests(unittest.TestCase):
 
     def test_import_max_intensity_projection(self):
@@ -24,5 +41,24 @@ class TransformTests(unittest.TestCase):
         # This throws an error if the function cannot be imported.
         from jicbioimage.transform import threshold_otsu
 
+    def test_import_is_lazy(self):
+        modules = imported_modules("import jicbioimage.transform")
+        heavy = [name for name in modules
+                 if name.split(".")[0] in ("scipy", "skimage") or
+                 name == "jicbioimage.core.image"]
+        self.assertEqual(heavy, [])
+
+    def test_dependencies_imported_on_first_use(self):
+        modules = imported_modules("""
+import numpy as np
+from jicbioimage.core.io import AutoWrite
+from jicbioimage.transform import threshold_otsu
+AutoWrite.on = False
+threshold_otsu(np.arange(100, dtype=np.uint8).reshape(10, 10))""")
+        self.assertTrue("jicbioimage.core.image" in modules)
+        # Not needed to threshold integer images.
+        self.assertFalse("skimage.filters" in modules)
+        self.assertFalse("scipy.signal" in modules)
+
 if __name__ == '__main__':
     unittest.main()
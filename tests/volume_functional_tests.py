@@ -0,0 +1,145 @@
+"""Volume functional tests."""
+
+import unittest
+import numpy as np
+
+
+class VolumeTests(unittest.TestCase):
+
+    def setUp(self):
+        from jicbioimage.core.io import AutoWrite
+        random = np.random.RandomState(0)
+        self.volume = random.random_sample((30, 40, 8))
+        self.mask = random.random_sample((30, 40, 8)) > 0.97
+        self.original_on = AutoWrite.on
+        AutoWrite.on = False
+
+    def tearDown(self):
+        from jicbioimage.core.io import AutoWrite
+        AutoWrite.on = self.original_on
+
+    def test_pixel_sigma(self):
+        from jicbioimage.transform.volume import pixel_sigma
+        self.assertEqual(list(pixel_sigma(2, None, 3)), [2, 2, 2])
+        self.assertEqual(list(pixel_sigma(2, (0.5, 0.5, 2), 3)), [4, 4, 1])
+        self.assertEqual(list(pixel_sigma((1, 2, 3), 1, 3)), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            pixel_sigma((1, 2), None, 3)
+        with self.assertRaises(ValueError):
+            pixel_sigma(1, (1, 1, 0), 3)
+
+    def test_smooth_gaussian_anisotropic(self):
+        import scipy.ndimage as ndi
+        from jicbioimage.transform import smooth_gaussian
+        smoothed = smooth_gaussian(self.volume, sigma=2, spacing=(1, 1, 4),
+                                   backend="direct")
+        expected = ndi.gaussian_filter(self.volume, (2, 2, 0.5),
+                                       mode="nearest")
+        self.assertTrue(np.array_equal(smoothed, expected))
+        per_axis = smooth_gaussian(self.volume, sigma=(2, 2, 0.5),
+                                   backend="direct")
+        self.assertTrue(np.array_equal(per_axis, expected))
+        with self.assertRaises(ValueError):
+            smooth_gaussian(self.volume, sigma=(1, 2))
+
+    def test_smooth_gaussian_slices(self):
+        import scipy.ndimage as ndi
+        from jicbioimage.transform import smooth_gaussian
+        for axis in (0, 2):
+            planes = np.moveaxis(self.volume, axis, 0)
+            expected = np.stack([ndi.gaussian_filter(p, 2, mode="nearest")
+                                 for p in planes])
+            for workers in (1, 3):
+                smoothed = smooth_gaussian(self.volume, sigma=2,
+                                           backend="direct",
+                                           slice_axis=axis, workers=workers)
+                self.assertTrue(np.array_equal(
+                    np.moveaxis(smoothed, axis, 0), expected))
+        out = np.empty_like(self.volume)
+        smoothed = smooth_gaussian(self.volume, sigma=(2, 2, 5), out=out,
+                                   backend="direct", slice_axis=2)
+        self.assertTrue(np.shares_memory(smoothed, out))
+        self.assertTrue(np.array_equal(out[:, :, 3], ndi.gaussian_filter(
+            self.volume[:, :, 3], 2, mode="nearest")))
+        with self.assertRaises(ValueError):
+            smooth_gaussian(self.volume, slice_axis=2, memory_budget=10000)
+
+    def test_ball(self):
+        import skimage.morphology
+        from jicbioimage.transform.morphology import ball, classify_selem
+        for radius in range(5):
+            self.assertTrue(np.array_equal(ball(radius),
+                                           skimage.morphology.ball(radius)))
+        self.assertEqual(classify_selem(ball(3), 3), ("ball", 3))
+        anisotropic = ball(2, spacing=(1, 1, 2))
+        self.assertEqual(anisotropic.shape, (5, 5, 3))
+        self.assertEqual(anisotropic[2, 2, 0], 1)
+        self.assertEqual(anisotropic[1, 2, 0], 0)
+
+    def test_morphology_3d(self):
+        import skimage.morphology
+        from jicbioimage.transform import dilate_binary, erode_binary
+        from jicbioimage.transform.morphology import ball
+        for radius in (1, 6):
+            selem = ball(radius)
+            self.assertTrue(np.array_equal(
+                dilate_binary(self.mask, selem=selem),
+                skimage.morphology.binary_dilation(self.mask, selem)))
+            self.assertTrue(np.array_equal(
+                erode_binary(~self.mask, selem=selem),
+                skimage.morphology.binary_erosion(~self.mask, selem)))
+        selem = ball(2, spacing=(1, 1, 2))
+        self.assertTrue(np.array_equal(
+            dilate_binary(self.mask, selem=selem),
+            skimage.morphology.binary_dilation(self.mask, selem)))
+
+    def test_morphology_slices(self):
+        import skimage.morphology
+        from jicbioimage.transform import dilate_binary, erode_binary
+        selem = skimage.morphology.disk(2)
+        dilated = dilate_binary(self.mask, selem=selem, slice_axis=2,
+                                workers=3)
+        eroded = erode_binary(~self.mask, selem=selem, slice_axis=2)
+        for z in range(self.mask.shape[2]):
+            self.assertTrue(np.array_equal(
+                dilated[:, :, z],
+                skimage.morphology.binary_dilation(self.mask[:, :, z],
+                                                   selem)))
+            self.assertTrue(np.array_equal(
+                eroded[:, :, z],
+                skimage.morphology.binary_erosion(~self.mask[:, :, z],
+                                                  selem)))
+
+    def test_find_edges_sobel_3d(self):
+        import skimage.filters
+        from jicbioimage.transform import find_edges_sobel
+        edges = find_edges_sobel(self.volume)
+        self.assertTrue(np.allclose(edges,
+                                    skimage.filters.sobel(self.volume)))
+        isotropic = find_edges_sobel(self.volume, spacing=1)
+        self.assertTrue(np.allclose(isotropic, edges))
+        anisotropic = find_edges_sobel(self.volume, spacing=(1, 1, 2))
+        x = skimage.filters.sobel(self.volume, axis=0)
+        y = skimage.filters.sobel(self.volume, axis=1)
+        z = skimage.filters.sobel(self.volume, axis=2) / 2
+        expected = np.sqrt((x ** 2 + y ** 2 + z ** 2) / 3)
+        self.assertTrue(np.allclose(anisotropic, expected))
+
+    def test_find_edges_sobel_slices(self):
+        import skimage.filters
+        from jicbioimage.transform import find_edges_sobel
+        mask = ~self.mask
+        edges = find_edges_sobel(self.volume, mask=mask, slice_axis=2)
+        for z in range(self.volume.shape[2]):
+            self.assertTrue(np.allclose(
+                edges[:, :, z],
+                skimage.filters.sobel(self.volume[:, :, z],
+                                      mask=mask[:, :, z])))
+        halved = find_edges_sobel(self.volume, spacing=(2, 2, 7),
+                                  slice_axis=2)
+        self.assertTrue(np.allclose(halved,
+                                    find_edges_sobel(self.volume,
+                                                     slice_axis=2) / 2))
+
+if __name__ == '__main__':
+    unittest.main()